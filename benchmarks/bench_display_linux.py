@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Capture throughput of the X11 display (display_linux): frames per second
+   for the whole screen and for small areas, with a new frame array per capture
+   and with captures converted into one reused array (take_screenshot(..., out=)).
+
+   Xvfb :99 -screen 0 1920x1080x24 &
+   DISPLAY=:99 python benchmarks/bench_display_linux.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pikuli.display_linux import Display
+
+DURATION = 2.0  # seconds per case
+AREAS = [(64, 64), (256, 256), (800, 600)]
+
+
+def frames_per_second(display, w, h, reuse=False):
+    out = np.empty((h, w, 3), np.uint8) if reuse else None
+    frames = 0
+    started = time.time()
+    while time.time() - started < DURATION:
+        display.take_screenshot(0, 0, w, h, out=out)
+        frames += 1
+    return frames / (time.time() - started)
+
+
+def run():
+    display = Display()
+    (_, _, rect, _) = display.get_monitor_info(0)
+    cases = [(rect[2] - rect[0], rect[3] - rect[1])] + AREAS
+    print('MIT-SHM: {}'.format(display._shminfo is not None))
+    for (w, h) in cases:
+        print('{w:5}x{h:<5} {fps:8.1f} frames/s, reused array: {reused:8.1f} frames/s'.format(
+            w=w, h=h, fps=frames_per_second(display, w, h), reused=frames_per_second(display, w, h, reuse=True)))
+    display.close()
+
+
+if __name__ == '__main__':
+    run()
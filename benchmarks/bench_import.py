@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Wall time of 'import pikuli' in a fresh interpreter, compared with importing
+   the heavy modules it used to import eagerly. Python 2 has no '-X importtime',
+   so the whole import is timed from a subprocess.
+
+   python benchmarks/bench_import.py [--budget MS]
+   Exits with status 1 if 'import pikuli' takes longer than MS milliseconds.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 5
+CASES = [('python -c pass', 'pass'),
+         ('import pikuli', 'import pikuli'),
+         ('import pikuli, cv2, numpy', 'import pikuli, cv2, numpy')]
+
+
+def measure(code):
+    best = None
+    for _ in range(REPEAT):
+        started = time.time()
+        subprocess.check_call([sys.executable, '-c', code], cwd=ROOT)
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, help='milliseconds allowed for "import pikuli" above bare startup')
+    args = parser.parse_args()
+
+    times = dict((name, measure(code)) for (name, code) in CASES)
+    for (name, _) in CASES:
+        print('{name:28} {t:7.1f} ms'.format(name=name, t=times[name] * 1000))
+
+    cost = (times['import pikuli'] - times['python -c pass']) * 1000
+    if args.budget is not None and cost > args.budget:
+        print('import pikuli takes {c:.1f} ms, budget is {b:.1f} ms'.format(c=cost, b=args.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Region and Location construction throughput with pikuli loggers at each level.
+   Log records are written to os.devnull, so the numbers show the cost of
+   creating and formatting records, not of the terminal. Runs over a synthetic
+   display (see pikuli/synthetic.py), no desktop needed.
+
+   python benchmarks/bench_logging.py
+"""
+
+import logging
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pikuli import Region, Location
+from pikuli.synthetic import SyntheticDisplay, install
+
+NUMBER = 2000
+LOGGERS = ['pikuli.Region  ', 'pikuli.Location']
+
+
+def run():
+    install(SyntheticDisplay(np.zeros((1080, 1920, 3), np.uint8)))
+    devnull = open(os.devnull, 'w')
+    for name in LOGGERS:
+        for handler in logging.getLogger(name).handlers:
+            handler.stream = devnull
+
+    for level in (logging.DEBUG, logging.INFO, logging.WARNING):
+        for name in LOGGERS:
+            logging.getLogger(name).setLevel(level)
+        region = min(timeit.repeat(lambda: Region(10, 10, 100, 100), number=NUMBER, repeat=3)) / NUMBER
+        location = min(timeit.repeat(lambda: Location(10, 10).offset(5, 5), number=NUMBER, repeat=3)) / NUMBER
+        print('{level:8} Region(): {r:7.1f} us   Location().offset(): {l:7.1f} us'.format(
+            level=logging.getLevelName(level), r=region * 1e6, l=location * 1e6))
+
+
+if __name__ == '__main__':
+    run()
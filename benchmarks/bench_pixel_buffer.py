@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Per-frame cost of converting a raw BGRA screenshot buffer into a BGR array:
+   the list-based conversion used by display_win before pixel_buffer and
+   pixel_buffer.buffer_to_bgr().
+
+   python benchmarks/bench_pixel_buffer.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pikuli.pixel_buffer import buffer_to_bgr
+
+SCREENS = [('1080p', 1920, 1080), ('1440p', 2560, 1440), ('4K', 3840, 2160)]
+
+
+def convert_with_list(buf, w, h):
+    bmp_arr = list(bytearray(buf))
+    del bmp_arr[3::4]
+    return np.array(bmp_arr, dtype=np.uint8).reshape((h, w, 3))
+
+
+def measure(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def run():
+    for (name, w, h) in SCREENS:
+        buf = np.random.RandomState(0).randint(0, 256, w * h * 4).astype(np.uint8).tobytes()
+        assert (convert_with_list(buf, w, h) == buffer_to_bgr(buf, w, h)).all()
+        print('{name:6} list: {old:8.1f} ms/frame   buffer_to_bgr: {new:6.2f} ms/frame'.format(
+            name=name,
+            old=measure(lambda: convert_with_list(buf, w, h), 1) * 1000,
+            new=measure(lambda: buffer_to_bgr(buf, w, h), 20) * 1000))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Cost of constructing a Region with the cached monitor topology and with
+   the display queried on every construction (as before monitors.py).
+   Runs over a synthetic display (see pikuli/synthetic.py), no desktop needed.
+
+   python benchmarks/bench_region_init.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pikuli import Region
+from pikuli.monitors import monitors
+from pikuli.synthetic import SyntheticDisplay, install
+
+NUMBER = 1000
+
+
+def construct():
+    Region(10, 10, 100, 100)
+
+
+def construct_uncached():
+    monitors.refresh()
+    Region(10, 10, 100, 100)
+
+
+def run():
+    install(SyntheticDisplay(np.zeros((1080, 1920, 3), np.uint8)))
+    cached = min(timeit.repeat(construct, number=NUMBER, repeat=3)) / NUMBER
+    uncached = min(timeit.repeat(construct_uncached, number=NUMBER, repeat=3)) / NUMBER
+    print('Region(): cached topology {c:8.1f} us   display query {u:8.1f} us'.format(c=cached * 1e6, u=uncached * 1e6))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Benchmarks of the hot paths over synthetic screens (see pikuli/synthetic.py), no desktop needed:
+   matching (BaseRegion._find with every engine), find_all, Region/Match/Location construction,
+   Pattern loading and raw screenshot buffer conversion. The two-monitor setup is searched
+   screen by screen, with a capture of every screen, as Regions of different screens are.
+
+   python benchmarks/suite.py                                   # print results
+   python benchmarks/suite.py --output results.json             # save them as JSON
+   python benchmarks/suite.py --compare benchmarks/baseline.json  # exit 1 on regressions
+   python benchmarks/suite.py --filter find/1080p               # only benchmarks starting with it
+
+   Timings depend on the machine: regenerate the baseline (--output benchmarks/baseline.json)
+   on the machine the comparisons run on. --compare runs with settings.matching_threads
+   of the baseline, since the default follows the number of CPUs.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pikuli import Region, Match, Location, Pattern, Screen, Watcher
+from pikuli.Settings import settings
+from pikuli.synthetic import SyntheticDisplay, install
+from pikuli.pattern_cache import pattern_cache
+from pikuli.pixel_buffer import buffer_to_bgr
+
+# (name, width, height, monitors: [(x, y, w, h)] or None - one monitor)
+SCREENS = [('1080p', 1920, 1080, None), ('1440p', 2560, 1440, None), ('4K', 3840, 2160, None),
+           ('2x1080p', 3840, 1080, [(0, 0, 1920, 1080), (1920, 0, 1920, 1080)])]  # side by side
+PATTERN_SIDES = [16, 48, 128]
+METHODS = ['exhaustive', 'pyramid', 'gray']
+ICON_COPIES = 3  # occurrences of every pattern on a screen
+MIN_TIME = 0.3  # seconds spent in every benchmark
+DEFAULT_THRESHOLD = 0.2  # slowdown against the baseline reported as a regression
+
+
+def synthetic_screen(w, h, seed=0):
+    """ Flat panels with noise, text-like strokes and icons: closer to a GUI than pure noise """
+    rnd = np.random.RandomState(seed)
+    screen = np.full((h, w, 3), 235, np.uint8)
+    for _ in range(w * h // 40000):
+        (x, y) = (rnd.randint(0, w - 200), rnd.randint(0, h - 100))
+        cv2.rectangle(screen, (x, y), (x + rnd.randint(40, 200), y + rnd.randint(20, 100)),
+                      tuple(int(c) for c in rnd.randint(0, 256, 3)), -1)
+        cv2.putText(screen, 'Lorem ipsum %i' % rnd.randint(1000), (x + 3, y + 15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
+    return cv2.add(screen, rnd.randint(0, 4, screen.shape).astype(np.uint8))  # saturated, no wrap-around
+
+
+def icon(side, seed):
+    """ Distinctive pattern: a few colored shapes on a gradient """
+    rnd = np.random.RandomState(seed)
+    img = np.dstack([np.tile(np.linspace(40, 220, side), (side, 1))] * 3).astype(np.uint8)
+    for _ in range(4):
+        center = tuple(int(c) for c in rnd.randint(0, side, 2))
+        cv2.circle(img, center, max(2, side // 6), tuple(int(c) for c in rnd.randint(0, 256, 3)), -1)
+    return img
+
+
+def icon_places(w, h, k):
+    """ Top-left corners of ICON_COPIES copies of the k-th icon """
+    return [(w * (2 * n + 1) // (2 * ICON_COPIES), h * (2 * k + 1) // (2 * len(PATTERN_SIDES)))
+            for n in range(ICON_COPIES)]
+
+
+def screen_regions(count):
+    """ Region of the whole screen for screens 1..count """
+    regions = []
+    for n in range(1, count + 1):
+        region = Region(*Screen(n).area)
+        region.screen_number = n
+        regions.append(region)
+    return regions
+
+
+def measure(func):
+    """ Best and median seconds per call; calls are repeated for at least MIN_TIME seconds """
+    func()  # warm-up: lazy imports, caches, thread pools
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= MIN_TIME / 5 or number >= 1000000:
+            break
+        number *= 10
+    runs = [timeit.timeit(func, number=number) / number for _ in range(5)]
+    runs.sort()
+    return {'seconds': runs[0], 'median': runs[len(runs) // 2], 'iterations': number * len(runs)}
+
+
+class Suite(object):
+    def __init__(self, name_filter=None):
+        self.name_filter = name_filter
+        self.results = {}
+        self.tmp_dir = tempfile.mkdtemp(prefix='pikuli_bench_')
+
+    def run(self, name, func):
+        if self.name_filter and not name.startswith(self.name_filter):
+            return
+        self.results[name] = measure(func)
+        r = self.results[name]
+        print('{name:36} {best:12.6f} s  (median {median:.6f} s, {n} runs)'.format(
+            name=name, best=r['seconds'], median=r['median'], n=r['iterations']))
+
+    def pattern_files(self, screen):
+        """ Draws ICON_COPIES copies of an icon of every size in PATTERN_SIDES; returns {side: PNG file} """
+        (h, w) = screen.shape[:2]
+        files = {}
+        for (k, side) in enumerate(PATTERN_SIDES):
+            img = icon(side, k)
+            for (x, y) in icon_places(w, h, k):
+                screen[y:y + side, x:x + side] = img
+            files[side] = os.path.join(self.tmp_dir, 'icon_{}.png'.format(side))
+            cv2.imwrite(files[side], img)
+        return files
+
+    def bench_screens(self):
+        for (screen_name, w, h, layout) in SCREENS:
+            screen = synthetic_screen(w, h)
+            files = self.pattern_files(screen)
+            install(SyntheticDisplay(screen, monitors=layout))
+            regions = screen_regions(len(layout or [None]))
+            fields = [region.search_area for region in regions]
+            for side in PATTERN_SIDES:
+                methods = METHODS if screen_name == '1080p' else METHODS[:1]
+                for method in methods:
+                    ptn = Pattern(files[side], method=method)
+                    self.run('find/{}/{}/{}'.format(screen_name, side, method),
+                             lambda: [region._find(ptn, field, max_results=1)
+                                      for (region, field) in zip(regions, fields)])
+            ptn = Pattern(files[48])
+            assert sum(len(region.find_all(ptn)) for region in regions) == ICON_COPIES
+            self.run('find_all/{}/48'.format(screen_name), lambda: [region.find_all(ptn) for region in regions])
+            if len(regions) > 1:
+                self.run('capture/{}'.format(screen_name), lambda: [region.search_area for region in regions])
+                watcher = Watcher('all')
+                for region in regions:
+                    watcher.appear(region, files[48])
+                self.run('watch/{}/48'.format(screen_name), lambda: watcher.wait(timeout=0))
+
+            bgra = cv2.cvtColor(screen, cv2.COLOR_BGR2BGRA).tobytes()
+            self.run('convert/{}/BGRA'.format(screen_name), lambda: buffer_to_bgr(bgra, w, h, channel_order='BGRA'))
+            rgb = cv2.cvtColor(screen, cv2.COLOR_BGR2RGB).tobytes()
+            self.run('convert/{}/RGB'.format(screen_name), lambda: buffer_to_bgr(rgb, w, h, channel_order='RGB'))
+
+    def bench_objects(self):
+        screen = synthetic_screen(1920, 1080)
+        path = self.pattern_files(screen)[48]
+        install(SyntheticDisplay(screen))
+        ptn = Pattern(path)
+        self.run('construct/Region', lambda: Region(10, 20, 300, 200))
+        self.run('construct/Match', lambda: Match(10, 20, 48, 48, 0.999, ptn))
+        self.run('construct/Location', lambda: Location(10, 20))
+        self.run('construct/Region.get_center', lambda: Region(10, 20, 300, 200).get_center())
+        self.run('pattern/load', lambda: Pattern(path))
+
+        def load_uncached():
+            pattern_cache.clear()
+            Pattern(path)
+        self.run('pattern/load_uncached', load_uncached)
+
+    def close(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def meta():
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'matching_threads': settings.matching_threads,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(results, baseline, threshold, name_filter=None):
+    """ Prints the comparison; returns names of benchmarks slower than baseline by more than threshold """
+    regressions = []
+    print('\n{:36} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline, s', 'current, s', 'ratio'))
+    for name in sorted(set(results) & set(baseline)):
+        ratio = results[name]['seconds'] / baseline[name]['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print('{:36} {:12.6f} {:12.6f} {:8.2f}{}'.format(
+            name, baseline[name]['seconds'], results[name]['seconds'], ratio, flag))
+    for name in sorted(set(baseline) - set(results)):
+        if name_filter and not name.startswith(name_filter):
+            continue
+        print('{:36} missing in current results'.format(name))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown reported as a regression (default %(default)s)')
+    parser.add_argument('--filter', help='run only benchmarks which names start with this prefix')
+    args = parser.parse_args()
+
+    for name in list(logging.Logger.manager.loggerDict):
+        if name.startswith('pikuli'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        threads = baseline['meta'].get('matching_threads')
+        if threads is not None and threads != settings.matching_threads:
+            print('matching_threads = {} as in the baseline (default {})'.format(threads, settings.matching_threads))
+            settings.matching_threads = threads
+
+    suite = Suite(args.filter)
+    try:
+        suite.bench_screens()
+        suite.bench_objects()
+    finally:
+        suite.close()
+
+    report = {'meta': meta(), 'results': suite.results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+    if baseline is not None:
+        regressions = compare(suite.results, baseline['results'], args.threshold, args.filter)
+        if regressions:
+            print('\n{} regression(s): {}'.format(len(regressions), ', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
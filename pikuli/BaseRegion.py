@@ -6,21 +6,17 @@
    Content can be defined using .find() or .findAll() methods, implemented in the descendant class
 """
 
-import cv2
-import numpy as np
-import platform
 from Location import Location
 from logger import PikuliLogger
 from common_exceptions import FailExit, FindFailed
+from matching import match_template, find_peaks, IncrementalMatcher
+from Settings import settings
+from frame_cache import frame_cache
+from capture_service import find_service
+from monitors import monitors
+from lazy_import import LazyModule
 
-current_platform = platform.system()
-
-if current_platform == 'Darwin':
-    from display_mac import Display
-elif current_platform == 'Windows':
-    from display_win import Display
-else:
-    raise NotImplementedError
+cv2 = LazyModule('cv2')
 
 DELAY_BETWEEN_CV_ATTEMPT = 1.0  # delay between attempts of recognition
 DEFAULT_FIND_TIMEOUT = 3.1
@@ -48,13 +44,14 @@ class BaseRegion(object):
                            if don't pass to constructor a DEFAULT_FIND_TIMEOUT will use.
         """
 
-        self.display = Display()
-        self.scaling_factor = self.display.get_monitor_info(1)[-1]
+        self.display = monitors.display
+        self.scaling_factor = monitors.scaling_factor(1)
         self.drag_location = None
         self.relations = ['top-left', 'center']
         (self.x, self.y, self.w, self.h) = (None, None, None, None)
         self.screen_number = 1
         self._last_match = None
+        self._incremental_matcher = None
 
         # human-readable id
         self.title = str(kwargs.get('title', 'New Region'))
@@ -71,8 +68,8 @@ class BaseRegion(object):
         self._find_timeout = self._verify_timeout(
             kwargs.get('find_timeout', DEFAULT_FIND_TIMEOUT),
             err_msg='pikuli.{}'.format(type(self).__name__))
-        logger.debug('New Region with name "{name}" created (x:{x} y:{y} w:{w} h:{h} timeout:{t})'.format(
-                     name=self.title, x=self.x, y=self.y, w=self.w, h=self.h, t=self._find_timeout))
+        logger.debug('New Region with name "%s" created (x:%s y:%s w:%s h:%s timeout:%s)',
+                     self.title, self.x, self.y, self.w, self.h, self._find_timeout)
 
     def __str__(self):
         return 'Region "%s" (%i, %i, %i, %i)' % (self.title, self.x, self.y, self.w, self.h)
@@ -213,7 +210,15 @@ class BaseRegion(object):
 
     @property
     def search_area(self):
-        return self.display.take_screenshot(self.x, self.y, self.w, self.h, None)
+        """
+        Capture of the region. It is a read-only view if settings.frame_cache_ttl is set.
+        If a running CaptureService covers the region, it is a copy of the newest frame:
+        the ring slot of the frame is reused by later captures.
+        """
+        service = find_service(self)
+        if service is not None:
+            return service.take_copy(self)[1]
+        return frame_cache.take_screenshot(self.display, self.screen_number, self.x, self.y, self.w, self.h)
 
     def save_as_jpg(self, full_filename):
         cv2.imwrite(full_filename, self.display.take_screenshot(self.x, self.y, self.w, self.h),
@@ -222,13 +227,38 @@ class BaseRegion(object):
     def save_as_png(self, full_filename):
         cv2.imwrite(full_filename, self.display.take_screenshot(self.x, self.y, self.w, self.h))
 
-    def _find(self, ps, field):
-        res = cv2.matchTemplate(field, ps.cv2_pattern, cv2.TM_CCORR_NORMED)
-        loc = np.where(res > ps.similarity)  # 0.995
-        return map(lambda x, y, s: (int(x + self.x * self.scaling_factor),
-                                    int(y + self.y * self.scaling_factor),
-                                    float(s)),
-                   loc[1], loc[0], res[loc[0], loc[1]])
+    def _find(self, ps, field, max_results=None):
+        """
+        Returns list of (x, y, score): one item per distinct occurrence of the pattern,
+        the best score first. 'max_results' limits the list length (top-k).
+        """
+        return self._to_screen(self._find_in_field(ps, field, max_results))
+
+    def _to_screen(self, peaks):
+        """ (x, y, score) in pixels of the region capture -> (x, y, score) in screen pixels """
+        return [(int(x + self.x * self.scaling_factor),
+                 int(y + self.y * self.scaling_factor),
+                 s) for (x, y, s) in peaks]
+
+    def _find_in_field(self, ps, field, max_results=None, window=None):
+        """
+        Same as _find(), but (x, y) are pixels of 'field'.
+        'window' - (x0, y0, x1, y1) part of 'field' to search in; None - the whole field.
+        """
+        (ox, oy) = (0, 0)
+        if window is not None:
+            (ox, oy, x1, y1) = window
+            if x1 - ox < ps.get_w or y1 - oy < ps.get_h:
+                return []
+            res = match_template(field[oy:y1, ox:x1], ps)
+        elif settings.incremental_matching:
+            if self._incremental_matcher is None:
+                self._incremental_matcher = IncrementalMatcher()
+            res = self._incremental_matcher.match(field, ps)
+        else:
+            res = match_template(field, ps)
+        peaks = find_peaks(res, ps.similarity, ps.get_w, ps.get_h, max_results=max_results)  # 0.995
+        return [(x + ox, y + oy, s) for (x, y, s) in peaks]
 
     def get_last_match(self):
         if not self._last_match or self._last_match == []:
@@ -5,11 +5,11 @@
    user actions emulation (clicks, text input)
 """
 
+import threading
 import time
-from mouse import Mouse
-from keyboard import Keyboard
 from common_exceptions import FailExit
 from logger import PikuliLogger
+from frame_cache import frame_cache
 
 DRAGnDROP_MOVE_DELAY = 0.005
 DELAY_BETWEEN_CLICK_AND_TYPE = 1
@@ -18,17 +18,21 @@ logger = PikuliLogger(__name__).logger
 
 
 class Location(object):
+    """
+    Value object: coordinates and title only. Mouse and Keyboard (and their platform
+    backends) are created once per process, on first use, and shared by all Locations.
+    """
+    __slots__ = ('x', 'y', 'title')
+
+    _mouse = None
+    _keyboard = None
+    _devices_lock = threading.Lock()
 
     def __init__(self, x, y, title="New Location"):
         self.title = title
-        self.mouse = Mouse()
-        self.keyboard = Keyboard()
         try:
             self.x = int(x)
             self.y = int(y)
-            self._is_mouse_down = False
-            logger.debug('New Location with name "{name}" created ({x}, {y})'.format(
-                         name=self.title, x=self.x, y=self.y))
         except:
             raise FailExit('Incorect Location class constructor call:'
                            '\n\tx = {x}\n\ty = {y}\n\ttitle= %{title}'.format(
@@ -37,13 +41,50 @@ class Location(object):
     def __str__(self):
         return 'Location ({x}, {y})'.format(x=self.x, y=self.y)
 
+    def __eq__(self, other):
+        return isinstance(other, Location) and self.x == other.x and self.y == other.y
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    @classmethod
+    def use_devices(cls, mouse=None, keyboard=None):
+        """ Replaces the shared Mouse and Keyboard, e.g. with synthetic.StubMouse and StubKeyboard """
+        with cls._devices_lock:
+            if mouse is not None:
+                cls._mouse = mouse
+            if keyboard is not None:
+                cls._keyboard = keyboard
+
+    @property
+    def mouse(self):
+        if Location._mouse is None:
+            with Location._devices_lock:
+                if Location._mouse is None:
+                    from mouse import Mouse
+                    Location._mouse = Mouse()
+        return Location._mouse
+
+    @property
+    def keyboard(self):
+        if Location._keyboard is None:
+            with Location._devices_lock:
+                if Location._keyboard is None:
+                    from keyboard import Keyboard
+                    Location._keyboard = Keyboard()
+        return Location._keyboard
+
     @property
     def coordinates(self):
         return self.x, self.y
 
     def mouse_move(self, delay=0):
         self.mouse.move(self.x, self.y, delay)
-        logger.debug('Mouse moved to ({x}, {y})'.format(x=self.x, y=self.y))
+        frame_cache.invalidate()
+        logger.debug('Mouse moved to (%s, %s)', self.x, self.y)
 
     def offset(self, dx, dy):
         if isinstance(dx, int) and isinstance(dy, int):
@@ -77,23 +118,28 @@ class Location(object):
 
     def click(self, after_click_delay=0):
         self.mouse.click(self.x, self.y, after_click_delay)
-        logger.debug('mouse left click in ({x}, {y})'.format(x=self.x, y=self.y))
+        frame_cache.invalidate()
+        logger.debug('mouse left click in (%s, %s)', self.x, self.y)
 
     def mouse_down(self):
         self.mouse.key_down(self.x, self.y)
-        logger.debug('mouse down in ({x}, {y})'.format(x=self.x, y=self.y))
+        frame_cache.invalidate()
+        logger.debug('mouse down in (%s, %s)', self.x, self.y)
 
     def mouse_up(self):
         self.mouse.key_up(self.x, self.y)
-        logger.debug('mouse up in ({x}, {y})'.format(x=self.x, y=self.y))
+        frame_cache.invalidate()
+        logger.debug('mouse up in (%s, %s)', self.x, self.y)
 
     def right_click(self, after_click_delay=0):
         self.mouse.right_click(self.x, self.y, after_click_delay)
-        logger.debug('mouse right click in ({x}, {y})'.format(x=self.x, y=self.y))
+        frame_cache.invalidate()
+        logger.debug('mouse right click in (%s, %s)', self.x, self.y)
 
     def double_click(self, after_click_delay=0):
         self.mouse.double_click(self.x, self.y, after_click_delay)
-        logger.debug('mouse double click in ({x}, {y})'.format(x=self.x, y=self.y))
+        frame_cache.invalidate()
+        logger.debug('mouse double click in (%s, %s)', self.x, self.y)
 
     def scroll(self, direction=1, count=1, click=True):
         # direction:
@@ -101,9 +147,9 @@ class Location(object):
         #  -1 - backward
         for _ in range(0, int(count)):
             self.mouse.scroll(self.x, self.y, direction, click)
-        logger.debug('scroll in ({x}, {y}) {count} times, {dir_} direction'.format(
-                     x=self.x, y=self.y, count=count,
-                     dir_='forward' if direction == 1 else 'backward'))
+        frame_cache.invalidate()
+        logger.debug('scroll in (%s, %s) %s times, %s direction',
+                     self.x, self.y, count, 'forward' if direction == 1 else 'backward')
 
     def drag_to(self, *dest_location):
 
@@ -126,12 +172,14 @@ class Location(object):
             raise FailExit('')
 
         self.mouse.drag_to(self.x, self.y, dest_x, dest_y, delay)
-        logger.debug('Mouse drag from (%i, %i) to (%i, %i)' %
-                     (self.x, self.y, dest_x, dest_y))
+        frame_cache.invalidate()
+        logger.debug('Mouse drag from (%i, %i) to (%i, %i)',
+                     self.x, self.y, dest_x, dest_y)
         return self
 
     def drop(self):
         self.mouse.drop()
+        frame_cache.invalidate()
         logger.debug('Mouse drop')
 
     def dragndrop(self, *dest_location):
@@ -140,12 +188,14 @@ class Location(object):
         return self
 
     def type(self, text, modifiers=None, click=True, click_type_delay=DELAY_BETWEEN_CLICK_AND_TYPE):
-        log = 'Typed "{}"'.format(text)
-        log += ' with modifiers "{}"'.format(modifiers) if modifiers is not None else ''
         if click:
             self.click(after_click_delay=click_type_delay)
         self.keyboard.type_text(str(text), modifiers)
-        logger.info(log)
+        frame_cache.invalidate()
+        if modifiers is None:
+            logger.info('Typed "%s"', text)
+        else:
+            logger.info('Typed "%s" with modifiers "%s"', text, modifiers)
 
     def enter_text(self, text, modifiers=None, click=True,
                    click_type_delay=DELAY_BETWEEN_CLICK_AND_TYPE):
@@ -154,3 +204,4 @@ class Location(object):
         self.keyboard.type_text('a', 'CTRL')
         time.sleep(click_type_delay)
         self.keyboard.type_text(str(text), modifiers)
+        frame_cache.invalidate()
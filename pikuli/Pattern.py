@@ -7,17 +7,35 @@
 import os
 from Settings import settings
 from common_exceptions import FailExit
-import cv2
+from matching import verify_method
+from pattern_cache import pattern_cache
+from pattern_bundle import find_bundled
+from lazy_import import LazyModule
+
+cv2 = LazyModule('cv2')
 
 
 class Pattern(object):
-    def __init__(self, img_path, similarity=None):
-        (self.__similarity, self.__img_path) = (None, None)
+    def __init__(self, img_path, similarity=None, method=None):
+        """
+        method - matching engine for this pattern ('exhaustive', 'pyramid' or 'gray').
+                 If it is None, settings.match_method will use.
+        """
+        (self.__similarity, self.__img_path, self.__method) = (None, None, None)
+        self.cv2_pattern = None
+        # Identifies the pixels of cv2_pattern for caches of results: (mtime, size) of the file
+        # or the address of the image in a memory mapped bundle.
+        self.stamp = None
         img_path = str(img_path)
 
         try:
             _path = os.path.abspath(img_path)
-            if os.path.exists(_path) and os.path.isfile(_path):
+            bundled = find_bundled(img_path)
+            if bundled is not None:
+                # Memory mapped view of a compiled bundle; read-only.
+                (self.__img_path, self.cv2_pattern) = bundled
+                self.stamp = ('bundle', self.cv2_pattern.__array_interface__['data'][0])
+            elif os.path.exists(_path) and os.path.isfile(_path):
                 self.__img_path = _path
             else:
                 for _path in settings.list_image_path():
@@ -35,23 +53,52 @@ class Pattern(object):
             else:
                 raise FailExit('error around "similarity" parameter')
 
+            if method is not None:
+                self.__method = verify_method(method)
+
         except FailExit as e:
             raise FailExit('Incorect Pattern class constructor call:\n    img_path = %s'
                            '\n    abspath(img_path) = %s\n    similarity = %s\n    message: %s' %
                            (str(img_path), str(self.__img_path), str(similarity), str(e)))
 
-        self.cv2_pattern = cv2.imread(self.__img_path)
+        if self.cv2_pattern is None:
+            # Shared with other Patterns of the same file; read-only.
+            (self.stamp, self.cv2_pattern) = pattern_cache.get_stamped(self.__img_path)
         self.w = int(self.cv2_pattern.shape[1])
         self.h = int(self.cv2_pattern.shape[0])
+        self._pyramid = [self.cv2_pattern]
+        self._gray = {}
 
     def __str__(self):
         return 'Pattern of "%s" with similarity = %f' % (self.__img_path, self.__similarity)
 
     def similar(self, similarity):
-        return Pattern(self.__img_path, similarity)
+        return Pattern(self.__img_path, similarity, self.__method)
 
     def exact(self):
-        return Pattern(self.__img_path, 1.0)
+        return Pattern(self.__img_path, 1.0, self.__method)
+
+    def get_pyramid_level(self, level):
+        """
+        Pattern image reduced 'level' times with cv2.pyrDown (level 0 is cv2_pattern itself).
+        Levels are computed once and kept with the pattern.
+        """
+        while len(self._pyramid) <= level:
+            self._pyramid.append(cv2.pyrDown(self._pyramid[-1]))
+        return self._pyramid[level]
+
+    def get_gray(self, scale=1):
+        """
+        Single-channel copy of the pattern reduced 'scale' times (scale is integer).
+        Computed once and kept with the pattern.
+        """
+        if scale not in self._gray:
+            gray = cv2.cvtColor(self.cv2_pattern, cv2.COLOR_BGR2GRAY)
+            if scale > 1:
+                gray = cv2.resize(gray, (max(1, self.w // scale), max(1, self.h // scale)),
+                                  interpolation=cv2.INTER_AREA)
+            self._gray[scale] = gray
+        return self._gray[scale]
 
     def get_filename(self, full_path=True):
         if full_path:
@@ -63,6 +110,10 @@ class Pattern(object):
     def similarity(self):
         return self.__similarity
 
+    @property
+    def method(self):
+        return self.__method
+
     @property
     def get_w(self):
         return self.w
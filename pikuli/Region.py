@@ -4,17 +4,26 @@
    Region - descendant class of BaseRegion.
 """
 
-import datetime
 import os
 import time
 
 from common_exceptions import FailExit, FindFailed
 from Location import Location
 from BaseRegion import BaseRegion, logger, DELAY_BETWEEN_CV_ATTEMPT
+from matching import frame_changed, map_patterns
+from location_hints import location_hints
+from capture_service import find_service
+from wait_task import WaitTask, Return, run
+from tracing import traced, traced_steps, current as current_span, clock as trace_clock
+from metrics import metrics
+from failure_artifacts import failure_artifacts
 from Match import Match
 from Pattern import Pattern
 from Screen import Screen
 from Settings import settings
+from lazy_import import LazyModule
+
+np = LazyModule('numpy')
 
 
 class Region(BaseRegion):
@@ -170,45 +179,171 @@ class Region(BaseRegion):
                 length=length))
         return reg
 
-    def find_all(self, pattern, delay_before=0):
+    @traced('find_all')
+    def find_all(self, pattern, delay_before=0, max_results=None):
+        """
+        Returns list of Match objects: one per distinct occurrence of the pattern, the best score first.
+        Overlapping candidates are merged into one Match.
+        if max_results is set - only max_results best matches will return
+        """
+        (pattern, results) = self._find_all(pattern, delay_before, max_results)
+        self._last_match = map(lambda pt: Match(pt[0], pt[1],
+                                                pattern.get_w, pattern.get_h,
+                                                pt[2], pattern), results)
+        logger.info('total found %i matches of "%s"', len(self._last_match), pattern.get_filename(full_path=False))
+        return self._last_match
+
+    @traced('find_all_points')
+    def find_all_points(self, pattern, delay_before=0, max_results=None):
+        """
+        Same search as find_all(), but returns centers of the matches as (N, 2) numpy array
+        of (x, y) rows, the best score first, without building Match objects.
+        """
+        (pattern, results) = self._find_all(pattern, delay_before, max_results)
+        points = np.array([pt[:2] for pt in results], dtype=np.int32).reshape(-1, 2)
+        points += (int(pattern.get_w / 2), int(pattern.get_h / 2))
+        logger.info('total found %i matches of "%s"', len(points), pattern.get_filename(full_path=False))
+        return points
+
+    def _find_all(self, pattern, delay_before, max_results):
+        """ Checks arguments of find_all(); returns (Pattern, [(x, y, score)]) """
         err_msg = 'Incorrect find_all() method call:' \
-                  '\n\tpattern = {pattern}\n\tdelay_before = {delay}'.format(
-                      pattern=str(pattern).split(os.pathsep)[-1], delay=delay_before)
+                  '\n\tpattern = {pattern}\n\tdelay_before = {delay}\n\tmax_results = {max_results}'.format(
+                      pattern=str(pattern).split(os.pathsep)[-1], delay=delay_before, max_results=max_results)
         try:
             delay_before = float(delay_before)
         except ValueError:
             raise FailExit(err_msg)
+        if max_results is not None and (not isinstance(max_results, int) or max_results <= 0):
+            raise FailExit(err_msg)
 
         if isinstance(pattern, str):
             pattern = Pattern(pattern)
         if not isinstance(pattern, Pattern):
             raise FailExit(err_msg)
 
-        time.sleep(delay_before)
-        results = self._find(pattern, self.search_area)
-        self._last_match = map(lambda pt: Match(pt[0], pt[1],
-                                                pattern.get_w, pattern.get_h,
-                                                pt[2], pattern), results)
-        logger.info('total found {count} matches of "{file}"'.format(
-                    count=len(self._last_match), file=pattern.get_filename(full_path=False)))
-        return self._last_match
+        span = current_span()
+        self._sleep(span, delay_before)
+        started = trace_clock()
+        field = self._capture(span)
+        find = lambda ptn, field: self._find(ptn, field, max_results=max_results)
+        if span is not None:
+            span.set_patterns([pattern])
+            find = span.timed(find)
+        results = find(pattern, field)
+        metrics.observe('pikuli_find_all_seconds', trace_clock() - started, pattern=pattern.get_filename(full_path=False))
+        if span is not None:
+            span.outcome = 'hit' if results else 'miss'
+        return (pattern, results)
 
-    def _wait_for_appear_or_vanish(self, pattern, timeout, condition):
-        """
-            pattern - could be String or List.
-                      If isinstance(pattern, list), the first element will return.
-                      It can be used when it's necessary to find one of the several images
-        """
+    def _capture(self, span):
+        """ search_area; its time is added to the span of the traced call (if any) """
+        if span is None:
+            return self.search_area
+        started = trace_clock()
+        field = self.search_area
+        span.add_capture(trace_clock() - started, field)
+        return field
+
+    @staticmethod
+    def _sleep(span, seconds):
+        """ time.sleep(); its time is added to the span (if any) """
+        if span is None:
+            return time.sleep(seconds)
+        started = trace_clock()
+        try:
+            time.sleep(seconds)
+        finally:
+            span.add_sleep(trace_clock() - started)
+
+    @staticmethod
+    def _to_patterns(pattern):
+        """ String, Pattern or list of them -> new list of Pattern objects """
         fail_exit_text = 'bad "pattern" argument; it should be a string (path to image file) or Pattern object: {}'
 
         if not isinstance(pattern, list):
             pattern = [pattern]
+        else:
+            pattern = list(pattern)
 
         for (_i, p) in enumerate(pattern):
             if isinstance(p, str):
                 pattern[_i] = Pattern(p)
             elif not isinstance(p, Pattern):
                 raise FailExit(fail_exit_text.format(p))
+        return pattern
+
+    def _to_match(self, ptn, res):
+        return Match(int(res[0] / self.scaling_factor),
+                     int(res[1] / self.scaling_factor),
+                     int(ptn.get_w / self.scaling_factor),
+                     int(ptn.get_h / self.scaling_factor),
+                     res[2], ptn)
+
+    def _find_best(self, ptn, field):
+        """
+        Returns [(x, y, score)] of the best occurrence of the pattern in 'field' or [].
+        With settings.use_location_hints the window around the location where the pattern
+        was found last time in this region is searched first. In this case the returned
+        occurrence is the one near the hint even if a better one exists elsewhere.
+        """
+        if not settings.use_location_hints:
+            return self._find(ptn, field, max_results=1)
+
+        # Hints are kept in pixels of the capture, the same space the window is cut from
+        window = location_hints.window(ptn, self, field.shape)
+        peaks = []
+        if window is not None:
+            peaks = self._find_in_field(ptn, field, max_results=1, window=window)
+            location_hints.count(hit=len(peaks) != 0)
+        if not peaks:
+            peaks = self._find_in_field(ptn, field, max_results=1)
+        if peaks:
+            location_hints.put(ptn, self, peaks[0][0], peaks[0][1])
+        return self._to_screen(peaks)
+
+    def _match_patterns(self, patterns, field, condition):
+        """
+        Checks all patterns against one capture 'field' of the search area,
+        so every pattern sees the same instant of the screen. Patterns are matched
+        in parallel (settings.matching_threads); the first hit cancels patterns not started yet.
+        Returns (pattern, best result) for the first pattern in 'patterns' that has appeared,
+        (pattern, None) for the first pattern that has vanished or None.
+        """
+        if condition == 'appear':
+            met = lambda results: len(results) != 0
+            find = self._find_best
+        else:
+            met = lambda results: len(results) == 0
+            find = lambda ptn, field: self._find(ptn, field, max_results=1)
+        span = current_span()
+        if span is not None:
+            find = span.timed(find)
+
+        # The best result goes first; if several results have the same 'score'
+        # the first found one is chosen.
+        outcomes = map_patterns(lambda ptn: find(ptn, field), patterns, stop=met)
+        if outcomes and met(outcomes[-1]):
+            ptn = patterns[len(outcomes) - 1]
+            return (ptn, outcomes[-1][0] if condition == 'appear' else None)
+        return None
+
+    def _wait_for_appear_or_vanish(self, pattern, timeout, condition):
+        """ Runs _wait_steps() on the calling thread """
+        return run(self._wait_steps(pattern, timeout, condition))
+
+    def _wait_steps(self, pattern, timeout, condition):
+        """
+            Wait generator (see wait_task) for 'condition' of 'pattern': yields the delays between polls,
+            raises Return(Match) when the pattern appears, Return(None) when it vanishes, FindFailed on timeout.
+            pattern - could be String or List.
+                      If isinstance(pattern, list), the first element will return.
+                      It can be used when it's necessary to find one of the several images
+        """
+        pattern = self._to_patterns(pattern)
+
+        if condition not in ('appear', 'vanish'):
+            raise FailExit('unknown condition: "{}"'.format(condition))
 
         if timeout is None:
             timeout = self._find_timeout
@@ -220,38 +355,97 @@ class Region(BaseRegion):
             except ValueError:
                 raise FailExit('Incorrect argument: timeout = {}'.format(timeout))
 
+        span = current_span()
+        if span is not None:
+            span.set_patterns(pattern)
+
+        started = trace_clock()
+        service = find_service(self)
+        if service is not None:
+            for seconds in self._frame_steps(service, pattern, timeout, condition, span, started):
+                yield seconds
+
         prev_field = None
         elaps_time = 0
+        polls = 0
         while True:
-            if prev_field is None or (prev_field != self.search_area).all():
-                for ptn in pattern:
-                    results = self._find(ptn, self.search_area)
-                    if condition == 'appear':
-                        if len(results) != 0:
-                            # Found something. Choose one result with best 'score'.
-                            # If several results has the same 'score' a first found result will choose
-                            res = max(results, key=lambda x: x[2])
-                            logger.info(' "%s" has been found in(%i, %i)' % (
-                                ptn.get_filename(full_path=False), res[0], res[1]))
-                            return Match(int(res[0] / self.scaling_factor),
-                                         int(res[1] / self.scaling_factor),
-                                         int(ptn.get_w / self.scaling_factor),
-                                         int(ptn.get_h / self.scaling_factor),
-                                         res[2], ptn)
-                    elif condition == 'vanish':
-                        if len(results) == 0:
-                            logger.info('"{}" has vanished'.format(ptn.get_filename(full_path=False)))
-                            return
-                    else:
-                        raise FailExit('unknown condition: "{}"'.format(condition))
-
-            time.sleep(DELAY_BETWEEN_CV_ATTEMPT)
+            # One capture per poll, shared by all patterns. If the area hasn't changed since
+            # the previous poll, the previous outcome (not appeared / not vanished) is still valid.
+            field = self._capture(span)
+            polls += 1
+            if frame_changed(prev_field, field):
+                prev_field = field
+                hit = self._match_patterns(pattern, field, condition)
+                if hit is not None:
+                    raise Return(self._met(hit, condition, span, started, polls))
+            elif span is not None:
+                span.unchanged += 1
+
+            slept = trace_clock()
+            yield DELAY_BETWEEN_CV_ATTEMPT
+            if span is not None:
+                span.add_sleep(trace_clock() - slept)
             elaps_time += DELAY_BETWEEN_CV_ATTEMPT
             if elaps_time >= timeout:
-                logger.warning('{} hasn`t been found'.format(ptn.get_filename(full_path=False)))
-                failed_images = ', '.join(map(lambda _p: _p.get_filename(full_path=False), pattern))
-                raise FindFailed('Unable to find "{file}" in {region}'.format(
-                    file=failed_images, region=str(self)))
+                self._fail_wait(pattern, condition, started, polls, field)
+
+    def _frame_steps(self, service, pattern, timeout, condition, span, started):
+        """
+        Same loop as _wait_steps, but over frames of a running CaptureService: polls
+        follow the rate of the service, every changed frame is matched once.
+        """
+        prev_seq = None
+        polls = 0
+        while True:
+            polled = trace_clock()
+            (seq, field) = service.take(self)
+            polls += 1
+            if span is not None:
+                span.add_capture(trace_clock() - polled, field)
+            if seq != prev_seq:
+                hit = self._match_patterns(pattern, field, condition)
+                # The frame could be overwritten by newer ones while matching - the outcome is not reliable then.
+                prev_seq = seq if service.is_current(seq) else None
+                if hit is not None and prev_seq is not None:
+                    raise Return(self._met(hit, condition, span, started, polls))
+            elif span is not None:
+                span.unchanged += 1
+
+            remaining = timeout - (trace_clock() - started)
+            if remaining <= 0:
+                # The ring slot may be reused any moment: copy it, then make sure it wasn't reused meanwhile.
+                frame = field.copy()
+                self._fail_wait(pattern, condition, started, polls, frame if service.is_current(seq) else None)
+            slept = trace_clock()
+            yield min(remaining, service.interval)
+            if span is not None:
+                span.add_sleep(trace_clock() - slept)
+
+    def _met(self, hit, condition, span, started, polls):
+        """ Result of a wait for 'condition' which has been met: Match for 'appear', None for 'vanish' """
+        (ptn, res) = hit
+        metrics.record_wait(ptn.get_filename(full_path=False), condition, 'hit' if condition == 'appear' else 'vanish',
+                            trace_clock() - started, polls)
+        if condition == 'appear':
+            logger.info(' "%s" has been found in(%i, %i)', ptn.get_filename(full_path=False), res[0], res[1])
+            if span is not None:
+                span.outcome = 'hit'
+            return self._to_match(ptn, res)
+        logger.info('"%s" has vanished', ptn.get_filename(full_path=False))
+        if span is not None:
+            span.outcome = 'vanish'
+
+    def _fail_wait(self, pattern, condition, started, polls, field):
+        """ Raises FindFailed carrying the last capture 'field' the patterns were matched against """
+        failed_images = ', '.join(map(lambda _p: _p.get_filename(full_path=False), pattern))
+        logger.warning('%s hasn`t been found', failed_images)
+        for ptn in pattern:
+            metrics.record_wait(ptn.get_filename(full_path=False), condition, 'timeout', trace_clock() - started, polls)
+        span = current_span()
+        if span is not None:
+            span.outcome = 'timeout'
+        raise FindFailed('Unable to find "{file}" in {region}'.format(file=failed_images, region=str(self)),
+                         frame=field, patterns=pattern)
 
     def find(self, image_path, timeout=None, similarity=settings.min_similarity,
              exception_on_find_fail=True):
@@ -264,24 +458,68 @@ class Region(BaseRegion):
         If pattern did not found returns None if exception_on_find_fail is False
         else raises FindFailed exception
         """
-        logger.info(' try to find "{img}" with similarity {s}'.format(
-            img=str(image_path).split(os.path.sep)[-1], s=similarity))
+        return run(self._find_steps(image_path, timeout, similarity, exception_on_find_fail))
+
+    @traced_steps('find')
+    def _find_steps(self, image_path, timeout, similarity, exception_on_find_fail):
+        """ find() as a wait generator """
+        logger.info(' try to find "%s" with similarity %s', str(image_path).split(os.path.sep)[-1], similarity)
         try:
-            self._last_match = self._wait_for_appear_or_vanish(Pattern(image_path, similarity), timeout, 'appear')
+            for seconds in self._wait_steps(Pattern(image_path, similarity), timeout, 'appear'):
+                yield seconds
+        except Return as ret:
+            self._last_match = ret.value
+            raise
         except FailExit:
             self._last_match = None
             raise
         except FindFailed as ex:
             if exception_on_find_fail:
-                self.save_as_jpg(os.path.join(
-                    settings.find_failed_dir,
-                    '%s_%s.jpg' % (datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
-                                   str(image_path).split('/')[-1])))
+                frame = ex.frame
+                if frame is None:
+                    frame = self.display.take_screenshot(self.x, self.y, self.w, self.h)
+                failure_artifacts.save(frame, str(image_path).split('/')[-1], ex.patterns)
                 raise ex
-            else:
-                return None
-        else:
-            return self._last_match
+
+    @traced('find_any')
+    def find_any(self, patterns, timeout=None, exception_on_find_fail=True):
+        """
+        Waits during timeout (in seconds) for any of patterns to appear.
+        Every poll takes one capture and matches all patterns against it in parallel.
+        If several patterns are found in the same poll, Match of the first of them in 'patterns' returns.
+
+        If nothing found returns None if exception_on_find_fail is False
+        else raises FindFailed exception
+        """
+        try:
+            self._last_match = self._wait_for_appear_or_vanish(patterns, timeout, 'appear')
+        except FindFailed:
+            self._last_match = None
+            if exception_on_find_fail:
+                raise
+            return None
+        return self._last_match
+
+    @traced('find_each')
+    def find_each(self, patterns):
+        """
+        Searches every pattern once in one capture of the region; patterns are matched in parallel.
+        Returns list of Match objects (None for patterns not found) in the order of 'patterns'.
+        """
+        patterns = self._to_patterns(patterns)
+        span = current_span()
+        field = self._capture(span)
+        find = self._find_best
+        if span is not None:
+            span.set_patterns(patterns)
+            find = span.timed(find)
+        outcomes = map_patterns(lambda ptn: find(ptn, field), patterns)
+        self._last_match = [self._to_match(ptn, res[0]) if res else None
+                            for (ptn, res) in zip(patterns, outcomes)]
+        if span is not None:
+            span.outcome = 'hit' if any(outcomes) else 'miss'
+        logger.info('found %i of %i patterns', len(filter(None, self._last_match)), len(patterns))
+        return self._last_match
 
     def wait_vanish(self, image_path, timeout=None, similarity=settings.min_similarity):
         """
@@ -291,53 +529,91 @@ class Region(BaseRegion):
         if timeout = 0 - one search iteration will perform
         if timeout = None - default value will use
         """
-        logger.info('Check if "{file}" vanish during {t} with similarity {s}'.format(
-            file=str(image_path).split(os.path.sep)[-1],
-            t=timeout if timeout else str(self._find_timeout),
-            s=similarity))
+        return run(self._wait_vanish_steps(image_path, timeout, similarity))
+
+    @traced_steps('wait_vanish')
+    def _wait_vanish_steps(self, image_path, timeout, similarity):
+        """ wait_vanish() as a wait generator """
+        logger.info('Check if "%s" vanish during %s with similarity %s',
+                    str(image_path).split(os.path.sep)[-1], timeout if timeout else self._find_timeout, similarity)
         try:
-            self._wait_for_appear_or_vanish(Pattern(image_path, similarity), timeout, 'vanish')
+            for seconds in self._wait_steps(Pattern(image_path, similarity), timeout, 'vanish'):
+                yield seconds
         except FailExit:
             raise FailExit('Incorrect wait_vanish() method call:'
                            '\n\tregion = {region}\n\timage_path = {path}\n\ttimeout = {t}'.format(
                                region=str(self), path=image_path, t=timeout))
         except FindFailed:
-            logger.info('"{}" not vanished'.format(str(image_path).split(os.path.sep)[-1]))
-            return False
-        else:
-            logger.info('"{}" vanished'.format(str(image_path).split(os.path.sep)[-1]))
-            return True
+            logger.info('"%s" not vanished', str(image_path).split(os.path.sep)[-1])
+            raise Return(False)
+        except Return:
+            logger.info('"%s" vanished', str(image_path).split(os.path.sep)[-1])
+            raise Return(True)
         finally:
             self._last_match = None
 
     def exists(self, image_path):
+        return run(self._exists_steps(image_path))
+
+    @traced_steps('exists')
+    def _exists_steps(self, image_path):
+        """ exists() as a wait generator """
         self._last_match = None
         try:
-            self._last_match = self._wait_for_appear_or_vanish(image_path, 0, 'appear')
+            for seconds in self._wait_steps(image_path, 0, 'appear'):
+                yield seconds
         except FailExit:
             raise FailExit('Incorrect exists() method call:'
                            '\n\tregion = {region}\n\timage_path = {path}'.format(
                                region=str(self), path=image_path))
         except FindFailed:
-            return False
-        else:
-            return True
+            raise Return(False)
+        except Return as ret:
+            self._last_match = ret.value
+            raise Return(True)
 
     def wait(self, image_path=None, timeout=None):
         """
         For compatibility with Sikuli.
         Wait for pattern appear or just wait
         """
+        return run(self._wait_steps_for(image_path, timeout))
+
+    @traced_steps('wait')
+    def _wait_steps_for(self, image_path, timeout):
+        """ wait() as a wait generator """
         if image_path is None:
             if timeout:
-                time.sleep(timeout)
+                (span, slept) = (current_span(), trace_clock())
+                yield timeout
+                if span is not None:
+                    span.add_sleep(trace_clock() - slept)
         else:
             try:
-                self._last_match = self._wait_for_appear_or_vanish(image_path, timeout, 'appear')
+                for seconds in self._wait_steps(image_path, timeout, 'appear'):
+                    yield seconds
             except FailExit:
                 self._last_match = None
                 raise FailExit('Incorrect wait() method call:'
                                '\n\tregion = {region}\n\timage_path = {path}\n\ttimeout = {t}'.format(
                                    region=str(self), path=image_path, t=timeout))
-            else:
-                return self._last_match
+            except Return as ret:
+                self._last_match = ret.value
+                raise
+
+    def find_async(self, image_path, timeout=None, similarity=settings.min_similarity,
+                   exception_on_find_fail=True):
+        """ find() running on the wait scheduler. Returns WaitTask, its result() is what find() returns """
+        return WaitTask(self._find_steps(image_path, timeout, similarity, exception_on_find_fail))
+
+    def wait_async(self, image_path=None, timeout=None):
+        """ wait() running on the wait scheduler. Returns WaitTask """
+        return WaitTask(self._wait_steps_for(image_path, timeout))
+
+    def wait_vanish_async(self, image_path, timeout=None, similarity=settings.min_similarity):
+        """ wait_vanish() running on the wait scheduler. Returns WaitTask """
+        return WaitTask(self._wait_vanish_steps(image_path, timeout, similarity))
+
+    def exists_async(self, image_path):
+        """ exists() running on the wait scheduler. Returns WaitTask """
+        return WaitTask(self._exists_steps(image_path))
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import multiprocessing
 import os
 import sys
 import tempfile
 from logger import PikuliLogger
+from common_exceptions import FailExit
 
 logger = PikuliLogger('pikuli.Settings').logger
 
@@ -13,16 +15,58 @@ class Settings(object):
     def __init__(self):
         # Paths to images
         self.IMG_ADDITION_PATH = []
+        # Compiled pattern bundles (see pattern_bundle.py); looked up before IMG_ADDITION_PATH
+        self.PATTERN_BUNDLES = []
         # 0.995 is enough for stability.
         # 0.700 will find in every pixel
         self.min_similarity = 0.995
         self.use_api_for_screenshots = True
+        # Template matching engine: 'exhaustive', 'pyramid' or 'gray' (see matching.py).
+        # Pattern(..., method=...) overrides it for a single pattern.
+        self.match_method = 'exhaustive'
+        # 'pyramid' engine: number of pyrDown steps and how much lower than
+        # Pattern.similarity a coarse score may be to be refined.
+        self.pyramid_levels = 2
+        self.pyramid_margin = 0.02
+        # 'gray' engine: how many times the grayscale prefilter images are reduced
+        # (1 - not reduced) and how much lower than Pattern.similarity a grayscale
+        # score may be to be verified in color.
+        self.gray_scale = 1
+        self.gray_margin = 0.02
+        # Memory budget (bytes) of decoded pattern images shared between
+        # Pattern objects (see pattern_cache.py). 0 disables the cache.
+        self.pattern_cache_size = 256 * 1024 * 1024
+        # Worker threads used to match several patterns against one frame.
+        # 1 - patterns are matched one after another on the caller's thread.
+        self.matching_threads = multiprocessing.cpu_count()
+        # Keep correlation maps between polls of one Region and re-match only
+        # the tiles of the search area that changed (see matching.IncrementalMatcher).
+        self.incremental_matching = False
+        # Look for a pattern near the place it was found last time in the same region
+        # first (see location_hints.py); margin around that place, pixels.
+        self.use_location_hints = False
+        self.location_hint_margin = 32
+        # Seconds a screenshot may be shared by Regions of the same screen
+        # (see frame_cache.py). 0 - every Region takes its own screenshot.
+        self.frame_cache_ttl = 0
+        # Collect latency histograms and counters (see metrics.py) and, if metrics_file
+        # is set, write them there when the process exits (.json - JSON, else OpenMetrics text).
+        self.metrics = True
+        self.metrics_file = None
+        # Screenshots of failed find() calls (see failure_artifacts.py): the oldest ones are deleted
+        # when find_failed_dir holds more files or bytes than these limits (None - no limit).
+        self.find_failed_max_files = 200
+        self.find_failed_max_bytes = 100 * 1024 * 1024
+        # Save the correlation map of the best pattern next to the screenshot (*.scores.png)
+        self.find_failed_score_map = False
         defvals = self.__get_default_values()
         for k in defvals:
             setattr(self, k, defvals[k])
-        self.find_failed_dir = os.path.join(tempfile.gettempdir(), 'pikuli_find_failed')
-        if not os.path.isdir(self.find_failed_dir):
-            os.makedirs(self.find_failed_dir)
+        # Created when it is needed first time (see find_failed_dir)
+        self._find_failed_dir = os.path.join(tempfile.gettempdir(), 'pikuli_find_failed')
+        self._find_failed_dir_ready = False
+        # The directory of the main script is added to IMG_ADDITION_PATH when image paths are listed first time
+        self._main_path_pending = True
 
     def __get_default_values(self):
         defvals = {}
@@ -31,14 +75,38 @@ class Settings(object):
                 defvals[attr.split('_Settings__def_')[-1]] = getattr(self, attr)
         return defvals
 
+    def _add_main_path(self):
+        if self._main_path_pending:
+            self._main_path_pending = False
+            try:
+                main_path = os.path.dirname(os.path.abspath(sys.modules['__main__'].__file__))
+            except AttributeError:
+                logger.warning('unable to set default image path. You should use absolute paths')
+            else:
+                if main_path not in self.IMG_ADDITION_PATH:
+                    self.IMG_ADDITION_PATH.insert(0, main_path)
+
     def add_image_path(self, path):
+        self._add_main_path()
         if path not in self.IMG_ADDITION_PATH:
             self.IMG_ADDITION_PATH.append(path)
 
     def list_image_path(self):
+        self._add_main_path()
         for path in self.IMG_ADDITION_PATH:
             yield path
 
+    def add_pattern_bundle(self, path):
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            raise FailExit('pikuli: pattern bundle "%s" not found' % path)
+        if path not in self.PATTERN_BUNDLES:
+            self.PATTERN_BUNDLES.append(path)
+
+    def list_pattern_bundles(self):
+        for path in self.PATTERN_BUNDLES:
+            yield path
+
     def set_find_failed_dir(self, path):
         if not os.path.exists(path):
             try:
@@ -46,15 +114,24 @@ class Settings(object):
             except:
                 raise Exception('pikuli: can not set Settings.FindFailedDir to "%s"'
                                 '-- failed to create directory.' % str(path))
-        self.find_failed_dir = path
+        self._find_failed_dir = path
+        self._find_failed_dir_ready = True
 
     def get_find_failed_dir(self):
         return self.find_failed_dir
 
+    @property
+    def find_failed_dir(self):
+        if not self._find_failed_dir_ready:
+            if not os.path.isdir(self._find_failed_dir):
+                os.makedirs(self._find_failed_dir)
+            self._find_failed_dir_ready = True
+        return self._find_failed_dir
 
-settings = Settings()
+    @find_failed_dir.setter
+    def find_failed_dir(self, path):
+        self._find_failed_dir = path
+        self._find_failed_dir_ready = False
 
-try:
-    settings.add_image_path(os.path.dirname(os.path.abspath(sys.modules['__main__'].__file__)))
-except AttributeError:
-    logger.warning('unable to set default image path. You should use absolute paths')
+
+settings = Settings()
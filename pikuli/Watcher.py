@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Watcher - waits for several conditions "pattern appears in / vanishes from a region" at once.
+   Every poll takes one capture of the area covering all regions of a screen and checks
+   all conditions against it, so the cost of a poll grows with conditions, not with captures.
+
+       watcher = Watcher('any')
+       watcher.appear(dialog, 'ok.png')
+       watcher.vanish(toolbar, 'spinner.png')
+       [(index, match)] = watcher.wait(timeout=10)
+
+   mode:
+       'any'      - wait() returns as soon as one condition is met
+       'all'      - wait() returns when every condition has been met (at any poll)
+       'sequence' - conditions have to be met one after another in the order they were added
+"""
+
+from collections import namedtuple
+from BaseRegion import logger, DELAY_BETWEEN_CV_ATTEMPT, DEFAULT_FIND_TIMEOUT
+from common_exceptions import FailExit, FindFailed
+from capture_service import find_service
+from matching import frame_changed, map_patterns
+from Region import Region
+from tracing import traced, current as current_span, clock as trace_clock
+from metrics import metrics
+
+MODES = ('any', 'all', 'sequence')
+
+_Area = namedtuple('_Area', 'screen_number x y w h')
+
+
+class Watcher(object):
+    def __init__(self, mode='any'):
+        if mode not in MODES:
+            raise FailExit('unknown watcher mode: "{}"'.format(mode))
+        self.mode = mode
+        self.conditions = []  # [(region, [Pattern], 'appear' | 'vanish')]
+
+    def appear(self, region, pattern):
+        """
+        Adds condition "pattern appears in the region"; for a list of patterns - "any of them appears"
+        (Match of the first appeared one in the list is returned). Returns index of the condition
+        """
+        return self._add(region, pattern, 'appear')
+
+    def vanish(self, region, pattern):
+        """
+        Adds condition "pattern vanishes from the region"; for a list of patterns - "any of them vanishes".
+        Returns index of the condition
+        """
+        return self._add(region, pattern, 'vanish')
+
+    def _add(self, region, pattern, condition):
+        if not isinstance(region, Region):
+            raise FailExit('bad "region" argument; it should be Region object: {}'.format(region))
+        patterns = Region._to_patterns(pattern)
+        if not patterns:
+            raise FailExit('empty list of patterns')
+        self.conditions.append((region, patterns, condition))
+        return len(self.conditions) - 1
+
+    @traced('watch')
+    def wait(self, timeout=DEFAULT_FIND_TIMEOUT):
+        """
+        Polls the screen until the conditions are met according to the mode.
+        Returns [(index of condition, Match or None for 'vanish')] in the order the conditions were met;
+        in 'any' mode the list has one item.
+        Raises FindFailed after timeout seconds (timeout = 0 - one poll).
+        """
+        if not self.conditions:
+            raise FailExit('watcher has no conditions')
+        try:
+            timeout = float(timeout)
+            if timeout < 0:
+                raise ValueError
+        except ValueError:
+            raise FailExit('Incorrect argument: timeout = {}'.format(timeout))
+
+        span = current_span()
+        if span is not None:
+            span.set_patterns([ptn for (_, patterns, _) in self.conditions for ptn in patterns])
+        fired = []
+        pending = range(len(self.conditions))
+        prev_frames = {}
+        elaps_time = 0
+        while True:
+            for (screen, frame, area) in self._capture(pending, span):
+                if not frame_changed(prev_frames.get(screen), frame):
+                    if span is not None:
+                        span.unchanged += 1
+                    continue
+                prev_frames[screen] = frame
+                if self.mode == 'sequence':
+                    # The next condition may be met by the same frame already
+                    while self.conditions[pending[0]][0].screen_number == screen:
+                        met = self._check(pending[:1], frame, area)
+                        if not met:
+                            break
+                        fired.extend(met)
+                        if span is not None:
+                            span.outcome = 'hit'
+                        pending.remove(pending[0])
+                        if not pending:
+                            return fired
+                        # The next condition hasn't been checked against the frames seen so far
+                        prev_frames.clear()
+                        prev_frames[screen] = frame
+                    continue
+
+                candidates = [i for i in pending if self.conditions[i][0].screen_number == screen]
+                for (i, match) in self._check(candidates, frame, area):
+                    fired.append((i, match))
+                    if span is not None:
+                        span.outcome = 'hit'
+                    pending.remove(i)
+                    if self.mode == 'any' or not pending:
+                        return fired
+
+            Region._sleep(span, DELAY_BETWEEN_CV_ATTEMPT)
+            elaps_time += DELAY_BETWEEN_CV_ATTEMPT
+            if elaps_time >= timeout:
+                failed = ', '.join('{c} of "{p}" in {r}'.format(
+                    c=self.conditions[i][2], p=', '.join(ptn.get_filename(full_path=False) for ptn in self.conditions[i][1]),
+                    r=self.conditions[i][0]) for i in pending)
+                logger.warning('watcher: no {}'.format(failed))
+                raise FindFailed('Watcher timed out waiting for: {}'.format(failed))
+
+    def _capture(self, pending, span=None):
+        """ [(screen number, capture, (x, y, w, h) of the capture)]: one capture per screen covering its regions """
+        areas = {}
+        displays = {}
+        for i in pending:
+            region = self.conditions[i][0]
+            (x1, y1) = (region.x + region.w, region.y + region.h)
+            (ax0, ay0, ax1, ay1) = areas.get(region.screen_number, (region.x, region.y, x1, y1))
+            areas[region.screen_number] = (min(ax0, region.x), min(ay0, region.y), max(ax1, x1), max(ay1, y1))
+            displays[region.screen_number] = region.display
+        captures = []
+        for (screen, (x0, y0, x1, y1)) in sorted(areas.items()):
+            union = _Area(screen, x0, y0, x1 - x0, y1 - y0)
+            started = trace_clock()
+            service = find_service(union)
+            if service is not None:
+                # A view of the ring would change under prev_frames when its slot is reused
+                frame = service.take_copy(union)[1]
+            else:
+                frame = displays[screen].take_screenshot(x0, y0, x1 - x0, y1 - y0, None)
+                metrics.observe('pikuli_capture_seconds', trace_clock() - started)
+            if span is not None:
+                span.add_capture(trace_clock() - started, frame)
+            captures.append((screen, frame, union[1:]))
+        return captures
+
+    def _check(self, candidates, frame, area):
+        """ [(index, Match or None)] of the candidate conditions met in 'frame', in order of the indexes """
+        (ax, ay, aw, _) = area
+        scale = frame.shape[1] / float(aw)  # Retina captures have more pixels than points
+
+        def check(i):
+            (region, patterns, condition) = self.conditions[i]
+            field = frame[int((region.y - ay) * scale):int((region.y - ay + region.h) * scale),
+                          int((region.x - ax) * scale):int((region.x - ax + region.w) * scale)]
+            return region._match_patterns(patterns, field, condition)
+
+        stop = (lambda hit: hit is not None) if self.mode == 'any' else None
+        met = []
+        for (i, hit) in zip(candidates, map_patterns(check, candidates, stop=stop)):
+            if hit is not None:
+                (ptn, res) = hit
+                met.append((i, None if res is None else self.conditions[i][0]._to_match(ptn, res)))
+        return met
@@ -5,6 +5,7 @@ from .Match import Match
 from .Pattern import Pattern
 from .Region import Region
 from .Screen import Screen
+from .Watcher import Watcher
 
 
 __all__ = ['Settings',
@@ -12,4 +13,5 @@ __all__ = ['Settings',
            'Screen',
            'Match',
            'Location',
-           'Pattern']
+           'Pattern',
+           'Watcher']
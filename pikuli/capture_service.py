@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+   CaptureService - background thread capturing an area of the screen into a ring
+   of preallocated frames. While a service covering a Region is running, the Region
+   takes frames from it instead of capturing on the caller's thread, and wait loops
+   wake up on the first changed frame instead of sleeping DELAY_BETWEEN_CV_ATTEMPT.
+
+   Sequence numbers grow only when the picture changes: a capture equal to the newest
+   frame just refreshes its timestamp. A frame is a read-only view into the ring and
+   stays valid until 'size' newer frames have been captured (see is_current()); take_copy()
+   returns a copy for callers that keep the frame longer or may match it slower than that.
+   wait_newer(seq) waits for a changed frame; wait_captured_after(timestamp) waits
+   for any capture taken after a moment of clock() time.
+
+       with CaptureService(Screen-sized Region, rate=20):
+           region.wait('ok.png')
+"""
+
+import threading
+import time
+from logger import PikuliLogger
+from lazy_import import LazyModule
+from metrics import metrics
+
+np = LazyModule('numpy')
+
+clock = getattr(time, 'monotonic', time.time)
+logger = PikuliLogger('pikuli.Capture ').logger
+
+_services = []
+_services_lock = threading.Lock()
+
+
+def find_service(region):
+    """ Running CaptureService which area contains the region or None """
+    with _services_lock:
+        for service in _services:
+            if service.covers(region):
+                return service
+    return None
+
+
+class CaptureService(object):
+    def __init__(self, region, rate=10.0, size=4):
+        """
+        region - area to capture (Region, Screen-sized Region etc.)
+        rate   - captures per second
+        size   - number of frames in the ring
+        """
+        (self.x, self.y, self.w, self.h) = (region.x, region.y, region.w, region.h)
+        self.screen = region.screen_number
+        self.interval = 1.0 / rate
+        self.size = size
+        self._display = region.display
+        self._ring = None
+        self._timestamps = [None] * size
+        self._seq = 0  # sequence number of the newest frame
+        self._writing = 0  # sequence number of the frame being written
+        self._first_seq = 0  # the first frame in the current ring (it is reallocated when the shape changes)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        if self._thread is None:
+            self._capture()  # the first frame is available right after start()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='pikuli-capture')
+            self._thread.daemon = True
+            self._thread.start()
+            with _services_lock:
+                _services.append(self)
+            logger.info('capture of ({x}, {y}, {w}, {h}) started, {r} frames/s'.format(
+                x=self.x, y=self.y, w=self.w, h=self.h, r=1.0 / self.interval))
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            with _services_lock:
+                _services.remove(self)
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            logger.info('capture of ({x}, {y}, {w}, {h}) stopped'.format(x=self.x, y=self.y, w=self.w, h=self.h))
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = clock()
+            try:
+                self._capture()
+            except Exception as ex:
+                logger.error('capture failed: {}'.format(ex))
+            self._stop.wait(max(0.0, self.interval - (clock() - started)))
+
+    def _capture(self):
+        timestamp = clock()
+        frame = self._display.take_screenshot(self.x, self.y, self.w, self.h, None)
+        metrics.observe('pikuli_capture_seconds', clock() - timestamp)
+        if self._ring is None or self._ring.shape[1:] != frame.shape:
+            self._reallocate(frame, timestamp)
+            return
+        if self._seq and np.array_equal(self._ring[self._seq % self.size], frame):
+            with self._cond:
+                self._timestamps[self._seq % self.size] = timestamp
+                self._cond.notify_all()
+            return
+
+        slot = (self._seq + 1) % self.size
+        self._writing = self._seq + 1
+        np.copyto(self._ring[slot], frame)
+        with self._cond:
+            self._timestamps[slot] = timestamp
+            self._seq += 1
+            self._cond.notify_all()
+
+    def _reallocate(self, frame, timestamp):
+        """
+        New ring for frames of another shape (the first capture or the screen mode has changed).
+        Readers see the new ring only together with its first frame. Sequence numbers keep
+        growing, since waiters compare them, but all frames of the old ring become not current.
+        """
+        ring = np.empty((self.size,) + frame.shape, dtype=frame.dtype)
+        with self._cond:
+            self._seq += 1
+            self._writing = self._first_seq = self._seq
+            slot = self._seq % self.size
+            np.copyto(ring[slot], frame)
+            self._ring = ring
+            self._timestamps = [None] * self.size
+            self._timestamps[slot] = timestamp
+            self._cond.notify_all()
+
+    def covers(self, region):
+        return (region.screen_number == self.screen and
+                self.x <= region.x and self.y <= region.y and
+                region.x + region.w <= self.x + self.w and region.y + region.h <= self.y + self.h)
+
+    def newest(self):
+        """ (sequence number, timestamp, frame) of the newest frame """
+        with self._cond:
+            slot = self._seq % self.size
+            frame = self._ring[slot]
+            frame.flags.writeable = False
+            return (self._seq, self._timestamps[slot], frame)
+
+    def take(self, region):
+        """ (sequence number, read-only view of the region in the newest frame) """
+        (seq, _, frame) = self.newest()
+        scale = frame.shape[1] / float(self.w)  # Retina captures have more pixels than points
+        return (seq, frame[int((region.y - self.y) * scale):int((region.y - self.y + region.h) * scale),
+                           int((region.x - self.x) * scale):int((region.x - self.x + region.w) * scale)])
+
+    def take_copy(self, region):
+        """ (sequence number, copy of the region in the newest frame) made before the ring slot was reused """
+        while True:
+            (seq, view) = self.take(region)
+            frame = view.copy()
+            if self.is_current(seq):
+                return (seq, frame)
+
+    def wait_newer(self, seq, timeout):
+        """ Waits up to timeout seconds for a frame newer than 'seq'. Returns True if there is one """
+        deadline = clock() + timeout
+        with self._cond:
+            while self._seq <= seq:
+                remaining = deadline - clock()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def wait_captured_after(self, timestamp, timeout):
+        """
+        Waits up to timeout seconds for a capture taken after 'timestamp' (clock() time), even if
+        the picture hasn't changed. Returns newest() then or None on timeout.
+        """
+        deadline = clock() + timeout
+        with self._cond:
+            while True:
+                captured = self._timestamps[self._seq % self.size]
+                if captured is not None and captured > timestamp:
+                    return self.newest()
+                remaining = deadline - clock()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def is_current(self, seq):
+        """ False if the frame 'seq' has been (or is being) overwritten by a newer one """
+        return seq >= self._first_seq and seq > self._writing - self.size
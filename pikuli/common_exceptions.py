@@ -10,5 +10,17 @@ class FailExit(Exception):
 
 
 class FindFailed(Exception):
-    """ Raises when pattern has not been found on the screen """
+    """
+    Raises when pattern has not been found on the screen.
+    frame    - the last capture the patterns were matched against (None if unknown)
+    patterns - the Pattern objects which have been looked for
+    """
+    def __init__(self, message='', frame=None, patterns=None):
+        super(FindFailed, self).__init__(message)
+        self.frame = frame
+        self.patterns = patterns
+
+
+class WaitCancelled(Exception):
+    """ Raises in a wait started by find_async() etc. when it has been cancelled """
     pass
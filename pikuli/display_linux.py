@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Display for Linux (X11). Screenshots are taken with the MIT-SHM extension into one
+   shared memory segment allocated for the whole root window and reused by every capture;
+   the segment is wrapped as a numpy view and converted to BGR without intermediate copies.
+   The BGR frame is a new array on every capture, because frame_cache, CaptureService and
+   the wait loops keep frames to compare them with the next ones; a caller that owns a buffer
+   passes it as take_screenshot(..., out=buffer) to have no per-frame allocation at all.
+   Without MIT-SHM (remote X servers) plain XGetImage is used.
+   Monitors are taken from Xinerama when it is active, otherwise the root window is screen 1.
+   The root window size is read again (and the segment reallocated when it has changed)
+   on monitors.refresh() and when a capture falls outside the known size (xrandr).
+"""
+
+import ctypes
+import ctypes.util
+import threading
+from logger import PikuliLogger
+from common_exceptions import FailExit
+from pixel_buffer import buffer_to_bgr
+from lazy_import import LazyModule
+
+np = LazyModule('numpy')
+logger = PikuliLogger('pikuli.Display ').logger
+
+ZPIXMAP = 2
+ALL_PLANES = 0xffffffffffffffff
+LSB_FIRST = 0
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+XIMAGE_CACHE_SIZE = 16  # XImage headers kept for different capture sizes
+
+
+class _XImageFuncs(ctypes.Structure):
+    _fields_ = [('create_image', ctypes.c_void_p),
+                ('destroy_image', ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p)),
+                ('get_pixel', ctypes.c_void_p),
+                ('put_pixel', ctypes.c_void_p),
+                ('sub_image', ctypes.c_void_p),
+                ('add_pixel', ctypes.c_void_p)]
+
+
+class _XImage(ctypes.Structure):
+    _fields_ = [('width', ctypes.c_int),
+                ('height', ctypes.c_int),
+                ('xoffset', ctypes.c_int),
+                ('format', ctypes.c_int),
+                ('data', ctypes.c_void_p),
+                ('byte_order', ctypes.c_int),
+                ('bitmap_unit', ctypes.c_int),
+                ('bitmap_bit_order', ctypes.c_int),
+                ('bitmap_pad', ctypes.c_int),
+                ('depth', ctypes.c_int),
+                ('bytes_per_line', ctypes.c_int),
+                ('bits_per_pixel', ctypes.c_int),
+                ('red_mask', ctypes.c_ulong),
+                ('green_mask', ctypes.c_ulong),
+                ('blue_mask', ctypes.c_ulong),
+                ('obdata', ctypes.c_void_p),
+                ('funcs', _XImageFuncs)]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [('shmseg', ctypes.c_ulong),
+                ('shmid', ctypes.c_int),
+                ('shmaddr', ctypes.c_void_p),
+                ('readOnly', ctypes.c_int)]
+
+
+class _XineramaScreenInfo(ctypes.Structure):
+    _fields_ = [('screen_number', ctypes.c_int),
+                ('x_org', ctypes.c_short),
+                ('y_org', ctypes.c_short),
+                ('width', ctypes.c_short),
+                ('height', ctypes.c_short)]
+
+
+def _load(name):
+    path = ctypes.util.find_library(name)
+    if path is None:
+        return None
+    try:
+        return ctypes.CDLL(path)
+    except OSError:
+        return None
+
+
+def _declare(lib, name, restype, *argtypes):
+    func = getattr(lib, name)
+    func.restype = restype
+    func.argtypes = argtypes
+    return func
+
+
+class _Xlib(object):
+    """ ctypes prototypes of the used libX11, libXext, libXinerama and libc functions """
+    def __init__(self):
+        x11 = _load('X11')
+        if x11 is None:
+            raise FailExit('pikuli: libX11 not found')
+        p, i, ul = ctypes.c_void_p, ctypes.c_int, ctypes.c_ulong
+        self.XOpenDisplay = _declare(x11, 'XOpenDisplay', p, ctypes.c_char_p)
+        self.XCloseDisplay = _declare(x11, 'XCloseDisplay', i, p)
+        self.XDefaultScreen = _declare(x11, 'XDefaultScreen', i, p)
+        self.XRootWindow = _declare(x11, 'XRootWindow', ul, p, i)
+        self.XDisplayWidth = _declare(x11, 'XDisplayWidth', i, p, i)
+        self.XDisplayHeight = _declare(x11, 'XDisplayHeight', i, p, i)
+        self.XDefaultVisual = _declare(x11, 'XDefaultVisual', p, p, i)
+        self.XDefaultDepth = _declare(x11, 'XDefaultDepth', i, p, i)
+        self.XGetImage = _declare(x11, 'XGetImage', ctypes.POINTER(_XImage), p, ul, i, i, ctypes.c_uint,
+                                  ctypes.c_uint, ul, i)
+        self.XSync = _declare(x11, 'XSync', i, p, i)
+        self.XFree = _declare(x11, 'XFree', i, p)
+
+        xext = _load('Xext')
+        self.has_shm = xext is not None
+        if self.has_shm:
+            self.XShmQueryExtension = _declare(xext, 'XShmQueryExtension', i, p)
+            self.XShmCreateImage = _declare(xext, 'XShmCreateImage', ctypes.POINTER(_XImage), p, p, ctypes.c_uint,
+                                            i, p, ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint)
+            self.XShmAttach = _declare(xext, 'XShmAttach', i, p, ctypes.POINTER(_XShmSegmentInfo))
+            self.XShmDetach = _declare(xext, 'XShmDetach', i, p, ctypes.POINTER(_XShmSegmentInfo))
+            self.XShmGetImage = _declare(xext, 'XShmGetImage', i, p, ul, ctypes.POINTER(_XImage), i, i, ul)
+
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self.shmget = _declare(libc, 'shmget', i, i, ctypes.c_size_t, i)
+            self.shmat = _declare(libc, 'shmat', p, i, p, i)
+            self.shmdt = _declare(libc, 'shmdt', i, p)
+            self.shmctl = _declare(libc, 'shmctl', i, i, i, p)
+
+        xinerama = _load('Xinerama')
+        self.has_xinerama = xinerama is not None
+        if self.has_xinerama:
+            self.XineramaIsActive = _declare(xinerama, 'XineramaIsActive', i, p)
+            self.XineramaQueryScreens = _declare(xinerama, 'XineramaQueryScreens',
+                                                 ctypes.POINTER(_XineramaScreenInfo), p, ctypes.POINTER(i))
+
+
+_xlib = None
+_xlib_lock = threading.Lock()
+
+
+def _get_xlib():
+    global _xlib
+    with _xlib_lock:
+        if _xlib is None:
+            _xlib = _Xlib()
+        return _xlib
+
+
+class Display(object):
+    DELAY_KBD_KEY_PRESS = 0.020
+    DELAY_BETWEEN_ATTEMTS = 0.5
+
+    def __init__(self, name=None):
+        """ name - X display name like ':99'; None - $DISPLAY """
+        self._x = _get_xlib()
+        self._lock = threading.Lock()  # Xlib calls and the shared segment are used by one capture at a time
+        self._dpy = self._x.XOpenDisplay(name)
+        if not self._dpy:
+            raise FailExit('pikuli: can not open X display "{}"'.format(name or '$DISPLAY'))
+        self._screen = self._x.XDefaultScreen(self._dpy)
+        self._root = self._x.XRootWindow(self._dpy, self._screen)
+        self._visual = self._x.XDefaultVisual(self._dpy, self._screen)
+        self._depth = self._x.XDefaultDepth(self._dpy, self._screen)
+        self._size = self._root_size()
+        self._shminfo = None
+        self._images = {}  # (w, h) -> XImage header on the shared segment
+        self._use_shm = bool(self._x.has_shm and self._x.XShmQueryExtension(self._dpy))
+        if self._use_shm:
+            self._attach_segment()
+        else:
+            logger.info('MIT-SHM is not available, XGetImage is used for screenshots')
+
+    def _root_size(self):
+        return (self._x.XDisplayWidth(self._dpy, self._screen), self._x.XDisplayHeight(self._dpy, self._screen))
+
+    def _attach_segment(self):
+        (w, h) = self._size
+        shminfo = _XShmSegmentInfo()
+        shminfo.shmid = self._x.shmget(IPC_PRIVATE, w * h * 4, IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            raise FailExit('pikuli: shmget failed, errno {}'.format(ctypes.get_errno()))
+        shminfo.shmaddr = self._x.shmat(shminfo.shmid, None, 0)
+        shminfo.readOnly = 0
+        attached = self._x.XShmAttach(self._dpy, ctypes.byref(shminfo))
+        self._x.XSync(self._dpy, 0)
+        # The segment is freed when both this process and the X server detach from it
+        self._x.shmctl(shminfo.shmid, IPC_RMID, None)
+        if not attached:
+            self._x.shmdt(shminfo.shmaddr)
+            raise FailExit('pikuli: XShmAttach failed')
+        self._shminfo = shminfo
+
+    def _free_images(self):
+        for image in self._images.values():
+            image.contents.data = None  # the segment is not owned by the XImage
+            self._x.XFree(image)
+        self._images.clear()
+
+    def _detach_segment(self):
+        self._free_images()
+        if self._shminfo is not None:
+            self._x.XShmDetach(self._dpy, ctypes.byref(self._shminfo))
+            self._x.XSync(self._dpy, 0)
+            self._x.shmdt(self._shminfo.shmaddr)
+            self._shminfo = None
+
+    def refresh(self):
+        """ Reads the root window size again; the segment is reallocated if it has changed (monitors.refresh()) """
+        with self._lock:
+            if not self._dpy:
+                return
+            size = self._root_size()
+            if size == self._size:
+                return
+            logger.info('screen size has changed from {old} to {new}'.format(old=self._size, new=size))
+            self._size = size
+            if self._use_shm:
+                self._detach_segment()
+                self._attach_segment()
+
+    def close(self):
+        with self._lock:
+            if self._dpy:
+                self._detach_segment()
+                self._x.XCloseDisplay(self._dpy)
+                self._dpy = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _monitor_hndl_to_screen_n(self, m_hndl):
+        return m_hndl
+
+    def get_monitor_info(self, n):
+        """ (screen number, None, (x1, y1, x2, y2), scaling factor) as display_win does; 0 - the whole root window """
+        if n == 0:
+            return (1, None, (0, 0) + self._size, 1)
+        screens = self._xinerama_screens()
+        if not screens and n == 1:
+            return (1, None, (0, 0) + self._size, 1)
+        if 1 <= n <= len(screens):
+            (x, y, w, h) = screens[n - 1]
+            return (n, None, (x, y, x + w, y + h), 1)
+        raise FailExit('wrong screen number "{}"'.format(n))
+
+    def _xinerama_screens(self):
+        if not self._x.has_xinerama:
+            return []
+        count = ctypes.c_int()
+        # The connection is shared with captures running in other threads
+        with self._lock:
+            if not self._x.XineramaIsActive(self._dpy):
+                return []
+            info = self._x.XineramaQueryScreens(self._dpy, ctypes.byref(count))
+            try:
+                return [(info[k].x_org, info[k].y_org, info[k].width, info[k].height) for k in range(count.value)]
+            finally:
+                if info:
+                    self._x.XFree(info)
+
+    def _check_format(self, image):
+        if image.bits_per_pixel != 32 or image.byte_order != LSB_FIRST or \
+                (image.red_mask, image.green_mask, image.blue_mask) != (0xff0000, 0xff00, 0xff):
+            raise FailExit('pikuli: unsupported X image format: {bpp} bits per pixel, masks {r:x} {g:x} {b:x}'.format(
+                bpp=image.bits_per_pixel, r=image.red_mask, g=image.green_mask, b=image.blue_mask))
+
+    def _shm_image(self, w, h):
+        image = self._images.get((w, h))
+        if image is None:
+            if len(self._images) >= XIMAGE_CACHE_SIZE:
+                self._free_images()
+            image = self._x.XShmCreateImage(self._dpy, self._visual, self._depth, ZPIXMAP, None,
+                                            ctypes.byref(self._shminfo), w, h)
+            if not image:
+                raise FailExit('pikuli: XShmCreateImage failed')
+            image.contents.data = self._shminfo.shmaddr
+            self._check_format(image.contents)
+            self._images[(w, h)] = image
+        return image
+
+    def take_screenshot(self, x, y, w, h, hwnd=None, out=None):
+        """
+        get area screenshot
+        Args:
+            x, y: top-left corner of a rectangle
+            w, h: rectangle dimensions
+            hwnd: for compatibility
+            out: (h, w, 3) uint8 array to convert the capture into instead of a new one
+
+        Returns: numpy array
+        """
+        [x, y, w, h] = map(int, [x, y, w, h])
+        outside = lambda: x + w > self._size[0] or y + h > self._size[1]
+        if outside():
+            self.refresh()  # the screen may have been resized
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or outside():
+            raise FailExit('pikuli: area ({x}, {y}, {w}, {h}) is out of the screen {s}'.format(
+                x=x, y=y, w=w, h=h, s=self._size))
+        with self._lock:
+            if self._shminfo is not None:
+                image = self._shm_image(w, h)
+                if not self._x.XShmGetImage(self._dpy, self._root, image, x, y, ALL_PLANES):
+                    raise FailExit('pikuli: XShmGetImage failed')
+                stride = image.contents.bytes_per_line
+                buf = (ctypes.c_char * (stride * h)).from_address(image.contents.data)
+                return buffer_to_bgr(buf, w, h, stride=stride, channel_order='BGRX', out=out)
+
+            image = self._x.XGetImage(self._dpy, self._root, x, y, w, h, ALL_PLANES, ZPIXMAP)
+            if not image:
+                raise FailExit('pikuli: XGetImage failed')
+            try:
+                self._check_format(image.contents)
+                stride = image.contents.bytes_per_line
+                buf = (ctypes.c_char * (stride * h)).from_address(image.contents.data)
+                return buffer_to_bgr(buf, w, h, stride=stride, channel_order='BGRX', out=out)
+            finally:
+                image.contents.funcs.destroy_image(ctypes.cast(image, ctypes.c_void_p))
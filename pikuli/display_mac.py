@@ -1,11 +1,10 @@
 # -*- coding: utf-8 -*-
 
 import AppKit
-import numpy as np
-from PIL import Image
 from Quartz import CoreGraphics as CG
 from logger import PikuliLogger
 from common_exceptions import FailExit
+from pixel_buffer import buffer_to_bgr
 
 logger = PikuliLogger('pikuli.Display ').logger
 
@@ -46,6 +45,7 @@ class Display(object):
         http://stackoverflow.com/questions/37359192/cannot-figure-out-numpy-equivalent-for-cv-mat-step0
         """
         [x, y, w, h] = map(int, [x, y, w, h])
+        requested_w = w
         driver_cache_size = 64  # bytes
 
         # align width to the nearest value that divisible by driver_cache_size
@@ -60,7 +60,9 @@ class Display(object):
 
         height = CG.CGImageGetHeight(image_ref)
         width = CG.CGImageGetWidth(image_ref)
+        stride = CG.CGImageGetBytesPerRow(image_ref)
 
-        image = Image.frombuffer("RGBA", (width, height),
-                                 pixeldata, "raw", "RGBA", 0, 1).convert('RGB')
-        return np.array(image)
+        # Crop the alignment padding added to the width. On Retina displays
+        # the image has scale factor times more pixels than requested points.
+        width = width * requested_w // w
+        return buffer_to_bgr(pixeldata, width, height, stride=stride, channel_order='BGRA')
@@ -4,9 +4,9 @@ import win32con
 import win32api
 import win32gui
 import win32ui
-import numpy as np
-from PIL import Image, ImageGrab
+from PIL import ImageGrab
 from Settings import settings
+from pixel_buffer import buffer_to_bgr
 from logger import PikuliLogger
 from common_exceptions import FailExit
 
@@ -50,14 +50,13 @@ class Display(object):
         if bmp_info['bmBitsPixel'] % 8 != 0:
             raise FailExit('bmp_info = {bmp}: bmBitsPixel mod. 8 is not zero'.format(bmp=str(bmp_info)))
 
-        bmp_arr = list(bmp.GetBitmapBits())
-
-        if len(bmp_arr) == w * h * 4:
-            del bmp_arr[3::4]  # Delete alpha channel. TODO: Is it fast enough???
-        elif len(bmp_arr) != w * h * 3:
+        channel_order = {32: 'BGRA', 24: 'BGR'}.get(bmp_info['bmBitsPixel'])
+        if channel_order is None:
             raise FailExit('An error occurred while read bitmap bits')
-
-        result = np.array(bmp_arr, dtype=np.uint8).reshape((h, w, 3))
+        # Raw bytes of the bitmap are wrapped without intermediate lists; alpha channel
+        # and row padding are skipped while copying into the resulting BGR array.
+        result = buffer_to_bgr(bmp.GetBitmapBits(True), w, h,
+                               stride=bmp_info['bmWidthBytes'], channel_order=channel_order)
 
         win32gui.DeleteDC(mem_hdc)
         win32gui.DeleteObject(new_bitmap_h)
@@ -71,9 +70,8 @@ class Display(object):
 
     def _take_screenshot_without_native_api(self, x, y, w, h):
         initial_area = ImageGrab.grab(bbox=(x, y, w + x, h + y))
-        r, g, b = initial_area.split()
-        initial_area = Image.merge("RGB", (b, g, r))
-        return np.array(initial_area.getdata(), dtype=np.uint8).reshape((h, w, 3))
+        return buffer_to_bgr(initial_area.tobytes(), initial_area.size[0], initial_area.size[1],
+                             channel_order=initial_area.mode)
 
     def get_monitor_info(self, n):
         """
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+   FailureArtifacts - screenshots saved to settings.find_failed_dir when find() fails.
+   The saved frame is the last capture the pattern was matched against (FindFailed.frame),
+   not a new screenshot. Encoding and writing happen on a background thread, so the failing
+   call doesn't wait for them; the thread is stopped at exit after the queue is written.
+   A failure of the same patterns on the same frame as the previous one is not saved again.
+   The oldest screenshots are deleted to keep the directory within settings.find_failed_max_files
+   and settings.find_failed_max_bytes; only files named by this module are counted and deleted.
+
+   With settings.find_failed_score_map the correlation map of the best of the patterns is saved
+   next to the screenshot as 16-bit PNG <screenshot name>.scores.png: pixel value / 65535 is
+   the score of the pattern placed with its top-left corner at that pixel.
+"""
+
+import atexit
+import datetime
+import hashlib
+import itertools
+import os
+import re
+import threading
+import time
+from collections import deque
+from Settings import settings
+from logger import PikuliLogger
+from lazy_import import LazyModule
+
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
+logger = PikuliLogger('pikuli.Failures').logger
+
+QUEUE_SIZE = 16  # screenshots waiting to be written; failures beyond it are not saved
+SCORES_SUFFIX = '.scores.png'
+# <date>_<time>.<ms>_<number>_<name>.jpg, see FailureArtifacts.save()
+NAME_RE = re.compile(r'^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}\.\d{3}_\d{4}_.*\.jpg$')
+EXIT_FLUSH_TIMEOUT = 10
+
+
+class FailureArtifacts(object):
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jobs = deque()  # (frame, path, patterns); None stops the writer thread
+        self._pending = 0
+        self._thread = None
+        self._numbers = itertools.count(1)  # tells apart failures within one millisecond
+        self._last_key = None  # (md5 of the frame, pattern files) of the last queued failure
+        self._last_path = None
+        self.saved = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.deleted = 0
+
+    def save(self, frame, name, patterns=None):
+        """
+        Queues 'frame' to be written as <date>_<time>.<ms>_<number>_<name>.jpg;
+        returns the path, the path of the previous failure if it had the same frame and
+        patterns, or None if the queue is full.
+        patterns - Pattern objects for the score map (settings.find_failed_score_map).
+        """
+        if not frame.flags.writeable:
+            frame = frame.copy()  # read-only frames are shared by caches and capture rings
+        key = (hashlib.md5(np.ascontiguousarray(frame)).hexdigest(),
+               tuple(ptn.get_filename() for ptn in patterns or []))
+        now = datetime.datetime.now()
+        with self._cond:
+            if key == self._last_key:
+                self.duplicates += 1
+                logger.info('the screen and the patterns are the same as in %s, it is not saved again', self._last_path)
+                return self._last_path
+            path = os.path.join(settings.find_failed_dir, '%s.%03d_%04d_%s.jpg' % (
+                now.strftime("%Y-%m-%d_%H-%M-%S"), now.microsecond // 1000, next(self._numbers) % 10000, name))
+            if len(self._jobs) >= QUEUE_SIZE:
+                self.dropped += 1
+                logger.warning('too many failures to save, %s is skipped', path)
+                return None
+            self._jobs.append((frame, path, patterns or []))
+            (self._last_key, self._last_path) = (key, path)
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pikuli-failures')
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+        return path
+
+    def flush(self, timeout=None):
+        """ Waits until the queued screenshots are written; returns False on timeout """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """
+        Writes the queued screenshots and stops the writer thread (registered with atexit:
+        a daemon thread still running while the interpreter shuts down fails).
+        The next save() starts a new thread.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        self.flush(timeout)
+        with self._cond:
+            thread = self._thread
+            if thread is None:
+                return
+            self._thread = None
+            self._jobs.append(None)
+            self._cond.notify_all()
+        thread.join(None if deadline is None else max(0, deadline - time.time()))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                job = self._jobs.popleft()
+            if job is None:
+                return
+            try:
+                self._write(*job)
+            except Exception as ex:
+                logger.error('unable to save %s: %s', job[1], ex)
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+    def _write(self, frame, path, patterns):
+        cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        if settings.find_failed_score_map:
+            self._write_score_map(frame, patterns, path[:-len('.jpg')] + SCORES_SUFFIX)
+        self.saved += 1
+        logger.info('screenshot of the failure saved to %s', path)
+        self._apply_limits(os.path.dirname(path))
+
+    @staticmethod
+    def _write_score_map(frame, patterns, path):
+        best = None
+        for ptn in patterns:
+            img = ptn.cv2_pattern
+            if img.shape[0] > frame.shape[0] or img.shape[1] > frame.shape[1]:
+                continue
+            res = cv2.matchTemplate(frame, img, cv2.TM_CCORR_NORMED)
+            if best is None or res.max() > best.max():
+                best = res
+        if best is not None:
+            cv2.imwrite(path, (np.clip(best, 0, 1) * 65535).astype(np.uint16))
+
+    def _apply_limits(self, directory):
+        """ Deletes the oldest screenshots (with their score maps) beyond the limits; the newest one stays """
+        (max_files, max_bytes) = (settings.find_failed_max_files, settings.find_failed_max_bytes)
+        if max_files is None and max_bytes is None:
+            return
+        entries = []  # (mtime, screenshot, score map, bytes of both)
+        for name in os.listdir(directory):
+            if not NAME_RE.match(name):
+                continue  # not ours
+            path = os.path.join(directory, name)
+            companion = path[:-len('.jpg')] + SCORES_SUFFIX
+            try:
+                size = os.path.getsize(path)
+                if os.path.exists(companion):
+                    size += os.path.getsize(companion)
+                entries.append((os.path.getmtime(path), path, companion, size))
+            except OSError:
+                continue  # deleted meanwhile
+        entries.sort()
+        total = sum(e[3] for e in entries)
+        while len(entries) > 1 and ((max_files is not None and len(entries) > max_files) or
+                                    (max_bytes is not None and total > max_bytes)):
+            (_, path, companion, size) = entries.pop(0)
+            for p in (path, companion):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            self.deleted += 1
+
+    def stats(self):
+        with self._cond:
+            return {'saved': self.saved,
+                    'duplicates': self.duplicates,
+                    'dropped': self.dropped,
+                    'deleted': self.deleted,
+                    'pending': self._pending}
+
+
+failure_artifacts = FailureArtifacts()
+atexit.register(failure_artifacts.close, EXIT_FLUSH_TIMEOUT)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+   FrameCache - short-lived screenshot shared by Regions of one screen.
+   If settings.frame_cache_ttl is not 0, a capture stays valid for ttl seconds and
+   every Region inside it gets a read-only view of that capture instead of a new
+   screenshot. A Region outside of it makes the cache capture the union of both areas,
+   unless the union is more than UNION_MAX_GROWTH times bigger than the two areas together
+   (regions far from each other): then only the Region itself is captured and cached.
+   Mouse and keyboard actions done through Location invalidate the cache.
+"""
+
+import threading
+import time
+from Settings import settings
+from metrics import metrics
+
+UNION_MAX_GROWTH = 2.0  # union area / (requested area + cached area) above which the union isn't captured
+
+
+class FrameCache(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = {}  # screen number -> (x, y, w, h, frame, capture time)
+        self.hits = 0
+        self.misses = 0
+
+    def take_screenshot(self, display, screen, x, y, w, h):
+        """ Same as display.take_screenshot(x, y, w, h), but may return a read-only view of a cached capture """
+        ttl = settings.frame_cache_ttl
+        if not ttl:
+            return self._capture(display, x, y, w, h)
+
+        now = time.time()
+        with self._lock:
+            entry = self._frames.get(screen)
+            if entry is not None and now - entry[5] > ttl:
+                entry = None
+            if entry is not None and \
+                    entry[0] <= x and entry[1] <= y and x + w <= entry[0] + entry[2] and y + h <= entry[1] + entry[3]:
+                self.hits += 1
+                return self._crop(entry, x, y, w, h)
+            self.misses += 1
+
+        area = (x, y, w, h)
+        if entry is not None:
+            (ux, uy) = (min(x, entry[0]), min(y, entry[1]))
+            union = (ux, uy, max(x + w, entry[0] + entry[2]) - ux, max(y + h, entry[1] + entry[3]) - uy)
+            if union[2] * union[3] <= UNION_MAX_GROWTH * (w * h + entry[2] * entry[3]):
+                area = union
+        frame = self._capture(display, *area)
+        frame.flags.writeable = False
+        entry = area + (frame, now)
+        with self._lock:
+            self._frames[screen] = entry
+        return self._crop(entry, x, y, w, h)
+
+    @staticmethod
+    def _capture(display, x, y, w, h):
+        started = time.time()
+        frame = display.take_screenshot(x, y, w, h, None)
+        metrics.observe('pikuli_capture_seconds', time.time() - started)
+        return frame
+
+    @staticmethod
+    def _crop(entry, x, y, w, h):
+        (cx, cy, cw, _, frame, _) = entry
+        # The capture may have more pixels than screen points (Retina displays).
+        scale = frame.shape[1] / float(cw)
+        return frame[int((y - cy) * scale):int((y - cy + h) * scale),
+                     int((x - cx) * scale):int((x - cx + w) * scale)]
+
+    def invalidate(self, screen=None):
+        """ Forget capture of the screen 'screen' or of all screens if it is None """
+        with self._lock:
+            if screen is None:
+                self._frames.clear()
+            else:
+                self._frames.pop(screen, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses}
+
+
+frame_cache = FrameCache()
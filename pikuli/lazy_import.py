@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""
+   LazyModule - stand-in for a heavy module (cv2, numpy) that is imported on first use,
+   so that 'import pikuli' stays fast for code that needs only geometry or settings:
+
+       cv2 = LazyModule('cv2')
+       ...
+       cv2.matchTemplate(...)  # cv2 is imported here
+
+   Every attribute is copied to the stand-in on first access; after that it costs
+   the same as an attribute of the module itself.
+"""
+
+import importlib
+
+
+class LazyModule(object):
+    def __init__(self, name):
+        self.__dict__['_LazyModule__name'] = name
+
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self.__name), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        return '<lazy module {}>'.format(self.__name)
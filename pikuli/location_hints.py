@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+   LocationHints - process-wide memory of where a pattern was found last time in a region.
+   With settings.use_location_hints enabled Region looks for a pattern in a small window
+   around its last known location first and searches the whole area only on a miss.
+"""
+
+import threading
+from collections import OrderedDict
+from Settings import settings
+
+LOCATION_HINTS_MAX = 1024  # remembered (pattern, region) pairs
+
+
+class LocationHints(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hints = OrderedDict()  # (image file, x, y, w, h) -> (x, y) in the region capture; the last item is the most recently used
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(pattern, region):
+        return (pattern.get_filename(), region.x, region.y, region.w, region.h)
+
+    def get(self, pattern, region):
+        """ Last known (x, y) of the pattern in the region capture or None """
+        with self._lock:
+            return self._hints.get(self._key(pattern, region))
+
+    def window(self, pattern, region, field_shape):
+        """
+        (x0, y0, x1, y1) - part of the region capture around the last known location:
+        pattern size plus settings.location_hint_margin pixels on every side. None if there is no hint.
+        """
+        hint = self.get(pattern, region)
+        if hint is None:
+            return None
+        margin = settings.location_hint_margin
+        return (max(0, hint[0] - margin),
+                max(0, hint[1] - margin),
+                min(field_shape[1], hint[0] + pattern.w + margin),
+                min(field_shape[0], hint[1] + pattern.h + margin))
+
+    def put(self, pattern, region, x, y):
+        key = self._key(pattern, region)
+        with self._lock:
+            self._hints.pop(key, None)
+            self._hints[key] = (x, y)
+            while len(self._hints) > LOCATION_HINTS_MAX:
+                self._hints.popitem(last=False)
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self):
+        with self._lock:
+            self._hints.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'entries': len(self._hints)}
+
+
+location_hints = LocationHints()
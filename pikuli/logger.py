@@ -1,14 +1,30 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import threading
+
+DEFAULT_LEVEL = logging.INFO
+
+_configured = set()  # names of loggers which already have the pikuli handler
+_lock = threading.Lock()
 
 
 class PikuliLogger(object):
-    def __init__(self, name=__name__, level=logging.DEBUG):
+    def __init__(self, name=__name__, level=None):
+        """
+        The handler is added and the level set once per logger name; creating
+        PikuliLogger with the same name again returns the same configured logger.
+        level - if given, set even if the logger is already configured
+        """
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(level)
-        ch = logging.StreamHandler()
-        ch.setLevel(level)
-        formatter = logging.Formatter('~# %(asctime)s %(levelname)s %(name)s: %(message)s')
-        ch.setFormatter(formatter)
-        self.logger.addHandler(ch)
+        with _lock:
+            if name not in _configured:
+                _configured.add(name)
+                ch = logging.StreamHandler()
+                formatter = logging.Formatter('~# %(asctime)s %(levelname)s %(name)s: %(message)s')
+                ch.setFormatter(formatter)
+                self.logger.addHandler(ch)
+                if level is None:
+                    level = DEFAULT_LEVEL
+        if level is not None:
+            self.logger.setLevel(level)
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Template matching engines used by BaseRegion._find().
+   Every engine returns a correlation map with the same shape and meaning as
+   cv2.matchTemplate(field, pattern, cv2.TM_CCORR_NORMED), so thresholding
+   and Match construction don't depend on the selected engine.
+"""
+
+import threading
+from collections import OrderedDict
+from Settings import settings
+from common_exceptions import FailExit
+from lazy_import import LazyModule
+
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
+EXHAUSTIVE = 'exhaustive'
+PYRAMID = 'pyramid'
+GRAY = 'gray'
+METHODS = (EXHAUSTIVE, PYRAMID, GRAY)
+
+PYRAMID_MIN_PATTERN_SIDE = 8  # pattern side on the coarsest pyramid level, pixels
+REFINE_MAX_CANDIDATES = 0.1  # share of coarse map; above that refinement is slower than exhaustive search
+NMS_MAX_OVERLAP = 0.3  # IoU above which two matches are treated as the same occurrence
+INCREMENTAL_TILE = 32  # side of tiles compared between successive frames, pixels
+INCREMENTAL_MAX_DIRTY = 0.5  # share of changed tiles; above that the whole map is computed again
+INCREMENTAL_MAX_PATTERNS = 8  # correlation maps kept by one IncrementalMatcher
+
+
+def verify_method(method):
+    if method not in METHODS:
+        raise FailExit('unknown matching method "{m}"; expected one of {methods}'.format(
+            m=method, methods=', '.join(METHODS)))
+    return method
+
+
+def match_exhaustive(field, pattern_img):
+    return cv2.matchTemplate(field, pattern_img, cv2.TM_CCORR_NORMED)
+
+
+def pyramid_depth(pattern_shape, field_shape, levels):
+    """
+    Number of cv2.pyrDown() steps actually usable for this pair of images:
+    the coarsest pattern must keep at least PYRAMID_MIN_PATTERN_SIDE pixels
+    on each side and must still fit into the coarsest field.
+    """
+    depth = 0
+    (ph, pw) = pattern_shape[:2]
+    (fh, fw) = field_shape[:2]
+    while depth < levels:
+        (ph, pw, fh, fw) = ((ph + 1) // 2, (pw + 1) // 2, (fh + 1) // 2, (fw + 1) // 2)
+        if min(ph, pw) < PYRAMID_MIN_PATTERN_SIDE or ph > fh or pw > fw:
+            break
+        depth += 1
+    return depth
+
+
+def _refine(field, pattern_img, res, rects):
+    """
+    Fills res in every rect (x0, y0, x1, y1) given in full-resolution
+    correlation map coordinates with exact full-resolution scores.
+    """
+    (ph, pw) = pattern_img.shape[:2]
+    for (x0, y0, x1, y1) in rects:
+        window = field[y0:y1 + ph - 1, x0:x1 + pw - 1]
+        res[y0:y1, x0:x1] = cv2.matchTemplate(window, pattern_img, cv2.TM_CCORR_NORMED)
+
+
+def match_pyramid(field, pattern, similarity, levels, margin):
+    """
+    Coarse-to-fine search. The frame and the pattern are reduced 'levels'
+    times with cv2.pyrDown; every coarse position scoring at least
+    (similarity - margin) is refined at full resolution in a window of
+    +-2^levels pixels around it. Positions outside of candidate windows get
+    score 0.0, positions inside get the exact exhaustive score.
+
+    Tolerance: coordinates of refined positions are the same as with the
+    exhaustive engine, scores differ by less than 1e-4 (DFT rounding).
+    A match is missed only if its coarse score is below (similarity - margin).
+    """
+    depth = pyramid_depth(pattern.cv2_pattern.shape, field.shape, levels)
+    if depth == 0:
+        return match_exhaustive(field, pattern.cv2_pattern)
+
+    coarse_field = field
+    for _ in range(depth):
+        coarse_field = cv2.pyrDown(coarse_field)
+    coarse = cv2.matchTemplate(coarse_field, pattern.get_pyramid_level(depth), cv2.TM_CCORR_NORMED)
+    return _refine_candidates(field, pattern.cv2_pattern, coarse, similarity - margin, 2 ** depth)
+
+
+def _refine_candidates(field, pattern_img, coarse, threshold, scale):
+    """
+    Full-resolution correlation map built from a prefilter map 'coarse' computed on images
+    reduced 'scale' times: positions around every coarse score >= threshold get exact scores,
+    the rest get 0.0. Falls back to the exhaustive search if there are too many candidates.
+    """
+    candidates = (coarse >= threshold).astype(np.uint8)
+    if candidates.sum() > REFINE_MAX_CANDIDATES * candidates.size:
+        return match_exhaustive(field, pattern_img)
+
+    (ph, pw) = pattern_img.shape[:2]
+    res = np.zeros((field.shape[0] - ph + 1, field.shape[1] - pw + 1), dtype=np.float32)
+    if not candidates.any():
+        return res
+
+    (n, _, stats, _) = cv2.connectedComponentsWithStats(candidates, connectivity=8)
+    rects = []
+    for (cx, cy, cw, ch, _) in stats[1:n]:
+        rects.append((max(0, (cx - 1) * scale),
+                      max(0, (cy - 1) * scale),
+                      min(res.shape[1], (cx + cw + 1) * scale),
+                      min(res.shape[0], (cy + ch + 1) * scale)))
+    _refine(field, pattern_img, res, rects)
+    return res
+
+
+def match_gray(field, pattern, similarity, scale, margin):
+    """
+    Grayscale prefilter with full-color verification. The exhaustive search runs on
+    single-channel copies of the frame and of the pattern (reduced 'scale' times if
+    scale > 1); every position scoring at least (similarity - margin) there is verified
+    with the 3-channel TM_CCORR_NORMED score, so accept/reject decisions are made on
+    the same scores as with the exhaustive engine.
+
+    Tolerance is the same as for match_pyramid(): a match is missed only if its
+    grayscale score is below (similarity - margin).
+    """
+    gray_pattern = pattern.get_gray(scale)
+    gray_field = cv2.cvtColor(field, cv2.COLOR_BGR2GRAY)
+    if scale > 1:
+        gray_field = cv2.resize(gray_field, None, fx=1.0 / scale, fy=1.0 / scale, interpolation=cv2.INTER_AREA)
+    if gray_field.shape[0] < gray_pattern.shape[0] or gray_field.shape[1] < gray_pattern.shape[1]:
+        return match_exhaustive(field, pattern.cv2_pattern)
+    coarse = cv2.matchTemplate(gray_field, gray_pattern, cv2.TM_CCORR_NORMED)
+    return _refine_candidates(field, pattern.cv2_pattern, coarse, similarity - margin, scale)
+
+
+def match_template(field, pattern):
+    """
+    Correlation map of 'pattern' (Pattern object) over 'field' (BGR numpy array)
+    computed with the engine selected by Pattern.method or settings.match_method.
+    """
+    method = verify_method(pattern.method or settings.match_method)
+    if method == PYRAMID:
+        return match_pyramid(field, pattern, pattern.similarity,
+                             settings.pyramid_levels, settings.pyramid_margin)
+    elif method == GRAY:
+        return match_gray(field, pattern, pattern.similarity,
+                          settings.gray_scale, settings.gray_margin)
+    return match_exhaustive(field, pattern.cv2_pattern)
+
+
+def find_peaks(res, threshold, pattern_w, pattern_h, max_results=None, max_overlap=NMS_MAX_OVERLAP):
+    """
+    One (x, y, score) per distinct occurrence in correlation map 'res', best score first.
+    Candidates are local maxima above 'threshold'; a candidate is suppressed if its
+    pattern-sized box overlaps an already accepted one by more than 'max_overlap' (IoU).
+    Equal scores keep row-major order, so the first found result goes first.
+    """
+    local_max = (res > threshold) & (res == cv2.dilate(res, np.ones((3, 3), np.uint8)))
+    (ys, xs) = np.nonzero(local_max)
+    if ys.size == 0:
+        return []
+    scores = res[ys, xs]
+    idx = np.argsort(-scores, kind='mergesort')
+
+    area = float(pattern_w * pattern_h)
+    peaks = []
+    while idx.size:
+        best = idx[0]
+        peaks.append((int(xs[best]), int(ys[best]), float(scores[best])))
+        if max_results is not None and len(peaks) >= max_results:
+            break
+        inter = (np.clip(pattern_w - np.abs(xs[idx] - xs[best]), 0, None) *
+                 np.clip(pattern_h - np.abs(ys[idx] - ys[best]), 0, None))
+        idx = idx[inter / (2 * area - inter) <= max_overlap]
+    return peaks
+
+
+def frame_changed(prev_field, field):
+    """
+    True if two captures of the same area differ at least in one pixel.
+    An exact comparison costs a few milliseconds per 1440p frame (much less than
+    cv2.matchTemplate) and unlike a downsampled signature never hides a small change.
+    """
+    return prev_field is None or not np.array_equal(prev_field, field)
+
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+_local = threading.local()  # 'worker' is set in threads of the pool
+
+
+def _get_pool():
+    """ Thread pool of settings.matching_threads workers; rebuilt if the setting changes """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != settings.matching_threads:
+            if _pool is not None:
+                _pool.close()
+            from multiprocessing.pool import ThreadPool
+            _pool_size = settings.matching_threads
+            _pool = ThreadPool(_pool_size)
+        return _pool
+
+
+def map_patterns(func, patterns, stop=None):
+    """
+    Returns [func(pattern) for pattern in patterns], computed on the matching thread pool
+    (cv2.matchTemplate releases the GIL). The order of results is the order of 'patterns'.
+    If stop(result) is true for some result, the list ends with it: patterns that haven't
+    been started yet are skipped.
+    Called from a task of the pool (e.g. Watcher conditions with several patterns), it runs
+    on the calling thread: waiting for the pool from inside of it could deadlock.
+    """
+    if settings.matching_threads <= 1 or len(patterns) <= 1 or getattr(_local, 'worker', False):
+        results = []
+        for ptn in patterns:
+            results.append(func(ptn))
+            if stop is not None and stop(results[-1]):
+                break
+        return results
+
+    cancel = threading.Event()
+
+    def task(ptn):
+        if cancel.is_set():
+            return None
+        _local.worker = True
+        return func(ptn)
+
+    results = []
+    for res in _get_pool().imap(task, patterns):
+        results.append(res)
+        if stop is not None and stop(res):
+            cancel.set()
+            break
+    return results
+
+
+def changed_rects(prev_field, field, tile=INCREMENTAL_TILE):
+    """
+    Rectangles (x0, y0, x1, y1) covering all pixels that differ between two frames
+    of the same size. The frames are compared by tiles of tile x tile pixels and
+    adjacent changed tiles are merged. Returns None if more than INCREMENTAL_MAX_DIRTY
+    of the tiles changed.
+    """
+    (h, w) = field.shape[:2]
+    (th, tw) = (-(-h // tile), -(-w // tile))
+    diff = np.zeros((th * tile, tw * tile), dtype=bool)
+    diff[:h, :w] = (prev_field != field).reshape(h, w, -1).any(axis=2)
+    tiles = diff.reshape(th, tile, tw, tile).any(axis=3).any(axis=1).astype(np.uint8)
+    if tiles.sum() > INCREMENTAL_MAX_DIRTY * tiles.size:
+        return None
+    (n, _, stats, _) = cv2.connectedComponentsWithStats(tiles, connectivity=8)
+    return [(cx * tile, cy * tile, min(w, (cx + cw) * tile), min(h, (cy + ch) * tile))
+            for (cx, cy, cw, ch, _) in stats[1:n]]
+
+
+class _IncrementalEntry(object):
+    def __init__(self, stamp):
+        self.lock = threading.Lock()
+        self.stamp = stamp  # Pattern.stamp and shape of the pattern image
+        self.field = None
+        self.res = None
+
+
+class IncrementalMatcher(object):
+    """
+    Correlation maps of recently matched patterns together with frames they were computed for.
+    When a pattern is matched against a new frame of the same size, only the map positions
+    whose pattern window touches a changed tile are computed again; the rest is reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # pattern key -> _IncrementalEntry; the last item is the most recently used
+        self.full_updates = 0
+        self.partial_updates = 0
+        self.reused = 0
+
+    def _entry(self, pattern):
+        # 'pyramid' and 'gray' maps depend on the similarity: only candidates above it are refined
+        key = (pattern.get_filename(), pattern.method or settings.match_method, pattern.similarity)
+        with self._lock:
+            # Patterns of the same file are separate objects, often with separate arrays:
+            # the stamp tells whether the image is still the same.
+            stamp = (pattern.stamp, pattern.cv2_pattern.shape)
+            entry = self._entries.pop(key, None)
+            if entry is None or entry.stamp != stamp:
+                entry = _IncrementalEntry(stamp)
+            self._entries[key] = entry
+            while len(self._entries) > INCREMENTAL_MAX_PATTERNS:
+                self._entries.popitem(last=False)
+        return entry
+
+    def match(self, field, pattern):
+        """
+        Same result as match_template(field, pattern). The returned map is a new array;
+        the frame is kept as a copy, since 'field' may be a view of a buffer which is reused
+        for later frames (CaptureService ring).
+        """
+        entry = self._entry(pattern)
+        with entry.lock:
+            if entry.field is None or entry.field.shape != field.shape:
+                rects = None
+            else:
+                rects = changed_rects(entry.field, field)
+
+            if rects is None:
+                entry.res = match_template(field, pattern)
+                self.full_updates += 1
+            elif rects:
+                (ph, pw) = pattern.cv2_pattern.shape[:2]
+                (mh, mw) = entry.res.shape
+                for (x0, y0, x1, y1) in rects:
+                    # Map positions whose pattern window overlaps the changed rectangle.
+                    (x0, y0) = (max(0, x0 - pw + 1), max(0, y0 - ph + 1))
+                    (x1, y1) = (min(mw, x1), min(mh, y1))
+                    if x0 < x1 and y0 < y1:
+                        entry.res[y0:y1, x0:x1] = match_template(field[y0:y1 + ph - 1, x0:x1 + pw - 1], pattern)
+                self.partial_updates += 1
+            else:
+                self.reused += 1
+            entry.field = field.copy()
+            return entry.res.copy()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Metrics - process-wide registry of counters and fixed-bucket histograms fed by pikuli itself
+   (while settings.metrics is True):
+
+       pikuli_wait_seconds{pattern, condition, outcome}  find, wait, wait_vanish, exists, find_any
+       pikuli_wait_polls{condition}                      polls (captures) per successful wait
+       pikuli_find_failed_total{pattern}                 waits which ended in FindFailed, per pattern waited for
+       pikuli_find_all_seconds{pattern}                  find_all, find_all_points
+       pikuli_capture_seconds                            display.take_screenshot()
+       pikuli_pattern_load_seconds                       decoding of pattern files (pattern cache misses)
+
+   Stats of pattern_cache, frame_cache, location_hints and failure_artifacts are added as gauges on export.
+   Every histogram keeps counts of a fixed set of buckets, so the memory does not grow with
+   the number of observations; p50/p95/p99 are estimated from the buckets.
+
+       metrics.export('metrics.json')   # JSON summary; any other extension - OpenMetrics text
+       print(metrics.openmetrics())
+       settings.metrics_file = 'run_metrics.txt'   # written when the process exits
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from Settings import settings
+from logger import PikuliLogger
+
+logger = PikuliLogger('pikuli.Metrics ').logger
+
+# Upper bounds of the buckets; the last, +Inf, bucket is implied.
+SECONDS_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 60)
+POLLS_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# name -> (type, help, buckets)
+DESCRIPTIONS = {
+    'pikuli_wait_seconds': ('histogram', 'Duration of find/wait/wait_vanish/exists calls', SECONDS_BUCKETS),
+    'pikuli_wait_polls': ('histogram', 'Captures taken by a successful wait', POLLS_BUCKETS),
+    'pikuli_find_failed_total': ('counter', 'Waits ended in FindFailed', None),
+    'pikuli_find_all_seconds': ('histogram', 'Duration of find_all calls', SECONDS_BUCKETS),
+    'pikuli_capture_seconds': ('histogram', 'Duration of display.take_screenshot()', SECONDS_BUCKETS),
+    'pikuli_pattern_load_seconds': ('histogram', 'Decoding of pattern image files', SECONDS_BUCKETS),
+}
+
+
+class Histogram(object):
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """ Estimate: linear interpolation inside the bucket holding the q-th observation """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for (k, n) in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[k - 1] if k > 0 else self.min
+                upper = self.bounds[k] if k < len(self.bounds) else self.max
+                (lower, upper) = (max(lower, self.min), min(upper, self.max))
+                return lower + (upper - lower) * (rank - seen) / float(n)
+            seen += n
+        return self.max
+
+    def summary(self):
+        summary = {'count': self.count,
+                   'sum': self.sum,
+                   'min': self.min,
+                   'max': self.max,
+                   'mean': self.sum / self.count if self.count else None,
+                   'buckets': dict(zip(map(str, self.bounds) + ['+Inf'], self.counts))}
+        for q in QUANTILES:
+            summary['p%i' % round(q * 100)] = self.quantile(q)
+        return summary
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for (k, v) in pairs) + '}'
+
+
+class Metrics(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (name, ((label, value), ...)) -> Histogram or number
+        self._started = time.time()
+
+    def observe(self, name, value, **labels):
+        """ Adds 'value' to the histogram 'name' with the labels """
+        if not settings.metrics:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = Histogram(DESCRIPTIONS.get(name, (None, None, SECONDS_BUCKETS))[2])
+            hist.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        """ Adds 'value' to the counter 'name' with the labels """
+        if not settings.metrics:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+    def record_wait(self, pattern, condition, outcome, seconds, polls):
+        """
+        One wait of Region._wait_steps for 'pattern' (file name); outcome - 'hit', 'vanish' or 'timeout'.
+        A timed out wait for several patterns is recorded for every one of them.
+        """
+        if not settings.metrics:
+            return
+        self.observe('pikuli_wait_seconds', seconds, pattern=pattern, condition=condition, outcome=outcome)
+        if outcome == 'timeout':
+            self.inc('pikuli_find_failed_total', pattern=pattern)
+        else:
+            self.observe('pikuli_wait_polls', polls, condition=condition)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._started = time.time()
+
+    def _gauges(self):
+        """ [(name, value)] from stats() of the caches """
+        from pattern_cache import pattern_cache
+        from frame_cache import frame_cache
+        from location_hints import location_hints
+        from failure_artifacts import failure_artifacts
+        gauges = []
+        for (prefix, stats) in [('pikuli_pattern_cache_', pattern_cache.stats()),
+                                ('pikuli_frame_cache_', frame_cache.stats()),
+                                ('pikuli_location_hints_', location_hints.stats()),
+                                ('pikuli_failure_artifacts_', failure_artifacts.stats())]:
+            gauges.extend((prefix + k, v) for (k, v) in sorted(stats.items()))
+        return gauges
+
+    def _items(self):
+        """ Sorted [(name, labels, Histogram copy or number)] """
+        with self._lock:
+            items = []
+            for ((name, labels), value) in self._series.items():
+                if isinstance(value, Histogram):
+                    copy = Histogram(value.bounds)
+                    (copy.counts, copy.count, copy.sum, copy.min, copy.max) = \
+                        (list(value.counts), value.count, value.sum, value.min, value.max)
+                    value = copy
+                items.append((name, labels, value))
+        items.sort(key=lambda item: item[:2])
+        return items
+
+    def snapshot(self):
+        """ JSON-serializable summary """
+        series = []
+        for (name, labels, value) in self._items():
+            entry = {'name': name, 'labels': dict(labels)}
+            if isinstance(value, Histogram):
+                entry.update(value.summary())
+            else:
+                entry['value'] = value
+            series.append(entry)
+        return {'started': self._started,
+                'uptime': time.time() - self._started,
+                'pid': os.getpid(),
+                'series': series,
+                'gauges': dict(self._gauges())}
+
+    def openmetrics(self):
+        """ OpenMetrics text exposition """
+        lines = []
+        described = set()
+        for (name, labels, value) in self._items():
+            family = name[:-len('_total')] if name.endswith('_total') else name
+            if family not in described:
+                described.add(family)
+                (kind, help_text, _) = DESCRIPTIONS.get(name, ('counter' if name.endswith('_total') else 'histogram',
+                                                               name, None))
+                lines.append('# TYPE {} {}'.format(family, kind))
+                lines.append('# HELP {} {}'.format(family, help_text))
+            if isinstance(value, Histogram):
+                cumulative = 0
+                for (bound, n) in zip(map(repr, map(float, value.bounds)) + ['+Inf'], value.counts):
+                    cumulative += n
+                    lines.append('{}_bucket{} {}'.format(name, _labels_text(labels, [('le', bound)]), cumulative))
+                lines.append('{}_count{} {}'.format(name, _labels_text(labels), value.count))
+                lines.append('{}_sum{} {!r}'.format(name, _labels_text(labels), value.sum))
+            else:
+                lines.append('{}{} {}'.format(name, _labels_text(labels), value))
+        for (name, value) in self._gauges():
+            lines.append('# TYPE {} gauge'.format(name))
+            lines.append('{} {}'.format(name, value))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """ Writes JSON ('.json' files) or OpenMetrics text; the file is replaced atomically """
+        if path.lower().endswith('.json'):
+            text = json.dumps(self.snapshot(), indent=2, sort_keys=True)
+        else:
+            text = self.openmetrics()
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+
+metrics = Metrics()
+
+
+def _export_at_exit():
+    if settings.metrics and settings.metrics_file:
+        try:
+            metrics.export(settings.metrics_file)
+        except Exception as ex:
+            logger.error('unable to write metrics to "%s": %s', settings.metrics_file, ex)
+
+
+atexit.register(_export_at_exit)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Monitors - process-wide cache of the monitor topology (bounds and scaling factor per screen)
+   and the Display instance shared by all Regions and Screens. Querying the OS
+   (EnumDisplayMonitors/GetMonitorInfo, NSScreen) happens once per screen; call
+   monitors.refresh() after monitors are attached, detached or rearranged.
+   The platform display backend is imported when the display is used first time.
+"""
+
+import platform
+import threading
+from frame_cache import frame_cache
+
+
+def display_class():
+    """ Display class of the current platform """
+    current_platform = platform.system()
+    if current_platform == 'Darwin':
+        from display_mac import Display
+    elif current_platform == 'Windows':
+        from display_win import Display
+    elif current_platform == 'Linux':
+        from display_linux import Display
+    else:
+        raise NotImplementedError
+    return Display
+
+
+class Monitors(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._display = None
+        self._info = {}  # screen number -> get_monitor_info(n)
+        self.queries = 0
+
+    @property
+    def display(self):
+        """ Display instance shared by all Regions """
+        if self._display is None:
+            with self._lock:
+                if self._display is None:
+                    self._display = display_class()()
+        return self._display
+
+    def use_display(self, display):
+        """
+        Makes 'display' (any object with the Display interface, e.g. synthetic.SyntheticDisplay)
+        the display of Regions and Screens created after the call
+        """
+        with self._lock:
+            self._display = display
+        self.refresh()
+
+    def get_monitor_info(self, n):
+        """ Cached Display().get_monitor_info(n) """
+        info = self._info.get(n)
+        if info is None:
+            info = self.display.get_monitor_info(n)
+            with self._lock:
+                self.queries += 1
+                self._info[n] = info
+        return info
+
+    def scaling_factor(self, n=1):
+        return self.get_monitor_info(n)[-1]
+
+    def refresh(self):
+        """ Forget cached topology (and screenshots taken with it); displays which cache the screen size read it again """
+        with self._lock:
+            self._info.clear()
+            display = self._display
+        refresh = getattr(display, 'refresh', None)
+        if refresh is not None:
+            refresh()
+        frame_cache.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {'queries': self.queries,
+                    'screens': len(self._info)}
+
+
+monitors = Monitors()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Pattern bundle - a directory of images compiled into one file of raw BGR arrays.
+   Bundles registered with settings.add_pattern_bundle() are memory mapped and
+   Pattern objects get their images as read-only views of the mapping: there is
+   no decoding and no copying, and processes on one host share the page cache.
+
+   File layout (little-endian):
+       header  -- MAGIC, index offset (uint64), index length (uint64)
+       data    -- raw uint8 BGR arrays (h, w, 3), every array starts at a multiple of ALIGNMENT
+       index   -- JSON: {"source_dir": ..., "images": {"relative/path.png": [offset, h, w], ...}}
+
+   Compile a bundle:
+       python -m pikuli.pattern_bundle <image_dir> <bundle_file>
+"""
+
+import json
+import os
+import struct
+import threading
+from Settings import settings
+from common_exceptions import FailExit
+from lazy_import import LazyModule
+
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
+MAGIC = 'PIKULIB1'
+HEADER = struct.Struct('<8sQQ')
+ALIGNMENT = 64
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.jpg', '.jpeg', '.tif', '.tiff')
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def compile_bundle(image_dir, bundle_path):
+    """
+    Decodes every image under 'image_dir' (recursively) the same way Pattern does
+    and writes them into 'bundle_path'. Returns number of images written.
+    """
+    image_dir = os.path.abspath(image_dir)
+    names = []
+    for (root, _, files) in os.walk(image_dir):
+        for f in files:
+            if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS:
+                names.append(os.path.relpath(os.path.join(root, f), image_dir).replace(os.sep, '/'))
+
+    images = {}
+    with open(bundle_path, 'wb') as bundle:
+        offset = _aligned(HEADER.size)
+        for name in sorted(names):
+            img = cv2.imread(os.path.join(image_dir, name))
+            if img is None:
+                raise FailExit('unable to decode image file "{}"'.format(os.path.join(image_dir, name)))
+            bundle.seek(offset)
+            bundle.write(np.ascontiguousarray(img).tobytes())
+            images[name] = [offset, img.shape[0], img.shape[1]]
+            offset = _aligned(offset + img.nbytes)
+
+        index = json.dumps({'source_dir': image_dir, 'images': images}).encode('utf-8')
+        bundle.seek(offset)
+        bundle.write(index)
+        bundle.seek(0)
+        bundle.write(HEADER.pack(MAGIC, offset, len(index)))
+    return len(images)
+
+
+class PatternBundle(object):
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            (magic, index_offset, index_length) = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise FailExit('"{}" is not a pattern bundle'.format(self.path))
+            f.seek(index_offset)
+            index = json.loads(f.read(index_length).decode('utf-8'))
+        self.source_dir = index['source_dir']
+        self._images = index['images']
+        self._mmap = np.memmap(self.path, dtype=np.uint8, mode='r')
+
+    def __contains__(self, img_path):
+        return self.get(img_path) is not None
+
+    def _name(self, img_path):
+        if os.path.isabs(img_path):
+            try:
+                img_path = os.path.relpath(img_path, self.source_dir)
+            except ValueError:  # another drive on Windows
+                return None
+        return os.path.normpath(img_path).replace(os.sep, '/')
+
+    def names(self):
+        return sorted(self._images)
+
+    def get(self, img_path):
+        """
+        Returns (full path of the source image, read-only view of its BGR array)
+        or None if the image is not in the bundle.
+        """
+        name = self._name(img_path)
+        if name is None or name not in self._images:
+            return None
+        (offset, h, w) = self._images[name]
+        return (os.path.join(self.source_dir, name.replace('/', os.sep)),
+                self._mmap[offset:offset + h * w * 3].reshape((h, w, 3)))
+
+
+_bundles = {}
+_bundles_lock = threading.Lock()
+
+
+def open_bundle(path):
+    """ Every bundle file is mapped once per process """
+    path = os.path.abspath(path)
+    with _bundles_lock:
+        if path not in _bundles:
+            _bundles[path] = PatternBundle(path)
+        return _bundles[path]
+
+
+def find_bundled(img_path):
+    """
+    Looks for 'img_path' (relative to a bundle's image directory or absolute)
+    in bundles from settings.list_pattern_bundles().
+    Returns (full path, image view) or None.
+    """
+    for path in settings.list_pattern_bundles():
+        found = open_bundle(path).get(img_path)
+        if found is not None:
+            return found
+    return None
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compile a directory of pattern images into a pikuli pattern bundle.')
+    parser.add_argument('image_dir')
+    parser.add_argument('bundle_file')
+    args = parser.parse_args()
+    print('{n} images written to {f}'.format(n=compile_bundle(args.image_dir, args.bundle_file), f=args.bundle_file))
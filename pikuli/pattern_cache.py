@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+   PatternCache - process-wide cache of decoded pattern images.
+   Images are shared read-only between Pattern objects, so creating a Pattern
+   for an already decoded file costs an os.stat() instead of cv2.imread().
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from Settings import settings
+from metrics import metrics
+from common_exceptions import FailExit
+from lazy_import import LazyModule
+
+cv2 = LazyModule('cv2')
+
+
+class PatternCache(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images = OrderedDict()  # path -> ((mtime, size), image); the last item is the most recently used
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """
+        Returns decoded image of the file 'path' (absolute path).
+        The file is decoded again if its mtime or size has changed.
+        """
+        return self.get_stamped(path)[1]
+
+    def get_stamped(self, path):
+        """ Same as get(), returns ((mtime, size) of the file, image) """
+        st = os.stat(path)
+        stamp = (st.st_mtime, st.st_size)
+        with self._lock:
+            entry = self._images.pop(path, None)
+            if entry is not None:
+                if entry[0] == stamp:
+                    self._images[path] = entry
+                    self.hits += 1
+                    return entry
+                self._bytes -= entry[1].nbytes
+            self.misses += 1
+
+        started = time.time()
+        img = cv2.imread(path)
+        if img is None:
+            raise FailExit('unable to decode image file "{}"'.format(path))
+        metrics.observe('pikuli_pattern_load_seconds', time.time() - started)
+        img.flags.writeable = False
+
+        with self._lock:
+            self._put(path, stamp, img)
+        return (stamp, img)
+
+    def _put(self, path, stamp, img):
+        budget = settings.pattern_cache_size
+        if img.nbytes > budget:
+            return
+        old = self._images.pop(path, None)
+        if old is not None:
+            self._bytes -= old[1].nbytes
+        while self._images and self._bytes + img.nbytes > budget:
+            (_, (_, evicted)) = self._images.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+        self._images[path] = (stamp, img)
+        self._bytes += img.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._images),
+                    'bytes': self._bytes,
+                    'budget': settings.pattern_cache_size}
+
+
+pattern_cache = PatternCache()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Conversion of raw screenshot buffers into BGR numpy arrays used for matching.
+   A buffer is wrapped as a strided view without Python-level loops or intermediate
+   lists, padding at the end of rows is skipped by the view and the only copy is
+   the final contiguous BGR array, which may be a buffer given by the caller ('out').
+"""
+
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from common_exceptions import FailExit
+
+# Channel orders converted by cv2.cvtColor (SIMD, handles row padding itself)
+CVT_CODES = {'BGRA': cv2.COLOR_BGRA2BGR,
+             'BGRX': cv2.COLOR_BGRA2BGR,
+             'RGBA': cv2.COLOR_RGBA2BGR,
+             'RGBX': cv2.COLOR_RGBA2BGR,
+             'RGB': cv2.COLOR_RGB2BGR}
+
+
+def buffer_view(buf, w, h, stride=None, channels=4):
+    """
+    Read-only (h, w, channels) uint8 view of 'buf' (any object with the buffer interface).
+    stride - bytes per row including alignment padding; None - rows are not padded.
+    """
+    if stride is None:
+        stride = w * channels
+    if stride < w * channels:
+        raise FailExit('pixel buffer: stride {s} is less than row size {r}'.format(s=stride, r=w * channels))
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    if h > 0 and arr.size < stride * (h - 1) + w * channels:
+        raise FailExit('pixel buffer: {n} bytes is not enough for {w}x{h} pixels with stride {s}'.format(
+            n=arr.size, w=w, h=h, s=stride))
+    view = as_strided(arr, shape=(h, w, channels), strides=(stride, channels, 1))
+    view.flags.writeable = False
+    return view
+
+
+def buffer_to_bgr(buf, w, h, stride=None, channel_order='BGRA', out=None):
+    """
+    Contiguous (h, w, 3) BGR copy of a raw 8-bit buffer.
+    channel_order - order of bytes in one pixel: 'BGRA', 'BGRX', 'RGBA', 'RGB', 'BGR', 'ARGB' etc.
+    out           - contiguous (h, w, 3) uint8 array to write the copy into and return; None - a new array
+    """
+    channels = len(channel_order)
+    try:
+        index = [channel_order.index(c) for c in 'BGR']
+    except ValueError:
+        raise FailExit('pixel buffer: unsupported channel order "{}"'.format(channel_order))
+    if out is not None and (out.shape != (h, w, 3) or out.dtype != np.uint8 or not out.flags.c_contiguous):
+        raise FailExit('pixel buffer: "out" should be contiguous uint8 array of shape {s}, not {o} {t}'.format(
+            s=(h, w, 3), o=out.shape, t=out.dtype))
+
+    view = buffer_view(buf, w, h, stride, channels)
+    if channel_order in CVT_CODES:
+        return cv2.cvtColor(view, CVT_CODES[channel_order], dst=out)
+
+    step = index[1] - index[0]
+    if step in (1, -1) and index[2] - index[1] == step:
+        # B, G, R are adjacent bytes (BGRA, RGBA, ARGB...): select them with a slice, still a view
+        stop = index[2] + step
+        bgr_view = view[:, :, index[0]:(stop if stop >= 0 else None):step]
+        if out is None:
+            return np.ascontiguousarray(bgr_view)
+        np.copyto(out, bgr_view)
+        return out
+
+    bgr = np.empty((h, w, 3), dtype=np.uint8) if out is None else out
+    for (i, c) in enumerate(index):
+        bgr[:, :, i] = view[:, :, c]
+    return bgr
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+"""
+   In-process backends for running pikuli without a desktop (benchmarks, CI):
+
+   SyntheticDisplay - serves screenshots from numpy arrays, image files, a recorded
+                      sequence of frames (see record()) or a Scene, with optional
+                      per-capture latency.
+   Scene            - scripted application: named states with screen images and transitions
+                      triggered by clicks, typed text or time.
+   StubMouse, StubKeyboard - record input and pass it to a Scene.
+
+       scene = Scene({'login': 'login.png', 'main': 'main.png'}, 'login')
+       scene.on_click('login', (500, 400, 80, 30), 'main')
+       install(SyntheticDisplay(scene), StubMouse(scene), StubKeyboard(scene))
+       Region(0, 0, 1024, 768).find('ok.png').click()
+"""
+
+import os
+import threading
+import time
+from common_exceptions import FailExit
+from lazy_import import LazyModule
+
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
+clock = getattr(time, 'monotonic', time.time)
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.jpg', '.jpeg', '.tif', '.tiff')
+
+
+def _load_image(image):
+    """ numpy array or path to an image file -> BGR numpy array """
+    if isinstance(image, basestring):
+        loaded = cv2.imread(image)
+        if loaded is None:
+            raise FailExit('pikuli: can not read image "{}"'.format(image))
+        return loaded
+    return image
+
+
+def install(display=None, mouse=None, keyboard=None):
+    """ Makes Regions created after the call use 'display' and all Locations use 'mouse' and 'keyboard' """
+    from monitors import monitors
+    from Location import Location
+    if display is not None:
+        monitors.use_display(display)
+    Location.use_devices(mouse, keyboard)
+
+
+def record(display, x, y, w, h, count, interval, directory):
+    """ Saves 'count' screenshots of the area taken every 'interval' seconds as frame_NNNNN.png """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for k in range(count):
+        cv2.imwrite(os.path.join(directory, 'frame_{:05d}.png'.format(k)), display.take_screenshot(x, y, w, h))
+        time.sleep(interval)
+
+
+class Scene(object):
+    def __init__(self, states, initial):
+        """
+        states  - {state name: screen image (numpy array or path)}
+        initial - name of the first state
+        """
+        self._images = dict((name, _load_image(image)) for (name, image) in states.items())
+        if initial not in self._images:
+            raise FailExit('pikuli: unknown scene state "{}"'.format(initial))
+        self._lock = threading.Lock()
+        self._state = initial
+        self._entered = clock()
+        self._clicks = []  # (state, (x, y, w, h), button, next state)
+        self._texts = []  # (state, text or None, next state)
+        self._timers = {}  # state -> (seconds, next state)
+        self.events = []  # input received: ('click', x, y, button), ('type', text, modifiers)...
+
+    def _check_state(self, *names):
+        for name in names:
+            if name not in self._images:
+                raise FailExit('pikuli: unknown scene state "{}"'.format(name))
+
+    def on_click(self, state, rect, next_state, button='left'):
+        """ Click with 'button' inside rect = (x, y, w, h) in 'state' switches to 'next_state' """
+        self._check_state(state, next_state)
+        self._clicks.append((state, tuple(rect), button, next_state))
+
+    def on_type(self, state, text, next_state):
+        """ Typing 'text' (None - any text) in 'state' switches to 'next_state' """
+        self._check_state(state, next_state)
+        self._texts.append((state, text, next_state))
+
+    def after(self, state, seconds, next_state):
+        """ 'state' switches to 'next_state' after 'seconds' """
+        self._check_state(state, next_state)
+        self._timers[state] = (seconds, next_state)
+
+    def _enter(self, state):
+        self._state = state
+        self._entered = clock()
+
+    def _update(self):
+        """ Applies timed transitions; the lock must be held """
+        while self._state in self._timers:
+            (seconds, next_state) = self._timers[self._state]
+            if clock() - self._entered < seconds:
+                break
+            self._entered += seconds
+            self._state = next_state
+
+    @property
+    def state(self):
+        with self._lock:
+            self._update()
+            return self._state
+
+    def frame(self):
+        with self._lock:
+            self._update()
+            return self._images[self._state]
+
+    def click(self, x, y, button='left'):
+        with self._lock:
+            self._update()
+            self.events.append(('click', x, y, button))
+            for (state, (rx, ry, rw, rh), b, next_state) in self._clicks:
+                if state == self._state and b == button and rx <= x < rx + rw and ry <= y < ry + rh:
+                    self._enter(next_state)
+                    break
+
+    def type_text(self, text, modifiers=None):
+        with self._lock:
+            self._update()
+            self.events.append(('type', text, modifiers))
+            for (state, expected, next_state) in self._texts:
+                if state == self._state and expected in (None, text):
+                    self._enter(next_state)
+                    break
+
+    def record_event(self, *event):
+        with self._lock:
+            self.events.append(event)
+
+
+class SyntheticDisplay(object):
+    DELAY_KBD_KEY_PRESS = 0.020
+    DELAY_BETWEEN_ATTEMTS = 0.5
+
+    def __init__(self, source, interval=1.0, loop=False, latency=0, scaling_factor=1, monitors=None):
+        """
+        source   - numpy array or image file: static screen;
+                   list of arrays/files: frames shown one after another for 'interval' seconds each;
+                   list of (seconds, array/file): frames shown from the given time since creation;
+                   directory: recorded frames (see record()) in the order of file names;
+                   Scene: image of its current state.
+        loop     - start the sequence again after the last frame instead of staying on it
+        latency  - seconds every take_screenshot() takes, or function (w, h) -> seconds
+        monitors - [(x, y, w, h)] of screens 1, 2... in the picture (the virtual desktop);
+                   None - one screen showing the whole picture
+        """
+        self.latency = latency
+        self.scaling_factor = scaling_factor
+        self.captures = 0
+        self._scene = None
+        self._timeline = None  # [(start seconds, image)]
+        self._loop = loop
+        self._started = clock()
+
+        if isinstance(source, Scene):
+            self._scene = source
+            first = source.frame()
+        else:
+            if isinstance(source, basestring) and os.path.isdir(source):
+                directory = source
+                source = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                                if name.lower().endswith(IMAGE_EXTENSIONS))
+                if not source:
+                    raise FailExit('pikuli: no frames in "{}"'.format(directory))
+            if isinstance(source, (list, tuple)):
+                if source and isinstance(source[0], tuple):
+                    self._timeline = [(float(t), _load_image(image)) for (t, image) in source]
+                else:
+                    self._timeline = [(k * interval, _load_image(image)) for (k, image) in enumerate(source)]
+                self._period = self._timeline[-1][0] + interval
+            else:
+                self._timeline = [(0.0, _load_image(source))]
+                self._period = None
+            first = self._timeline[0][1]
+        (self.h, self.w) = first.shape[:2]
+        self.monitors = [tuple(m) for m in monitors] if monitors else [(0, 0, self.w, self.h)]
+
+    def show(self, image):
+        """ Replaces whatever the source was with a static screen """
+        self._scene = None
+        self._timeline = [(0.0, _load_image(image))]
+        self._loop = False
+
+    def frame(self):
+        """ Image of the whole screen at this moment """
+        if self._scene is not None:
+            return self._scene.frame()
+        elapsed = clock() - self._started
+        if self._loop and self._period:
+            elapsed %= self._period
+        image = self._timeline[0][1]
+        for (start, frame) in self._timeline:
+            if start > elapsed:
+                break
+            image = frame
+        return image
+
+    def _monitor_hndl_to_screen_n(self, m_hndl):
+        return m_hndl
+
+    def get_monitor_info(self, n):
+        """ Screen 0 is the whole virtual desktop """
+        if n == 0:
+            return (1, None, (0, 0, self.w, self.h), self.scaling_factor)
+        if not 1 <= n <= len(self.monitors):
+            raise FailExit('wrong screen number "{}"'.format(n))
+        (x, y, w, h) = self.monitors[n - 1]
+        return (n, None, (x, y, x + w, y + h), self.scaling_factor)
+
+    def take_screenshot(self, x, y, w, h, hwnd=None):
+        [x, y, w, h] = map(int, [x, y, w, h])
+        latency = self.latency(w, h) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        self.captures += 1
+        frame = self.frame()
+        if x < 0 or y < 0 or x + w > frame.shape[1] or y + h > frame.shape[0]:
+            raise FailExit('pikuli: area ({x}, {y}, {w}, {h}) is out of the screen {s}'.format(
+                x=x, y=y, w=w, h=h, s=(frame.shape[1], frame.shape[0])))
+        return frame[y:y + h, x:x + w].copy()
+
+
+class StubMouse(object):
+    """ Mouse which moves nowhere: clicks go to the scene, everything is recorded in scene.events """
+    def __init__(self, scene=None):
+        self.scene = scene if scene is not None else Scene({'': np.zeros((1, 1, 3), np.uint8)}, '')
+        self.position = (0, 0)
+        self._is_mouse_down = False
+
+    def move(self, x, y, delay=0):
+        self.position = (x, y)
+        self.scene.record_event('move', x, y)
+
+    def key_down(self, x, y, key='left'):
+        self.position = (x, y)
+        self._is_mouse_down = True
+        self.scene.record_event('down', x, y, key)
+
+    def key_up(self, x, y, key='left'):
+        self.position = (x, y)
+        self._is_mouse_down = False
+        self.scene.record_event('up', x, y, key)
+
+    def click(self, x, y, delay=0):
+        self.position = (x, y)
+        self.scene.click(x, y, 'left')
+
+    def right_click(self, x, y, delay=0):
+        self.position = (x, y)
+        self.scene.click(x, y, 'right')
+
+    def double_click(self, x, y, delay=0):
+        self.click(x, y)
+        self.click(x, y)
+
+    def scroll(self, x, y, direction=1, click=False):
+        if click:
+            self.click(x, y)
+        self.position = (x, y)
+        self.scene.record_event('scroll', x, y, direction)
+
+    def drag_to(self, x_from, y_from, x_to, y_to, delay=0):
+        if not self._is_mouse_down:
+            self.key_down(x_from, y_from)
+        self.move(x_to, y_to)
+
+    def drop(self):
+        if not self._is_mouse_down:
+            raise FailExit('You try drop ({x}, {y}), but it is not bragged before!'.format(
+                x=self.position[0], y=self.position[1]))
+        self.key_up(*self.position)
+
+
+class StubKeyboard(object):
+    """ Keyboard which types into the scene """
+    def __init__(self, scene=None):
+        self.scene = scene if scene is not None else Scene({'': np.zeros((1, 1, 3), np.uint8)}, '')
+
+    def type_text(self, string, modifiers=None):
+        self.scene.type_text(string, modifiers)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Tracing of find/wait calls. Every registered hook receives a Span per call of
+   Region.find, find_any, find_each, find_all, find_all_points, exists, wait, wait_vanish
+   and Watcher.wait, once the call is over (in the thread which made it; for find_async etc.
+   in the thread of the wait scheduler):
+
+       def slow(span):
+           if span.duration > 1:
+               print(span.summary())
+       tracing.add_hook(slow)
+
+       with tracing.trace() as spans:       # or collect spans of a block of code
+           region.find('ok.png')
+       print(spans[0].summary())
+       # find ok.png: hit in 3.012 s; 6 polls (2 unchanged), capture 0.130 s,
+       #   match 0.410 s (ok.png 0.410 s), sleep 2.500 s, other 0.028 s; frame 1920x1080, best score 0.998
+
+   Without hooks the only cost of a call is one check of the hook list.
+"""
+
+import threading
+import time
+from functools import wraps
+from logger import PikuliLogger
+from common_exceptions import FindFailed, WaitCancelled
+from wait_task import Return
+
+logger = PikuliLogger('pikuli.Tracing ').logger
+
+clock = getattr(time, 'monotonic', time.time)
+
+_hooks = []
+_hooks_lock = threading.Lock()
+_local = threading.local()  # span of the call running in the current thread
+
+
+class Span(object):
+    """
+    Timing breakdown of one call:
+        operation   - 'find', 'wait', 'find_all'...
+        region      - Region (or Watcher) the call was made on
+        patterns    - file names of the patterns
+        outcome     - 'hit' (found), 'vanish' (vanished), 'timeout' (FindFailed), 'miss' (find_all/find_each
+                      found nothing), 'done' (wait() without pattern), 'cancelled' (WaitCancelled)
+                      or 'error' (any other exception)
+        duration    - seconds from the start to the end of the call
+        polls       - captures taken; 'unchanged' of them were identical to the previous one and were not matched
+        capture_time, sleep_time - seconds spent capturing the screen and waiting between polls
+        match_time  - {pattern file name: seconds of matching (matchTemplate and thresholding)}, all polls together
+        frame       - (w, h) of the last capture
+        best_score  - the best score any pattern got (None if nothing was matched)
+    """
+    __slots__ = ('operation', 'region', 'patterns', 'outcome', 'started', 'duration', 'polls', 'unchanged',
+                 'capture_time', 'sleep_time', 'match_time', 'frame', 'best_score', '_lock')
+
+    def __init__(self, operation, region):
+        self.operation = operation
+        self.region = region
+        self.patterns = []
+        self.outcome = None
+        self.started = clock()
+        self.duration = None
+        self.polls = 0
+        self.unchanged = 0
+        self.capture_time = 0.0
+        self.sleep_time = 0.0
+        self.match_time = {}
+        self.frame = None
+        self.best_score = None
+        self._lock = threading.Lock()  # patterns are matched in the threads of the matching pool
+
+    def set_patterns(self, patterns):
+        self.patterns = [p.get_filename(full_path=False) for p in patterns]
+
+    def add_capture(self, seconds, field):
+        self.polls += 1
+        self.capture_time += seconds
+        self.frame = (field.shape[1], field.shape[0])
+
+    def add_sleep(self, seconds):
+        self.sleep_time += seconds
+
+    def add_match(self, name, seconds, score):
+        with self._lock:
+            self.match_time[name] = self.match_time.get(name, 0.0) + seconds
+            if score is not None and (self.best_score is None or score > self.best_score):
+                self.best_score = score
+
+    def timed(self, find):
+        """ find(ptn, field) -> [(x, y, score)], which adds its time and the best score to the span """
+        def timed_find(ptn, field):
+            started = clock()
+            results = find(ptn, field)
+            self.add_match(ptn.get_filename(full_path=False), clock() - started,
+                           results[0][2] if results else None)
+            return results
+        return timed_find
+
+    @property
+    def other_time(self):
+        """ Seconds not spent capturing, matching or sleeping: Match construction, logging, Python overhead """
+        if self.duration is None:
+            return None
+        return self.duration - self.capture_time - self.sleep_time - sum(self.match_time.values())
+
+    def summary(self):
+        """ One-line human-readable breakdown """
+        text = '{op} {ptn}: {outcome} in {d:.3f} s; {polls} polls ({unchanged} unchanged), ' \
+               'capture {c:.3f} s, match {m:.3f} s ({per_ptn}), sleep {s:.3f} s, other {o:.3f} s'.format(
+                   op=self.operation, ptn=', '.join(self.patterns), outcome=self.outcome, d=self.duration,
+                   polls=self.polls, unchanged=self.unchanged, c=self.capture_time,
+                   m=sum(self.match_time.values()),
+                   per_ptn=', '.join('{} {:.3f} s'.format(n, t) for (n, t) in sorted(self.match_time.items())),
+                   s=self.sleep_time, o=self.other_time)
+        if self.frame is not None:
+            text += '; frame {}x{}'.format(*self.frame)
+        if self.best_score is not None:
+            text += ', best score {:.3f}'.format(self.best_score)
+        return text
+
+    def __repr__(self):
+        return '<Span {}>'.format(self.summary() if self.duration is not None else self.operation)
+
+
+def add_hook(hook):
+    """ hook(span) is called after every traced call """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    with _hooks_lock:
+        _hooks.remove(hook)
+
+
+class trace(object):
+    """
+    Context manager which registers 'hook' for the duration of the block.
+    Without 'hook' spans are collected into the list 'with' returns.
+    """
+    def __init__(self, hook=None):
+        self.spans = []
+        self.hook = hook if hook is not None else self.spans.append
+
+    def __enter__(self):
+        add_hook(self.hook)
+        return self.spans
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        remove_hook(self.hook)
+
+
+def current():
+    """ Span of the traced call running in the current thread or None """
+    return getattr(_local, 'span', None)
+
+
+def _emit(span):
+    for hook in list(_hooks):
+        try:
+            hook(span)
+        except Exception:
+            logger.exception('tracing hook %r failed', hook)
+
+
+def traced(operation):
+    """ Decorator of a method: makes a Span for every call while any hook is registered """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not _hooks:
+                return method(self, *args, **kwargs)
+            outer = current()
+            span = _local.span = Span(operation, self)
+            try:
+                result = method(self, *args, **kwargs)
+                if span.outcome is None:
+                    span.outcome = 'done'
+                return result
+            except BaseException as ex:
+                span.outcome = _outcome(span, ex)
+                raise
+            finally:
+                _local.span = outer
+                span.duration = clock() - span.started
+                _emit(span)
+        return wrapper
+    return decorator
+
+
+def traced_steps(operation):
+    """
+    traced() for a method returning a wait generator (see wait_task): the span is current
+    while the generator runs, wherever it is driven from, and is emitted when it is over
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not _hooks:
+                return method(self, *args, **kwargs)
+            return _traced_steps(Span(operation, self), method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _traced_steps(span, steps):
+    try:
+        while True:
+            outer = current()
+            _local.span = span
+            try:
+                seconds = next(steps)
+            except StopIteration:
+                break
+            finally:
+                _local.span = outer
+            yield seconds
+        if span.outcome is None:
+            span.outcome = 'done'
+    except BaseException as ex:
+        if isinstance(ex, GeneratorExit):  # WaitTask.cancel()
+            steps.close()
+        span.outcome = _outcome(span, ex)
+        raise
+    finally:
+        span.duration = clock() - span.started
+        _emit(span)
+
+
+def _outcome(span, ex):
+    """ Outcome of the call which raised 'ex' """
+    if isinstance(ex, Return):
+        return span.outcome or 'done'
+    if isinstance(ex, FindFailed):
+        return 'timeout'
+    if isinstance(ex, (WaitCancelled, GeneratorExit)):
+        return 'cancelled'
+    return 'error' if isinstance(ex, Exception) else span.outcome
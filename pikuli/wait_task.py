@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+   WaitTask - find/wait/wait_vanish/exists running in the background, so that one thread
+   can drive many waits at once:
+
+       login = region.find_async('login.png', timeout=30)
+       error = other_region.exists_async('error.png')
+       ...
+       if error.result():
+           login.cancel()
+       match = login.result(timeout=5)
+
+   A wait is a generator of its polls: it yields the seconds to sleep before the next poll
+   and raises Return(value) (or just ends) when it is done. run() drives it on the calling
+   thread; WaitTask hands it to the scheduler - one thread which takes turns at the polls of
+   all pending waits in the order they are due (the matching they do goes to the matching pool).
+   A cancelled wait is closed before its next poll and its result() raises WaitCancelled.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from common_exceptions import WaitCancelled
+
+
+class Return(BaseException):
+    """ Raised by a wait generator to finish with 'value' (BaseException: 'except Exception' doesn't stop it) """
+    def __init__(self, value=None):
+        super(Return, self).__init__(value)
+        self.value = value
+
+
+def run(steps):
+    """ Runs the wait generator 'steps' on the calling thread; returns its Return value """
+    try:
+        for seconds in steps:
+            time.sleep(seconds)
+    except Return as ret:
+        return ret.value
+
+
+class _Scheduler(object):
+    """ The thread running the polls of all WaitTasks """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (time of the poll, number, WaitTask)
+        self._numbers = itertools.count()
+        self._thread = None
+
+    def add(self, task, delay=0):
+        """ Schedules the next poll of 'task' in 'delay' seconds; an earlier scheduled one is dropped """
+        with self._cond:
+            if task.cancelled():
+                delay = 0  # cancel() may have come while the task was polling
+            task._number = next(self._numbers)
+            heapq.heappush(self._queue, (time.time() + delay, task._number, task))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pikuli-wait')
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def _next(self):
+        """ Waits for the task whose poll is due and takes it from the queue """
+        with self._cond:
+            while True:
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                (due, number, task) = self._queue[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                if number == task._number:
+                    return task
+
+    def _run(self):
+        while True:
+            task = self._next()
+            delay = task._step()
+            if delay is not None:
+                self.add(task, delay)
+
+
+scheduler = _Scheduler()
+
+
+class WaitTask(object):
+    def __init__(self, steps):
+        """ Starts the wait generator 'steps' (see the module docstring) on the scheduler """
+        self._steps = steps
+        self._number = None  # of the latest poll scheduled, see _Scheduler.add()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._result = None
+        self._error = None  # exception raised by the wait
+        scheduler.add(self)
+
+    def _step(self):
+        """ Runs the wait up to its next sleep; returns the seconds to sleep or None when it is done """
+        if self.done():
+            return None
+        if self._cancel.is_set():
+            self._steps.close()
+            self._error = WaitCancelled('cancelled')
+        else:
+            try:
+                return float(next(self._steps))
+            except StopIteration:
+                pass
+            except Return as ret:
+                self._result = ret.value
+            except BaseException as ex:
+                self._error = ex
+        self._done.set()
+
+    def cancel(self):
+        """ Asks the wait to stop; it is closed instead of its next poll """
+        if not self._cancel.is_set() and not self.done():
+            self._cancel.set()
+            scheduler.add(self)
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Returns what the wait returned or raises what it raised.
+        timeout - seconds to wait for it; after that the wait is cancelled and WaitCancelled is raised.
+        """
+        if not self._done.wait(timeout):
+            self.cancel()
+            self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
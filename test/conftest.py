@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Fixtures and images shared by the tests that run over a synthetic screen.
+   A test module adds its own setup by overriding 'display' with a fixture that takes 'display'.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+from pikuli import Location
+from pikuli.Settings import settings
+from pikuli.monitors import monitors
+from pikuli.synthetic import SyntheticDisplay, install
+
+PATTERN_IMAGE_PATH = os.path.join('test', 'Data', 'test_pattern.png')
+PATTERN = cv2.imread(PATTERN_IMAGE_PATH)
+(PH, PW) = PATTERN.shape[:2]
+BACKGROUND = np.random.RandomState(0).randint(0, 256, (300, 400, 3)).astype(np.uint8)
+
+
+@pytest.fixture
+def display():
+    """ SyntheticDisplay showing BACKGROUND; the display and the mouse and keyboard are restored afterwards """
+    saved = (monitors._display, Location._mouse, Location._keyboard)
+    display = SyntheticDisplay(BACKGROUND)
+    install(display)
+    yield display
+    monitors.use_display(saved[0])
+    (Location._mouse, Location._keyboard) = saved[1:]
+
+
+@pytest.fixture(params=[1, 4])
+def threads(request):
+    saved = settings.matching_threads
+    settings.matching_threads = request.param
+    yield request.param
+    settings.matching_threads = saved
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import numpy as np
+from hamcrest import assert_that, equal_to, less_than, not_none
+from matchers import ImageEqualTo
+from pikuli import Region
+from pikuli.capture_service import CaptureService, clock
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW
+
+
+def screen(seed):
+    return np.random.RandomState(seed).randint(0, 256, (300, 400, 3)).astype(np.uint8)
+
+
+class FramesDisplay(object):
+    """ Returns the next of the given frames on every capture (the last one is repeated) """
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def take_screenshot(self, x, y, w, h, hwnd=None):
+        return self.frames.pop(0) if len(self.frames) > 1 else self.frames[0]
+
+
+class TestCaptureService(object):
+    def test_take(self, display):
+        with CaptureService(Region(0, 0, 400, 300), rate=50) as service:
+            (seq, view) = service.take(Region(50, 40, 100, 60))
+            assert_that(view, ImageEqualTo(screen(0)[40:100, 50:150]))
+            assert_that(service.is_current(seq), equal_to(True))
+
+    def test_search_area(self, display):
+        region = Region(50, 40, 100, 60)
+        with CaptureService(Region(0, 0, 400, 300), rate=50, size=2):
+            area = region.search_area
+            for seed in (1, 2):  # two changes: the slot of 'area' is reused
+                display.show(screen(seed))
+                time.sleep(0.2)
+            assert_that(area, ImageEqualTo(screen(0)[40:100, 50:150]))
+            assert_that(region.search_area, ImageEqualTo(screen(2)[40:100, 50:150]))
+
+    def test_wait_newer(self, display):
+        with CaptureService(Region(0, 0, 400, 300), rate=50) as service:
+            (seq, _) = service.take(Region(0, 0, 400, 300))
+            started = clock()
+            assert_that(service.wait_newer(seq, 0.2), equal_to(False))  # the picture doesn't change
+            assert_that(clock() - started, less_than(1))
+
+            threading.Timer(0.1, display.show, [screen(1)]).start()
+            assert_that(service.wait_newer(seq, 3), equal_to(True))
+            assert_that(service.take(Region(0, 0, 400, 300))[1], ImageEqualTo(screen(1)))
+
+            captured = clock()
+            assert_that(service.wait_captured_after(captured, 3), not_none())  # a capture, not a change
+
+    def test_is_current(self, display):
+        service = CaptureService(Region(0, 0, 400, 300), size=2)
+        display.show(screen(1))
+        service._capture()
+        seq = service.newest()[0]
+        display.show(screen(2))
+        service._capture()
+        assert_that(service.is_current(seq), equal_to(True))
+        display.show(screen(3))
+        service._capture()  # the slot of 'seq' is reused
+        assert_that(service.is_current(seq), equal_to(False))
+
+    def test_shape_change(self, display):
+        small = screen(1)[:100, :100]
+        service = CaptureService(Region(0, 0, 400, 300), size=4)
+        service._display = FramesDisplay([screen(0), small])
+        service._capture()
+        (old_seq, _, _) = service.newest()
+        service._capture()
+        (seq, _, frame) = service.newest()
+        assert_that(seq, equal_to(old_seq + 1))
+        assert_that(frame, ImageEqualTo(small))
+        assert_that(service.is_current(old_seq), equal_to(False))
+        assert_that(service.is_current(seq), equal_to(True))
+
+    def test_region_wait(self, display):
+        screen_with_pattern = screen(0)
+        screen_with_pattern[100:100 + PH, 200:200 + PW] = PATTERN
+        region = Region(0, 0, 400, 300)
+        with CaptureService(region, rate=50):
+            threading.Timer(0.3, display.show, [screen_with_pattern]).start()
+            started = time.time()
+            match = region.wait(PATTERN_IMAGE_PATH, timeout=5)
+        assert_that((match.x, match.y), equal_to((200, 100)))
+        assert_that(time.time() - started, less_than(2))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+   Needs an X server, e.g.:  Xvfb :99 -screen 0 1280x1024x24 & DISPLAY=:99 python -m pytest test
+"""
+
+import ctypes
+import os
+import platform
+import pytest
+from hamcrest import assert_that, equal_to, calling, raises
+from pikuli.common_exceptions import FailExit
+
+pytestmark = pytest.mark.skipif(platform.system() != 'Linux' or not os.environ.get('DISPLAY'),
+                                reason='X server is not available')
+
+
+def fill_rectangle(display, x, y, w, h, rgb):
+    """ Draws a filled rectangle on the root window with plain Xlib calls """
+    x11 = ctypes.CDLL('libX11.so.6')
+    x11.XCreateGC.restype = ctypes.c_void_p
+    x11.XCreateGC.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_void_p]
+    x11.XSetForeground.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong]
+    x11.XFillRectangle.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_void_p,
+                                   ctypes.c_int, ctypes.c_int, ctypes.c_uint, ctypes.c_uint]
+    x11.XFreeGC.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    gc = x11.XCreateGC(display._dpy, display._root, 0, None)
+    x11.XSetForeground(display._dpy, gc, rgb)
+    x11.XFillRectangle(display._dpy, display._root, gc, x, y, w, h)
+    x11.XFreeGC(display._dpy, gc)
+    x11.XSync(display._dpy, 0)
+
+
+class TestDisplayLinux(object):
+    @pytest.fixture(scope='class')
+    def display(self):
+        from pikuli.display_linux import Display
+        display = Display()
+        yield display
+        display.close()
+
+    def test_take_screenshot(self, display):
+        fill_rectangle(display, 10, 20, 30, 40, 0x336699)
+        image = display.take_screenshot(0, 0, 100, 100)
+        assert_that(image.shape, equal_to((100, 100, 3)))
+        assert_that(image[20:60, 10:40].reshape(-1, 3).tolist(), equal_to([[0x99, 0x66, 0x33]] * 1200))
+        # Another size reuses the same shared segment
+        assert_that(display.take_screenshot(10, 20, 5, 5)[0, 0].tolist(), equal_to([0x99, 0x66, 0x33]))
+
+    def test_take_screenshot_out(self, display):
+        import numpy as np
+        fill_rectangle(display, 10, 20, 30, 40, 0x336699)
+        out = np.zeros((40, 30, 3), np.uint8)
+        image = display.take_screenshot(10, 20, 30, 40, out=out)
+        assert_that(image.ctypes.data, equal_to(out.ctypes.data))
+        assert_that(out.reshape(-1, 3).tolist(), equal_to([[0x99, 0x66, 0x33]] * 1200))
+
+    def test_get_monitor_info(self, display):
+        (_, _, rect, scale) = display.get_monitor_info(1)
+        assert_that((rect[2] - rect[0] > 0, rect[3] - rect[1] > 0, scale), equal_to((True, True, 1)))
+        assert_that(display.get_monitor_info(0)[0], equal_to(1))  # as SyntheticDisplay
+
+    def test_resized(self, display):
+        """ The screen was smaller when the size was read: a capture beyond it reads the size again """
+        size = display._size
+        display._size = (100, 100)
+        display.refresh()
+        assert_that(display._size, equal_to(size))
+
+        display._size = (100, 100)
+        fill_rectangle(display, size[0] - 10, 0, 10, 10, 0x336699)
+        image = display.take_screenshot(size[0] - 20, 0, 20, 20)
+        assert_that(image[0, -1].tolist(), equal_to([0x99, 0x66, 0x33]))
+        assert_that(display._size, equal_to(size))
+
+    def test_out_of_screen(self, display):
+        (_, _, rect, _) = display.get_monitor_info(0)
+        assert_that(calling(display.take_screenshot).with_args(rect[2] - 10, 0, 20, 20), raises(FailExit))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import cv2
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, has_length, calling, raises
+from pikuli import Region, Pattern
+from pikuli.Settings import settings
+from pikuli.failure_artifacts import failure_artifacts
+from pikuli.common_exceptions import FindFailed
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW
+
+
+def background(seed):
+    return np.random.RandomState(seed).randint(0, 256, (300, 400, 3)).astype(np.uint8)
+
+
+@pytest.fixture
+def display(display, tmpdir):
+    saved = (settings._find_failed_dir, settings.find_failed_max_files, settings.find_failed_score_map)
+    settings.find_failed_dir = str(tmpdir)
+    yield display
+    failure_artifacts.flush()
+    (settings.find_failed_dir, settings.find_failed_max_files, settings.find_failed_score_map) = saved
+
+
+def fail(region):
+    assert_that(calling(region.find).with_args(PATTERN_IMAGE_PATH, timeout=0), raises(FindFailed))
+    failure_artifacts.flush()
+
+
+class TestFailureArtifacts(object):
+    def test_frame_saved(self, display, tmpdir):
+        region = Region(50, 40, 200, 100)
+        fail(region)
+        captures = display.captures
+        [name] = tmpdir.listdir()
+        assert_that(cv2.imread(str(name)).shape, equal_to((100, 200, 3)))
+        assert_that(display.captures, equal_to(captures))  # the failed frame is saved, not a new screenshot
+
+        fail(region)  # the same screen
+        assert_that(tmpdir.listdir(), has_length(1))
+
+    def test_same_frame_other_patterns(self, display, tmpdir):
+        (frame, other) = (background(1), str(tmpdir.join('other.png')))
+        cv2.imwrite(other, background(2)[:PH, :PW])
+        first = failure_artifacts.save(frame, 'first', [Pattern(PATTERN_IMAGE_PATH)])
+        again = failure_artifacts.save(frame, 'again', [Pattern(PATTERN_IMAGE_PATH)])
+        second = failure_artifacts.save(frame, 'second', [Pattern(other)])
+        failure_artifacts.flush()
+        assert_that(again, equal_to(first))  # the path of the screenshot already saved
+        assert_that(second == first, equal_to(False))
+        assert_that((os.path.exists(first), os.path.exists(second)), equal_to((True, True)))
+
+    def test_limits(self, display, tmpdir):
+        settings.find_failed_max_files = 2
+        region = Region(0, 0, 400, 300)
+        (saved, deleted) = (failure_artifacts.saved, failure_artifacts.deleted)
+        for seed in range(4):
+            display.show(background(seed))
+            fail(region)
+        assert_that((failure_artifacts.saved - saved, failure_artifacts.deleted - deleted), equal_to((4, 2)))
+        assert_that(tmpdir.listdir(), has_length(2))
+
+    def test_limits_other_files(self, display, tmpdir):
+        """ Only the screenshots named by failure_artifacts are counted and deleted """
+        settings.find_failed_max_files = 1
+        for name in ('kept.jpg', '2000-01-01_00-00-00.000_0000.jpg'):
+            cv2.imwrite(str(tmpdir.join(name)), background(9))
+        for seed in range(2):
+            failure_artifacts.save(background(seed), 'limited')
+        failure_artifacts.flush()
+        names = [p.basename for p in tmpdir.listdir()]
+        assert_that(names, has_length(3))  # the newest screenshot and both other files
+        assert_that(('kept.jpg' in names, '2000-01-01_00-00-00.000_0000.jpg' in names), equal_to((True, True)))
+
+    def test_unique_names(self, display):
+        paths = [failure_artifacts.save(background(seed), 'same_name') for seed in range(5)]
+        failure_artifacts.flush()
+        assert_that(len(set(paths)), equal_to(5))
+        assert_that(sorted(paths), equal_to(paths))  # in the order of failures
+
+    def test_close(self, display, tmpdir):
+        path = failure_artifacts.save(background(1), 'closed')
+        thread = failure_artifacts._thread
+        failure_artifacts.close(timeout=10)
+        assert_that(os.path.exists(path), equal_to(True))
+        assert_that(thread.is_alive(), equal_to(False))
+
+        path = failure_artifacts.save(background(2), 'reopened')  # a new writer thread
+        failure_artifacts.flush()
+        assert_that(os.path.exists(path), equal_to(True))
+
+    def test_score_map(self, display, tmpdir):
+        settings.find_failed_score_map = True
+        screen = background(0)
+        screen[10:10 + PH, 20:20 + PW] = PATTERN
+        screen[10:20, 20:30] ^= 255  # no match with the default similarity anymore
+        display.show(screen)
+        fail(Region(0, 0, 400, 300))
+        [scores] = [p for p in tmpdir.listdir() if p.basename.endswith('.scores.png')]
+        score_map = cv2.imread(str(scores), cv2.IMREAD_UNCHANGED)
+        assert_that(score_map.shape, equal_to((300 - PH + 1, 400 - PW + 1)))
+        assert_that(np.unravel_index(score_map.argmax(), score_map.shape), equal_to((10, 20)))
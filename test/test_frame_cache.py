@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import time
+import cv2
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to
+from matchers import ImageEqualTo
+from pikuli import Region, Location
+from pikuli.Settings import settings
+from pikuli.synthetic import SyntheticDisplay, StubMouse, StubKeyboard, install
+from pikuli.frame_cache import frame_cache, FrameCache
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW, BACKGROUND
+
+SCREEN = BACKGROUND.copy()
+SCREEN[100:100 + PH, 200:200 + PW] = PATTERN
+
+
+class RecordingDisplay(SyntheticDisplay):
+    """ Remembers areas of the screenshots taken """
+    def __init__(self, *args, **kwargs):
+        super(RecordingDisplay, self).__init__(*args, **kwargs)
+        self.areas = []
+
+    def take_screenshot(self, x, y, w, h, hwnd=None):
+        self.areas.append((x, y, w, h))
+        return super(RecordingDisplay, self).take_screenshot(x, y, w, h, hwnd)
+
+
+@pytest.fixture
+def display(display):
+    saved = settings.frame_cache_ttl
+    recording = RecordingDisplay(SCREEN)
+    install(recording, StubMouse(), StubKeyboard())
+    settings.frame_cache_ttl = 10
+    frame_cache.invalidate()
+    yield recording
+    frame_cache.invalidate()
+    settings.frame_cache_ttl = saved
+
+
+class TestFrameCache(object):
+    def test_shared_capture(self, display):
+        whole = frame_cache.take_screenshot(display, 1, 0, 0, 400, 300)
+        part = frame_cache.take_screenshot(display, 1, 50, 40, 100, 60)
+        assert_that(display.areas, equal_to([(0, 0, 400, 300)]))
+        assert_that(part, ImageEqualTo(SCREEN[40:100, 50:150]))
+        assert_that((whole.flags.writeable, part.flags.writeable), equal_to((False, False)))
+
+    def test_crop_scaled(self):
+        """ Retina: the capture has 2 pixels per point """
+        frame = cv2.resize(SCREEN, (800, 600), interpolation=cv2.INTER_NEAREST)
+        part = FrameCache._crop((10, 20, 400, 300, frame, 0), 60, 50, 100, 60)
+        assert_that(part.shape, equal_to((120, 200, 3)))
+        assert_that(part, ImageEqualTo(frame[60:180, 100:300]))
+
+    def test_ttl(self, display):
+        settings.frame_cache_ttl = 0.2
+        frame_cache.take_screenshot(display, 1, 0, 0, 400, 300)
+        frame_cache.take_screenshot(display, 1, 0, 0, 400, 300)
+        assert_that(len(display.areas), equal_to(1))
+        time.sleep(0.3)
+        frame_cache.take_screenshot(display, 1, 0, 0, 400, 300)
+        assert_that(len(display.areas), equal_to(2))
+
+    def test_union(self, display):
+        frame_cache.take_screenshot(display, 1, 0, 0, 100, 100)
+        part = frame_cache.take_screenshot(display, 1, 100, 20, 100, 100)  # next to the cached area
+        assert_that(display.areas[-1], equal_to((0, 0, 200, 120)))
+        assert_that(part, ImageEqualTo(SCREEN[20:120, 100:200]))
+
+        frame_cache.take_screenshot(display, 1, 350, 250, 50, 50)  # far from it: no union
+        assert_that(display.areas[-1], equal_to((350, 250, 50, 50)))
+        frame_cache.take_screenshot(display, 1, 360, 260, 20, 20)
+        assert_that(len(display.areas), equal_to(3))
+
+    def test_invalidated_by_input(self, display):
+        region = Region(0, 0, 400, 300)
+        region.find(PATTERN_IMAGE_PATH, timeout=0)
+        region.find(PATTERN_IMAGE_PATH, timeout=0)
+        assert_that(len(display.areas), equal_to(1))
+
+        Location(10, 10).click()
+        region.find(PATTERN_IMAGE_PATH, timeout=0)
+        assert_that(len(display.areas), equal_to(2))
+
+        Location(10, 10).type('text', click=False)
+        region.find(PATTERN_IMAGE_PATH, timeout=0)
+        assert_that(len(display.areas), equal_to(3))
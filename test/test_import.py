@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+from hamcrest import assert_that, equal_to
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imported on first real use only (see lazy_import.py, monitors.display_class())
+HEAVY_MODULES = ['cv2', 'numpy', 'PIL', 'win32api', 'win32gui', 'Quartz', 'AppKit', 'multiprocessing.pool']
+
+
+def run_python(code):
+    return subprocess.check_output([sys.executable, '-c', code], cwd=ROOT).decode().strip()
+
+
+class TestImport(object):
+    def test_heavy_modules_not_imported(self):
+        loaded = run_python('import sys, pikuli\n'
+                            'print(",".join(m for m in {} if m in sys.modules))'.format(HEAVY_MODULES))
+        assert_that(loaded, equal_to(''))
+
+    def test_settings_side_effects_deferred(self):
+        state = run_python('from pikuli.Settings import settings\n'
+                           'print("%s %s" % (settings._find_failed_dir_ready, settings._main_path_pending))')
+        assert_that(state, equal_to('False True'))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to
+from pikuli import Region, Pattern
+from pikuli.Settings import settings
+from pikuli.location_hints import location_hints
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW, BACKGROUND
+
+
+def screen_with_pattern(x, y, worse=False):
+    screen = BACKGROUND.copy()
+    screen[y:y + PH, x:x + PW] = PATTERN
+    if worse:
+        screen[y:y + 3, x:x + 3] ^= 255
+    return screen
+
+
+@pytest.fixture
+def display(display):
+    saved = settings.use_location_hints
+    settings.use_location_hints = True
+    location_hints.clear()
+    (location_hints.hits, location_hints.misses) = (0, 0)
+    yield display
+    location_hints.clear()
+    settings.use_location_hints = saved
+
+
+def found(match):
+    return (match.x, match.y)
+
+
+class TestLocationHints(object):
+    def test_hit_skips_full_search(self, display):
+        region = Region(10, 10, 380, 280)
+        display.show(screen_with_pattern(100, 60, worse=True))
+        assert_that(found(region.find(PATTERN_IMAGE_PATH, timeout=0)), equal_to((100, 60)))
+        assert_that(location_hints.stats(), equal_to({'hits': 0, 'misses': 0, 'entries': 1}))
+
+        # A better occurrence far from the hint is not looked at: the window around the hint is enough
+        frame = screen_with_pattern(100, 60, worse=True)
+        frame[200:200 + PH, 300:300 + PW] = PATTERN
+        display.show(frame)
+        assert_that(found(region.find(PATTERN_IMAGE_PATH, timeout=0)), equal_to((100, 60)))
+        assert_that(location_hints.hits, equal_to(1))
+
+    def test_miss_falls_back_and_moves_hint(self, display):
+        region = Region(10, 10, 380, 280)
+        display.show(screen_with_pattern(100, 60))
+        region.find(PATTERN_IMAGE_PATH, timeout=0)
+        display.show(screen_with_pattern(300, 200))
+        assert_that(found(region.find(PATTERN_IMAGE_PATH, timeout=0)), equal_to((300, 200)))
+        assert_that((location_hints.hits, location_hints.misses), equal_to((0, 1)))
+        assert_that(location_hints.get(Pattern(PATTERN_IMAGE_PATH), region), equal_to((290, 190)))
+
+        assert_that(found(region.find(PATTERN_IMAGE_PATH, timeout=0)), equal_to((300, 200)))
+        assert_that((location_hints.hits, location_hints.misses), equal_to((1, 1)))
+
+    def test_fractional_scaling_factor(self, display):
+        """ The hint is kept in pixels of the capture whatever the offset of the region in points is """
+        region = Region(3, 5, 390, 290)
+        region.scaling_factor = 1.5
+        display.show(screen_with_pattern(101, 71))
+        first = region.find(PATTERN_IMAGE_PATH, timeout=0)
+        assert_that(location_hints.get(Pattern(PATTERN_IMAGE_PATH), region), equal_to((98, 66)))
+        assert_that(found(region.find(PATTERN_IMAGE_PATH, timeout=0)), equal_to(found(first)))
+        assert_that(location_hints.hits, equal_to(1))
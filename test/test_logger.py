@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from hamcrest import assert_that, equal_to, has_length
+from pikuli.logger import PikuliLogger, DEFAULT_LEVEL
+
+
+class TestPikuliLogger(object):
+    def test_handler_added_once(self):
+        logger = PikuliLogger('pikuli.test_handler_added_once').logger
+        PikuliLogger('pikuli.test_handler_added_once')
+        assert_that(logger.handlers, has_length(1))
+        assert_that(logger.level, equal_to(DEFAULT_LEVEL))
+
+    def test_level(self):
+        logger = PikuliLogger('pikuli.test_level').logger
+        logger.setLevel(logging.WARNING)
+        PikuliLogger('pikuli.test_level')
+        assert_that(logger.level, equal_to(logging.WARNING))
+        PikuliLogger('pikuli.test_level', logging.DEBUG)
+        assert_that(logger.level, equal_to(logging.DEBUG))
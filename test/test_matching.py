@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+import time
+import cv2
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, less_than, greater_than, has_length, none, calling, raises
+from pikuli import Pattern, Region
+from pikuli.Settings import settings
+from pikuli.common_exceptions import FindFailed
+from pikuli.pattern_cache import pattern_cache
+from pikuli.matching import IncrementalMatcher, match_template, map_patterns, find_peaks
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW
+
+
+def screen(seed, w=320, h=240):
+    return np.random.RandomState(seed).randint(0, 256, (h, w, 3)).astype(np.uint8)
+
+
+def max_diff(a, b):
+    return float(np.abs(a - b).max())
+
+
+PALETTE = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+NEAR_THRESHOLD = (140, 300)  # the pattern with score just above the default similarity (0.99509)
+BELOW_THRESHOLD = (500, 60)  # the pattern with score just below it (0.99422)
+
+
+def ui_screen(seed=0, w=640, h=480):
+    """
+    Saturated rectangles on black with three copies of the pattern: exact, NEAR_THRESHOLD
+    and BELOW_THRESHOLD. Unlike noise, this picture leaves few candidates to the prefilters.
+    """
+    rnd = np.random.RandomState(seed)
+    image = np.zeros((h, w, 3), np.uint8)
+    for _ in range(60):
+        (x, y) = (rnd.randint(0, w - 20), rnd.randint(0, h - 10))
+        (rw, rh) = (rnd.randint(10, 160), rnd.randint(6, 60))
+        cv2.rectangle(image, (x, y), (x + rw, y + rh), PALETTE[rnd.randint(len(PALETTE))], -1)
+    image[50:50 + PH, 60:60 + PW] = PATTERN
+    for ((x, y), amplitude) in [(NEAR_THRESHOLD, 48), (BELOW_THRESHOLD, 52)]:
+        noise = np.random.RandomState(3).randint(-amplitude, amplitude + 1, PATTERN.shape)
+        image[y:y + PH, x:x + PW] = np.clip(PATTERN.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return image
+
+
+@pytest.fixture(params=['pyramid', 'gray', 'gray_reduced'])
+def engine(request):
+    """ 'gray_reduced' - 'gray' with the prefilter images reduced twice """
+    saved = (settings.match_method, settings.gray_scale)
+    if request.param == 'gray_reduced':
+        settings.gray_scale = 2
+    yield request.param.split('_')[0]
+    (settings.match_method, settings.gray_scale) = saved
+
+
+@pytest.fixture
+def other_path(tmpdir):
+    path = str(tmpdir.join('other.png'))
+    cv2.imwrite(path, screen(7, PW, PH))
+    return path
+
+
+class TestIncrementalMatcher(object):
+    def test_same_as_full_match(self):
+        ptn = Pattern(PATTERN_IMAGE_PATH)
+        matcher = IncrementalMatcher()
+        rnd = np.random.RandomState(1)
+        frame = screen(0)
+        frame[100:100 + PH, 150:150 + PW] = PATTERN
+        for _ in range(6):
+            (x, y) = (rnd.randint(0, 280), rnd.randint(0, 200))
+            frame = frame.copy()
+            frame[y:y + 40, x:x + 40] = rnd.randint(0, 256, (40, 40, 3))
+            assert_that(max_diff(matcher.match(frame, ptn), match_template(frame, ptn)), less_than(1e-6))
+        assert_that(matcher.partial_updates, equal_to(5))
+
+    def test_reused_buffer(self):
+        """ The frame buffer is overwritten in place by the next frame, as CaptureService ring slots are """
+        ptn = Pattern(PATTERN_IMAGE_PATH)
+        matcher = IncrementalMatcher()
+        buf = screen(0)
+        first = matcher.match(buf, ptn)
+        first_copy = first.copy()
+        buf[100:100 + PH, 150:150 + PW] = PATTERN
+        res = matcher.match(buf, ptn)
+        assert_that(max_diff(res, match_template(buf, ptn)), less_than(1e-6))
+        assert_that(float(res[100, 150]), equal_to(float(res.max())))
+        assert_that(max_diff(first, first_copy), equal_to(0))  # the earlier map is not patched afterwards
+
+    def test_similarity_in_key(self):
+        matcher = IncrementalMatcher()
+        frame = screen(0)
+        frame[100:100 + PH, 150:150 + PW] = PATTERN
+        frame[100:110, 150:160] ^= 255
+        strict = Pattern(PATTERN_IMAGE_PATH, 0.999, method='pyramid')
+        loose = Pattern(PATTERN_IMAGE_PATH, 0.8, method='pyramid')
+        matcher.match(frame, strict)
+        res = matcher.match(frame, loose)
+        assert_that(max_diff(res, match_template(frame, loose)), less_than(1e-6))
+        assert_that(matcher.full_updates, equal_to(2))
+
+    def test_separate_patterns(self, display):
+        """ Every find() builds its own Pattern; without the pattern cache they don't share the image either """
+        saved = (settings.incremental_matching, settings.pattern_cache_size)
+        (settings.incremental_matching, settings.pattern_cache_size) = (True, 0)
+        pattern_cache.clear()
+        try:
+            region = Region(0, 0, 400, 300)
+            frame = screen(0, 400, 300)
+            frame[100:100 + PH, 150:150 + PW] = PATTERN
+            display.show(frame)
+            region.find(PATTERN_IMAGE_PATH, timeout=0)
+            frame = frame.copy()
+            frame[10:20, 10:20] ^= 255
+            display.show(frame)
+            match = region.find(PATTERN_IMAGE_PATH, timeout=0)
+        finally:
+            (settings.incremental_matching, settings.pattern_cache_size) = saved
+        assert_that((match.x, match.y), equal_to((150, 100)))
+        matcher = region._incremental_matcher
+        assert_that((matcher.full_updates, matcher.partial_updates), equal_to((1, 1)))
+
+
+class TestMapPatterns(object):
+    def test_order(self, threads):
+        def slow_square(k):
+            time.sleep(0.01 * (5 - k))  # the first items finish last
+            return k * k
+        assert_that(map_patterns(slow_square, range(6)), equal_to([0, 1, 4, 9, 16, 25]))
+        assert_that(map_patterns(slow_square, []), equal_to([]))
+
+    def test_stop(self, threads):
+        started = []
+
+        def check(k):
+            started.append(k)
+            time.sleep(0.05)
+            return k == 2
+        assert_that(map_patterns(check, range(20), stop=bool), equal_to([False, False, True]))
+        assert_that(len(started), less_than(20))  # the rest are skipped
+
+    def test_nested(self, threads):
+        """ map_patterns called inside a task of the pool runs inline instead of waiting for the pool """
+        outer = map_patterns(lambda k: map_patterns(lambda j: k * 10 + j, range(3)), range(settings.matching_threads + 2))
+        assert_that(outer, equal_to([[k * 10 + j for j in range(3)] for k in range(settings.matching_threads + 2)]))
+
+
+class TestSeveralPatterns(object):
+    def test_find_any(self, display, other_path, threads):
+        frame = screen(0, 400, 300)
+        frame[200:200 + PH, 300:300 + PW] = cv2.imread(other_path)
+        frame[20:20 + PH, 30:30 + PW] = PATTERN
+        display.show(frame)
+        region = Region(0, 0, 400, 300)
+        # Both are on the screen: the first one in the list is returned whatever finishes first
+        match = region.find_any([other_path, PATTERN_IMAGE_PATH], timeout=0)
+        assert_that((match.x, match.y), equal_to((300, 200)))
+        match = region.find_any([PATTERN_IMAGE_PATH, other_path], timeout=0)
+        assert_that((match.x, match.y), equal_to((30, 20)))
+
+        display.show(screen(0, 400, 300))
+        assert_that(region.find_any([PATTERN_IMAGE_PATH, other_path], timeout=0, exception_on_find_fail=False),
+                    none())
+
+    def test_find_each(self, display, other_path, threads):
+        frame = screen(0, 400, 300)
+        frame[20:20 + PH, 30:30 + PW] = PATTERN
+        display.show(frame)
+        captures = display.captures
+        [other, match, again] = Region(0, 0, 400, 300).find_each([other_path, PATTERN_IMAGE_PATH, PATTERN_IMAGE_PATH])
+        assert_that(other, none())
+        assert_that([(match.x, match.y), (again.x, again.y)], equal_to([(30, 20), (30, 20)]))
+        assert_that(display.captures - captures, equal_to(1))
+
+    def test_empty_list(self, display):
+        region = Region(0, 0, 400, 300)
+        assert_that(calling(region.find_any).with_args([], timeout=0), raises(FindFailed))
+        assert_that(calling(region.wait).with_args([], timeout=0), raises(FindFailed))
+        assert_that(region.find_each([]), equal_to([]))
+
+
+def score_map(*peaks):
+    """ Correlation map 100 x 100 with the given (x, y, score) peaks on a low background """
+    res = np.full((100, 100), 0.5, np.float32)
+    for (x, y, score) in peaks:
+        res[y, x] = score
+    return res
+
+
+class TestFindPeaks(object):
+    def test_overlapping_collapse(self):
+        res = score_map((10, 10, 0.97), (12, 11, 0.99), (11, 13, 0.98))
+        assert_that(find_peaks(res, 0.9, 20, 20), equal_to([(12, 11, res[11, 12])]))
+
+    def test_adjacent_survive(self):
+        res = score_map((10, 10, 0.99), (30, 10, 0.98), (10, 30, 0.97))  # touching 20 x 20 boxes
+        assert_that([p[:2] for p in find_peaks(res, 0.9, 20, 20)], equal_to([(10, 10), (30, 10), (10, 30)]))
+
+    def test_max_results(self):
+        res = score_map((10, 10, 0.95), (40, 10, 0.99), (70, 10, 0.97), (10, 40, 0.96))
+        assert_that([p[:2] for p in find_peaks(res, 0.9, 20, 20, max_results=2)], equal_to([(40, 10), (70, 10)]))
+        assert_that([p[:2] for p in find_peaks(res, 0.9, 20, 20)],
+                    equal_to([(40, 10), (70, 10), (10, 40), (10, 10)]))
+
+    def test_max_overlap(self):
+        res = score_map((10, 10, 0.99), (20, 10, 0.98))  # IoU of the boxes = 200 / 600
+        assert_that(find_peaks(res, 0.9, 20, 20), has_length(1))
+        assert_that(find_peaks(res, 0.9, 20, 20, max_overlap=0.34), has_length(2))
+
+    def test_threshold(self):
+        res = score_map((10, 10, 0.99), (50, 50, 0.85))
+        assert_that([p[:2] for p in find_peaks(res, 0.9, 20, 20)], equal_to([(10, 10)]))
+        assert_that(find_peaks(score_map(), 0.9, 20, 20), equal_to([]))
+
+    def test_find_all(self, display):
+        frame = screen(0, 400, 300)
+        for (x, y) in [(30, 20), (30 + PW, 20), (200, 150)]:  # the first two touch each other
+            frame[y:y + PH, x:x + PW] = PATTERN
+        frame[150:153, 200:203] ^= 255  # a worse score than the others
+        display.show(frame)
+        region = Region(0, 0, 400, 300)
+        matches = region.find_all(PATTERN_IMAGE_PATH)
+        assert_that(sorted((m.x, m.y) for m in matches), equal_to([(30, 20), (30 + PW, 20), (200, 150)]))
+        assert_that((matches[-1].x, matches[-1].y), equal_to((200, 150)))
+        assert_that(sorted((m.x, m.y) for m in region.find_all(PATTERN_IMAGE_PATH, max_results=2)),
+                    equal_to([(30, 20), (30 + PW, 20)]))
+
+
+class TestEngines(object):
+    """ Results of the engines are the same as of the exhaustive search """
+    def test_map(self, engine):
+        frame = ui_screen()
+        exhaustive = match_template(frame, Pattern(PATTERN_IMAGE_PATH, method='exhaustive'))
+        res = match_template(frame, Pattern(PATTERN_IMAGE_PATH, method=engine))
+        assert_that(float((res == 0).mean()), greater_than(0.9))  # refined, not the exhaustive fallback
+        refined = res != 0
+        assert_that(max_diff(res[refined], exhaustive[refined]), less_than(1e-4))
+        assert_that(find_peaks(res, 0.9, PW, PH), has_length(3))
+
+    def test_find_all(self, display, engine):
+        display.show(ui_screen())
+        region = Region(0, 0, 640, 480)
+        expected = region.find_all(Pattern(PATTERN_IMAGE_PATH, method='exhaustive'))
+        matches = region.find_all(Pattern(PATTERN_IMAGE_PATH, method=engine))
+        assert_that([(m.x, m.y) for m in matches], equal_to([(60, 50), NEAR_THRESHOLD]))
+        assert_that([(m.x, m.y) for m in matches], equal_to([(m.x, m.y) for m in expected]))
+        for (m, e) in zip(matches, expected):
+            assert_that(abs(m.score - e.score), less_than(1e-4))
+
+    def test_find_near_threshold(self, display, engine):
+        frame = ui_screen()
+        frame[50:50 + PH, 60:60 + PW] = 0
+        display.show(frame)
+        region = Region(0, 0, 640, 480)
+        expected = region.find(PATTERN_IMAGE_PATH, timeout=0)
+        settings.match_method = engine
+        match = region.find(PATTERN_IMAGE_PATH, timeout=0)
+        assert_that((match.x, match.y), equal_to(NEAR_THRESHOLD))
+        assert_that((match.x, match.y), equal_to((expected.x, expected.y)))
+        assert_that(abs(match.score - expected.score), less_than(1e-4))
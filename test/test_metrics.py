@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import json
+import subprocess
+import sys
+import cv2
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, has_item, has_entries, has_length, has_key, close_to, contains_string, calling, raises
+from pikuli import Region
+from pikuli.metrics import metrics, Histogram
+from pikuli.common_exceptions import FindFailed
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW, BACKGROUND
+
+
+@pytest.fixture
+def display(display):
+    screen = BACKGROUND.copy()
+    screen[60:60 + PH, 50:50 + PW] = PATTERN
+    display.show(screen)
+    metrics.reset()
+    yield display
+    metrics.reset()
+
+
+def series(snapshot, name, **labels):
+    return [s for s in snapshot['series'] if s['name'] == name and s['labels'] == labels]
+
+
+class TestMetrics(object):
+    def test_histogram(self):
+        hist = Histogram((1, 2, 5, 10))
+        for value in range(1, 101):
+            hist.observe(value / 10.0)
+        assert_that(hist.counts, equal_to([10, 10, 30, 50, 0]))
+        assert_that(hist.quantile(0.5), close_to(5.0, 1e-9))
+        assert_that(hist.quantile(0.95), close_to(9.5, 1e-9))
+        assert_that(hist.quantile(1.0), close_to(10.0, 1e-9))
+        assert_that(Histogram((1,)).quantile(0.5), equal_to(None))
+
+    def test_waits(self, display):
+        region = Region(0, 0, 400, 300)
+        region.find(PATTERN_IMAGE_PATH, timeout=0)
+        region.find_all(PATTERN_IMAGE_PATH)
+        display.show(BACKGROUND)
+        assert_that(calling(region.wait).with_args(PATTERN_IMAGE_PATH, timeout=0), raises(FindFailed))
+
+        snapshot = metrics.snapshot()
+        [hit] = series(snapshot, 'pikuli_wait_seconds', pattern='test_pattern.png', condition='appear', outcome='hit')
+        assert_that(hit, has_entries(count=1))
+        [polls] = series(snapshot, 'pikuli_wait_polls', condition='appear')
+        assert_that(polls, has_entries(count=1, sum=1))
+        [failed] = series(snapshot, 'pikuli_find_failed_total', pattern='test_pattern.png')
+        assert_that(failed['value'], equal_to(1))
+        assert_that(series(snapshot, 'pikuli_find_all_seconds', pattern='test_pattern.png'), has_item(
+            has_entries(count=1)))
+        assert_that(series(snapshot, 'pikuli_capture_seconds')[0]['count'], equal_to(3))
+        assert_that(snapshot['gauges'], has_key('pikuli_pattern_cache_hits'))
+
+    def test_failed_per_pattern(self, display, tmpdir):
+        other = str(tmpdir.join('other.png'))
+        cv2.imwrite(other, np.random.RandomState(7).randint(0, 256, (PH, PW, 3)).astype(np.uint8))
+        display.show(BACKGROUND)
+        assert_that(calling(Region(0, 0, 400, 300).find_any).with_args([PATTERN_IMAGE_PATH, other], timeout=0),
+                    raises(FindFailed))
+        snapshot = metrics.snapshot()
+        for name in ('test_pattern.png', 'other.png'):  # the labels of hits
+            [failed] = series(snapshot, 'pikuli_find_failed_total', pattern=name)
+            assert_that(failed['value'], equal_to(1))
+        assert_that(series(snapshot, 'pikuli_find_failed_total', pattern='test_pattern.png, other.png'), has_length(0))
+
+    def test_export(self, display, tmpdir):
+        Region(0, 0, 400, 300).find(PATTERN_IMAGE_PATH, timeout=0)
+        metrics.export(str(tmpdir.join('metrics.json')))
+        with open(str(tmpdir.join('metrics.json'))) as f:
+            assert_that(series(json.load(f), 'pikuli_wait_polls', condition='appear')[0]['count'], equal_to(1))
+
+        metrics.export(str(tmpdir.join('metrics.txt')))
+        text = tmpdir.join('metrics.txt').read()
+        assert_that(text, contains_string('# TYPE pikuli_wait_seconds histogram'))
+        assert_that(text, contains_string('pikuli_wait_polls_bucket{condition="appear",le="1.0"} 1'))
+        assert_that(text, contains_string('pikuli_wait_polls_bucket{condition="appear",le="+Inf"} 1'))
+        assert_that(text.endswith('# EOF\n'), equal_to(True))
+
+    def test_export_at_exit(self, tmpdir):
+        path = str(tmpdir.join('exit.json'))
+        code = 'from pikuli.Settings import settings; from pikuli.metrics import metrics; ' \
+               'settings.metrics_file = {!r}; metrics.observe("pikuli_capture_seconds", 0.01)'.format(path)
+        subprocess.check_call([sys.executable, '-c', code])
+        with open(path) as f:
+            assert_that(series(json.load(f), 'pikuli_capture_seconds')[0]['count'], equal_to(1))
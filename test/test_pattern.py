@@ -4,8 +4,12 @@ import pytest
 import os
 import cv2
 from matchers import ImageEqualTo
-from hamcrest import assert_that, equal_to, all_of, has_property
+from hamcrest import assert_that, equal_to, all_of, has_property, has_entry, calling, raises
 from pikuli import Pattern
+from pikuli.common_exceptions import FailExit
+from pikuli.pattern_cache import pattern_cache
+from pikuli.pattern_bundle import compile_bundle
+from pikuli.Settings import settings
 
 DEFAULT_SIMILARITY = 0.995000
 CUSTOM_SIMILARITY = 0.812500
@@ -57,3 +61,53 @@ class TestPattern(object):
     def test_get_filename(self, full_path, expected_data):
         assert_that(self.default_test_pattern.get_filename(full_path=full_path),
                     equal_to(expected_data))
+
+    @pytest.mark.parametrize("pattern, expected_data", [
+        (default_test_pattern, None),
+        (Pattern(PATTERN_IMAGE_PATH, method='pyramid'), 'pyramid'),
+        (Pattern(PATTERN_IMAGE_PATH, method='pyramid').similar(CUSTOM_SIMILARITY), 'pyramid')
+    ])
+    def test_method(self, pattern, expected_data):
+        assert_that(pattern.method, equal_to(expected_data))
+
+    def test_fail_method(self):
+        assert_that(calling(Pattern).with_args(PATTERN_IMAGE_PATH, method='unknown'),
+                    raises(FailExit))
+
+    def test_cache_shares_decoded_image(self):
+        hits = pattern_cache.stats()['hits']
+        pattern = Pattern(PATTERN_IMAGE_PATH)
+        similar = pattern.similar(CUSTOM_SIMILARITY)
+        assert_that(similar.cv2_pattern is pattern.cv2_pattern, equal_to(True))
+        assert_that(pattern_cache.stats()['hits'], equal_to(hits + 2))
+
+    def test_cache_budget(self):
+        budget = settings.pattern_cache_size
+        try:
+            settings.pattern_cache_size = 0
+            pattern_cache.clear()
+            Pattern(PATTERN_IMAGE_PATH)
+            assert_that(pattern_cache.stats(), all_of(
+                has_entry('entries', 0),
+                has_entry('bytes', 0))
+            )
+        finally:
+            settings.pattern_cache_size = budget
+
+    def test_bundle(self, tmpdir):
+        bundle_path = str(tmpdir.join('patterns.pikb'))
+        assert_that(compile_bundle(os.path.dirname(PATTERN_IMAGE_PATH), bundle_path), equal_to(1))
+        settings.add_pattern_bundle(bundle_path)
+        try:
+            pattern = Pattern(os.path.basename(PATTERN_IMAGE_PATH))
+            assert_that(pattern.cv2_pattern, ImageEqualTo(cv2.imread(PATTERN_IMAGE_PATH)))
+            assert_that(pattern.get_filename(), equal_to(os.path.abspath(PATTERN_IMAGE_PATH)))
+        finally:
+            settings.PATTERN_BUNDLES.remove(os.path.abspath(bundle_path))
+
+    @pytest.mark.parametrize("scale, expected_shape", [
+        (1, (48, 44)),
+        (2, (24, 22))
+    ])
+    def test_get_gray(self, scale, expected_shape):
+        assert_that(self.default_test_pattern.get_gray(scale).shape, equal_to(expected_shape))
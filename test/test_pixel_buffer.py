@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+from matchers import ImageEqualTo
+from hamcrest import assert_that, equal_to, calling, raises
+from pikuli.pixel_buffer import buffer_to_bgr
+from pikuli.common_exceptions import FailExit
+
+WIDTH = 37
+HEIGHT = 11
+BGR = np.random.RandomState(0).randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8)
+
+
+def make_buffer(channel_order, padding=0):
+    """ Raw buffer built pixel by pixel, rows are followed by 'padding' bytes """
+    planes = {'B': BGR[:, :, 0], 'G': BGR[:, :, 1], 'R': BGR[:, :, 2],
+              'A': np.full((HEIGHT, WIDTH), 255, np.uint8), 'X': np.zeros((HEIGHT, WIDTH), np.uint8)}
+    pixels = np.dstack([planes[c] for c in channel_order]).reshape(HEIGHT, -1)
+    rows = np.hstack([pixels, np.full((HEIGHT, padding), 7, np.uint8)])
+    return rows.tobytes(), WIDTH * len(channel_order) + padding
+
+
+class TestPixelBuffer(object):
+    @pytest.mark.parametrize("channel_order", ['BGRA', 'BGRX', 'RGBA', 'ARGB', 'BGR', 'RGB', 'GRBA'])
+    @pytest.mark.parametrize("padding", [0, 12])
+    def test_buffer_to_bgr(self, channel_order, padding):
+        (buf, stride) = make_buffer(channel_order, padding)
+        image = buffer_to_bgr(buf, WIDTH, HEIGHT, stride=stride, channel_order=channel_order)
+        assert_that(image, ImageEqualTo(BGR))
+        assert_that(image.flags.c_contiguous, equal_to(True))
+
+    @pytest.mark.parametrize("channel_order", ['BGRA', 'BGRX', 'RGBA', 'ARGB', 'BGR', 'RGB', 'GRBA'])
+    def test_out(self, channel_order):
+        (buf, stride) = make_buffer(channel_order, padding=12)
+        out = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+        image = buffer_to_bgr(buf, WIDTH, HEIGHT, stride=stride, channel_order=channel_order, out=out)
+        assert_that(image.ctypes.data, equal_to(out.ctypes.data))
+        assert_that(out, ImageEqualTo(BGR))
+
+    def test_bad_out(self):
+        (buf, stride) = make_buffer('BGRA')
+        for out in [np.zeros((HEIGHT, WIDTH + 1, 3), np.uint8), np.zeros((HEIGHT, WIDTH, 3), np.float32),
+                    np.zeros((HEIGHT, WIDTH * 2, 3), np.uint8)[:, ::2]]:
+            assert_that(calling(buffer_to_bgr).with_args(buf, WIDTH, HEIGHT, stride=stride, out=out),
+                        raises(FailExit))
+
+    def test_short_buffer(self):
+        (buf, stride) = make_buffer('BGRA')
+        assert_that(calling(buffer_to_bgr).with_args(buf[:-1], WIDTH, HEIGHT, stride=stride),
+                    raises(FailExit))
+
+    def test_small_stride(self):
+        (buf, stride) = make_buffer('BGRA')
+        assert_that(calling(buffer_to_bgr).with_args(buf, WIDTH, HEIGHT, stride=stride - 1),
+                    raises(FailExit))
@@ -5,6 +5,8 @@ from hamcrest import assert_that, equal_to, all_of, \
     instance_of, has_property, calling, raises
 from pikuli import Region, Location
 from pikuli.common_exceptions import FailExit
+from pikuli.monitors import monitors
+from pikuli.synthetic import StubMouse, StubKeyboard
 
 
 X = 311
@@ -107,6 +109,26 @@ class TestRegion(object):
                 has_property('title', 'Center of {}'.format(TITLE)))
         )
 
+    def test_location_value(self):
+        center = self.test_region.get_center()
+        assert_that(center, equal_to(Location(X + int(WIDTH / 2), Y + int(HEIGHT / 2))))
+        assert_that(hasattr(center, '__dict__'), equal_to(False))
+
+        saved = (Location._mouse, Location._keyboard)
+        mouse = StubMouse()
+        Location.use_devices(mouse, StubKeyboard())
+        try:
+            assert_that((center.mouse is mouse, Location(0, 0).mouse is mouse), equal_to((True, True)))
+        finally:
+            (Location._mouse, Location._keyboard) = saved
+
+    def test_monitor_info_cached(self):
+        Region(X, Y, WIDTH, HEIGHT)  # other tests may have refreshed the cache
+        queries = monitors.stats()['queries']
+        Region(X, Y, WIDTH, HEIGHT).offset(10, 10).right(5)
+        assert_that(monitors.stats()['queries'], equal_to(queries))
+        assert_that(Region(X, Y, WIDTH, HEIGHT).display, equal_to(self.test_region.display))
+
     def test_get_find_timeout(self):
         assert_that(
             self.test_region.get_find_timeout(), equal_to(FIND_TIMEOUT)
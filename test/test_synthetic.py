@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import os
+import cv2
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, has_item, has_length, is_in, calling, raises
+from pikuli import Region, Location, Screen
+from pikuli.monitors import monitors
+from pikuli.synthetic import Scene, SyntheticDisplay, StubMouse, StubKeyboard, install
+from pikuli.common_exceptions import FailExit
+
+PATTERN_IMAGE_PATH = os.path.join('test', 'Data', 'test_pattern.png')
+PATTERN = cv2.imread(PATTERN_IMAGE_PATH)
+(PH, PW) = PATTERN.shape[:2]
+BACKGROUND = np.random.RandomState(0).randint(0, 256, (300, 400, 3)).astype(np.uint8)
+
+
+def screen_with_pattern(*points):
+    screen = BACKGROUND.copy()
+    for (x, y) in points:
+        screen[y:y + PH, x:x + PW] = PATTERN
+    return screen
+
+
+@pytest.fixture
+def scene():
+    scene = Scene({'login': screen_with_pattern((50, 60)),
+                   'busy': BACKGROUND,
+                   'done': screen_with_pattern((200, 150), (300, 20))}, 'login')
+    scene.on_click('login', (50, 60, PW, PH), 'busy')
+    scene.after('busy', 0.3, 'done')
+    scene.on_type('done', 'quit', 'login')
+
+    saved = (monitors._display, Location._mouse, Location._keyboard)
+    install(SyntheticDisplay(scene), StubMouse(scene), StubKeyboard(scene))
+    yield scene
+    monitors.use_display(saved[0])
+    (Location._mouse, Location._keyboard) = saved[1:]
+
+
+class TestSynthetic(object):
+    def test_find_click_wait(self, scene):
+        region = Region(0, 0, 400, 300)
+        match = region.find(PATTERN_IMAGE_PATH, timeout=0)
+        assert_that((match.x, match.y), equal_to((50, 60)))
+
+        match.click()
+        assert_that(scene.events, has_item(('click', 50 + int(PW / 2), 60 + int(PH / 2), 'left')))
+        assert_that(scene.state, equal_to('busy'))
+
+        match = region.wait(PATTERN_IMAGE_PATH, timeout=3)
+        assert_that((match.x, match.y), is_in([(200, 150), (300, 20)]))
+        assert_that(region.find_all(PATTERN_IMAGE_PATH), has_length(2))
+
+        Location(10, 10).type('quit', click=False)
+        assert_that(scene.state, equal_to('login'))
+
+    def test_sequence(self):
+        display = SyntheticDisplay([(0, BACKGROUND), (1000, screen_with_pattern((0, 0)))])
+        assert_that(display.take_screenshot(0, 0, PW, PH).tolist(), equal_to(BACKGROUND[:PH, :PW].tolist()))
+        display.show(PATTERN)
+        assert_that(display.take_screenshot(0, 0, PW, PH).tolist(), equal_to(PATTERN.tolist()))
+        assert_that(calling(display.take_screenshot).with_args(0, 0, PW + 1, PH), raises(FailExit))
+
+    def test_monitors(self):
+        desktop = np.hstack([BACKGROUND, screen_with_pattern((20, 30))])
+        display = SyntheticDisplay(desktop, monitors=[(0, 0, 400, 300), (400, 0, 400, 300)])
+        saved = monitors._display
+        install(display)
+        try:
+            assert_that([Screen(n).area for n in (0, 1, 2)],
+                        equal_to([(0, 0, 800, 300), (0, 0, 400, 300), (400, 0, 400, 300)]))
+            assert_that(calling(Screen).with_args(3), raises(FailExit))
+            match = Region(*Screen(2).area).find(PATTERN_IMAGE_PATH, timeout=0)
+            assert_that((match.x, match.y), equal_to((420, 30)))
+        finally:
+            monitors.use_display(saved)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, has_length, has_key, greater_than, greater_than_or_equal_to, \
+    close_to, calling, raises
+from pikuli import Region
+from pikuli import tracing
+from pikuli.synthetic import SyntheticDisplay, install
+from pikuli.common_exceptions import FindFailed
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW, BACKGROUND
+
+
+@pytest.fixture
+def display(display):
+    """ The pattern appears at (50, 60) in 0.3 s """
+    screen = BACKGROUND.copy()
+    screen[60:60 + PH, 50:50 + PW] = PATTERN
+    timeline = SyntheticDisplay([(0, BACKGROUND), (0.3, screen)])
+    install(timeline)
+    return timeline
+
+
+class TestTracing(object):
+    def test_find_span(self, display):
+        region = Region(0, 0, 400, 300)
+        with tracing.trace() as spans:
+            region.find(PATTERN_IMAGE_PATH, timeout=3)
+        assert_that(spans, has_length(1))
+        span = spans[0]
+        assert_that(span.operation, equal_to('find'))
+        assert_that(span.outcome, equal_to('hit'))
+        assert_that(span.patterns, equal_to(['test_pattern.png']))
+        assert_that(span.frame, equal_to((400, 300)))
+        assert_that(span.polls, greater_than(1))
+        assert_that(span.match_time, has_key('test_pattern.png'))
+        assert_that(span.best_score, greater_than(0.99))
+        assert_that(span.sleep_time, greater_than(0))
+        assert_that(span.other_time, greater_than_or_equal_to(0))
+        assert_that(span.capture_time + span.sleep_time + span.match_time['test_pattern.png'] + span.other_time,
+                    close_to(span.duration, 1e-6))
+
+    def test_timeout_and_vanish(self, display):
+        display.show(BACKGROUND)
+        region = Region(0, 0, 400, 300)
+        with tracing.trace() as spans:
+            assert_that(region.wait_vanish(PATTERN_IMAGE_PATH, timeout=0), equal_to(True))
+            assert_that(region.find(PATTERN_IMAGE_PATH, timeout=0, exception_on_find_fail=False), equal_to(None))
+            assert_that(region.find_all(PATTERN_IMAGE_PATH), has_length(0))
+        assert_that([(s.operation, s.outcome) for s in spans],
+                    equal_to([('wait_vanish', 'vanish'), ('find', 'timeout'), ('find_all', 'miss')]))
+
+    def test_hooks(self, display):
+        display.show(BACKGROUND)
+        region = Region(0, 0, 400, 300)
+        spans = []
+        tracing.add_hook(spans.append)
+        tracing.add_hook(lambda span: 1 / 0)  # broken hook doesn't break the call
+        try:
+            assert_that(calling(region.wait).with_args(PATTERN_IMAGE_PATH, timeout=0), raises(FindFailed))
+        finally:
+            del tracing._hooks[:]
+        assert_that([(s.operation, s.outcome) for s in spans], equal_to([('wait', 'timeout')]))
+        assert_that(tracing.current(), equal_to(None))
+
+        region.exists(PATTERN_IMAGE_PATH)  # no hooks - no spans
+        assert_that(spans, has_length(1))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, none, calling, raises
+from pikuli import Region
+from pikuli.synthetic import SyntheticDisplay, install
+from pikuli.common_exceptions import FindFailed
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW, BACKGROUND
+
+
+def screen_with_pattern(x, y):
+    screen = BACKGROUND.copy()
+    screen[y:y + PH, x:x + PW] = PATTERN
+    return screen
+
+
+@pytest.fixture
+def matched(monkeypatch):
+    """ Number of _match_patterns() calls, i.e. polls which ran template matching """
+    calls = []
+    match_patterns = Region._match_patterns
+
+    def counting(self, patterns, field, condition):
+        calls.append(len(patterns))
+        return match_patterns(self, patterns, field, condition)
+    monkeypatch.setattr(Region, '_match_patterns', counting)
+    return calls
+
+
+class TestChangeGating(object):
+    def test_static_screen_matched_once(self, display, matched):
+        region = Region(0, 0, 400, 300)
+        assert_that(calling(region.find).with_args(PATTERN_IMAGE_PATH, timeout=2), raises(FindFailed))
+        assert_that(display.captures, equal_to(2))  # one capture per poll
+        assert_that(len(matched), equal_to(1))
+
+    def test_changed_screen_matched_again(self, display, matched):
+        install(SyntheticDisplay([(0, BACKGROUND), (0.5, screen_with_pattern(120, 80))]))
+        match = Region(0, 0, 400, 300).find(PATTERN_IMAGE_PATH, timeout=3)
+        assert_that((match.x, match.y), equal_to((120, 80)))
+        assert_that(len(matched), equal_to(2))
+
+    def test_wait_vanish(self, display, matched):
+        display.show(screen_with_pattern(120, 80))
+        assert_that(Region(0, 0, 400, 300).wait_vanish(PATTERN_IMAGE_PATH, timeout=2), equal_to(False))
+        assert_that(display.captures, equal_to(2))
+        assert_that(len(matched), equal_to(1))
+
+
+@pytest.fixture
+def other_paths(tmpdir):
+    paths = []
+    for seed in range(4):
+        paths.append(str(tmpdir.join('other_{}.png'.format(seed))))
+        cv2.imwrite(paths[-1], np.random.RandomState(10 + seed).randint(0, 256, (PH, PW, 3)).astype(np.uint8))
+    return paths
+
+
+class TestOneCapturePerPoll(object):
+    def test_patterns_share_capture(self, display, matched, other_paths):
+        region = Region(0, 0, 400, 300)
+        assert_that(region.find_any(other_paths + [PATTERN_IMAGE_PATH], timeout=2, exception_on_find_fail=False),
+                    none())
+        assert_that(display.captures, equal_to(2))  # not one per pattern
+        assert_that(matched, equal_to([5]))  # all patterns against the first capture, the second one is the same
+
+    def test_found_in_first_capture(self, display, matched, other_paths):
+        display.show(screen_with_pattern(120, 80))
+        match = Region(0, 0, 400, 300).find_any(other_paths + [PATTERN_IMAGE_PATH], timeout=2)
+        assert_that((match.x, match.y), equal_to((120, 80)))
+        assert_that(display.captures, equal_to(1))
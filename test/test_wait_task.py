@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, less_than, calling, raises
+from pikuli import Region
+from pikuli import tracing
+from pikuli.synthetic import SyntheticDisplay, install
+from pikuli.wait_task import WaitTask, Return, run
+from pikuli.common_exceptions import WaitCancelled, FindFailed
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW, BACKGROUND
+
+
+def add(a, b=0):
+    yield 0.1
+    raise Return(a + b)
+
+
+def fail():
+    yield 0
+    raise FindFailed('not found')
+
+
+def sleep(seconds, threads=None):
+    """ Wait generator which sleeps 'seconds' in steps of 0.1 s, adding the thread it runs in to 'threads' """
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if threads is not None:
+            threads.add(threading.current_thread())
+        yield min(0.1, deadline - time.time())
+
+
+@pytest.fixture
+def display(display):
+    """ The pattern appears at (200, 100) in 0.3 s """
+    with_pattern = BACKGROUND.copy()
+    with_pattern[100:100 + PH, 200:200 + PW] = PATTERN
+    timeline = SyntheticDisplay([(0, BACKGROUND), (0.3, with_pattern)])
+    install(timeline)
+    return timeline
+
+
+class TestWaitTask(object):
+    def test_result(self):
+        task = WaitTask(add(1, b=2))
+        assert_that(task.result(), equal_to(3))
+        assert_that(task.done(), equal_to(True))
+        assert_that(run(add(1, b=2)), equal_to(3))
+
+    def test_exception(self):
+        assert_that(calling(WaitTask(fail()).result), raises(FindFailed))
+
+    def test_cancel(self):
+        task = WaitTask(sleep(10))
+        started = time.time()
+        task.cancel()
+        assert_that(calling(task.result), raises(WaitCancelled))
+        assert_that(time.time() - started, less_than(1))
+
+    def test_deadline(self):
+        task = WaitTask(sleep(10))
+        assert_that(calling(task.result).with_args(timeout=0.1), raises(WaitCancelled))
+        assert_that(task.cancelled(), equal_to(True))
+
+    def test_many_waits(self):
+        """ Waits don't queue behind each other: one thread takes turns at them """
+        threads = set()
+        started = time.time()
+        tasks = [WaitTask(sleep(0.5, threads)) for _ in range(20)]
+        for task in tasks:
+            task.result()
+        assert_that(time.time() - started, less_than(1.5))
+        assert_that(len(threads), equal_to(1))
+        assert_that(threading.current_thread() in threads, equal_to(False))
+
+
+class TestRegionAsync(object):
+    def test_find_async(self, display):
+        task = Region(0, 0, 400, 300).find_async(PATTERN_IMAGE_PATH, timeout=5)
+        match = task.result()
+        assert_that((match.x, match.y), equal_to((200, 100)))
+
+    def test_wait_async(self, display):
+        (found, gone) = (Region(0, 0, 400, 300).wait_async(PATTERN_IMAGE_PATH, timeout=5),
+                         Region(0, 0, 100, 100).wait_vanish_async(PATTERN_IMAGE_PATH, timeout=0))
+        assert_that((found.result().x, found.result().y), equal_to((200, 100)))
+        assert_that(gone.result(), equal_to(True))
+
+    def test_timeouts_run_concurrently(self, display):
+        started = time.time()
+        tasks = [Region(0, 0, 100, 100).find_async(PATTERN_IMAGE_PATH, timeout=1) for _ in range(12)]
+        for task in tasks:
+            assert_that(calling(task.result), raises(FindFailed))
+        assert_that(time.time() - started, less_than(4))
+
+    def test_cancel(self, display):
+        task = Region(0, 0, 100, 100).find_async(PATTERN_IMAGE_PATH, timeout=60)
+        time.sleep(0.1)
+        started = time.time()
+        task.cancel()
+        assert_that(calling(task.result), raises(WaitCancelled))
+        assert_that(time.time() - started, less_than(1))
+        assert_that(task.cancelled(), equal_to(True))
+
+    def test_traced(self, display):
+        with tracing.trace() as spans:
+            found = Region(0, 0, 400, 300).find_async(PATTERN_IMAGE_PATH, timeout=5)
+            cancelled = Region(0, 0, 100, 100).wait_async(PATTERN_IMAGE_PATH, timeout=60)
+            found.result()
+            cancelled.cancel()
+            assert_that(calling(cancelled.result), raises(WaitCancelled))
+        assert_that(sorted((s.operation, s.outcome) for s in spans), equal_to([('find', 'hit'), ('wait', 'cancelled')]))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import time
+import cv2
+import numpy as np
+import pytest
+from hamcrest import assert_that, equal_to, less_than, greater_than_or_equal_to, none, calling, raises
+from pikuli import Region
+from pikuli.Watcher import Watcher
+from pikuli.synthetic import SyntheticDisplay, install
+from pikuli.capture_service import CaptureService
+from pikuli.common_exceptions import FailExit, FindFailed
+from conftest import PATTERN_IMAGE_PATH, PATTERN, PH, PW, BACKGROUND
+
+OTHER = np.random.RandomState(7).randint(0, 256, (PH, PW, 3)).astype(np.uint8)
+
+
+def screen(**places):
+    """ screen(pattern=(x, y), other=(x, y)) """
+    image = BACKGROUND.copy()
+    for (name, (x, y)) in places.items():
+        image[y:y + PH, x:x + PW] = PATTERN if name == 'pattern' else OTHER
+    return image
+
+
+@pytest.fixture
+def other_path(tmpdir):
+    path = str(tmpdir.join('other.png'))
+    cv2.imwrite(path, OTHER)
+    return path
+
+
+def on_screen_2(region, display):
+    """ Region of the second screen served by 'display' """
+    (region.screen_number, region.display) = (2, display)
+    return region
+
+
+class TestWatcher(object):
+    def test_any(self, display, other_path, threads):
+        display.show(screen(other=(200, 150)))
+        watcher = Watcher('any')
+        watcher.appear(Region(0, 0, 200, 300), PATTERN_IMAGE_PATH)
+        watcher.appear(Region(200, 0, 200, 300), other_path)
+        [(i, match)] = watcher.wait(timeout=0)
+        assert_that(i, equal_to(1))
+        assert_that((match.x, match.y), equal_to((200, 150)))
+
+    def test_all(self, display, other_path, threads):
+        display.show(screen(pattern=(20, 30)))
+        watcher = Watcher('all')
+        watcher.appear(Region(0, 0, 200, 300), PATTERN_IMAGE_PATH)
+        watcher.vanish(Region(0, 0, 200, 300), other_path)
+        watcher.appear(Region(200, 0, 200, 300), other_path)
+        display.show(screen(pattern=(20, 30), other=(250, 100)))
+        fired = dict(watcher.wait(timeout=0))
+        assert_that(sorted(fired), equal_to([0, 1, 2]))
+        assert_that(fired[1], none())
+        assert_that((fired[2].x, fired[2].y), equal_to((250, 100)))
+
+    def test_all_met_at_different_polls(self, display, other_path):
+        install(SyntheticDisplay([(0, screen(pattern=(20, 30))), (1.5, screen(other=(250, 100)))]))
+        watcher = Watcher('all')
+        watcher.appear(Region(0, 0, 200, 300), PATTERN_IMAGE_PATH)
+        watcher.appear(Region(200, 0, 200, 300), other_path)
+        assert_that([i for (i, _) in watcher.wait(timeout=5)], equal_to([0, 1]))
+
+    def test_timeout(self, display, other_path):
+        display.show(screen(pattern=(20, 30)))
+        watcher = Watcher('all')
+        watcher.appear(Region(0, 0, 200, 300), PATTERN_IMAGE_PATH)
+        watcher.appear(Region(200, 0, 200, 300), other_path)
+        started = time.time()
+        assert_that(calling(watcher.wait).with_args(timeout=1), raises(FindFailed, 'other.png'))
+        assert_that(time.time() - started, greater_than_or_equal_to(1))
+        assert_that(time.time() - started, less_than(3))
+
+    def test_sequence_order(self, display, other_path):
+        display.show(screen(other=(250, 100)))
+        watcher = Watcher('sequence')
+        watcher.appear(Region(0, 0, 200, 300), PATTERN_IMAGE_PATH)
+        watcher.appear(Region(200, 0, 200, 300), other_path)
+        # The second condition is met from the start, but it doesn't count before the first one
+        assert_that(calling(watcher.wait).with_args(timeout=0), raises(FindFailed))
+        display.show(screen(pattern=(20, 30), other=(250, 100)))
+        assert_that([i for (i, _) in watcher.wait(timeout=0)], equal_to([0, 1]))
+
+    def test_sequence_across_screens(self, display, other_path):
+        second = SyntheticDisplay(BACKGROUND)
+        display.show(screen(other=(250, 100)))
+        watcher = Watcher('sequence')
+        watcher.appear(on_screen_2(Region(0, 0, 200, 300), second), PATTERN_IMAGE_PATH)
+        watcher.appear(Region(200, 0, 200, 300), other_path)  # screen 1, met already
+        assert_that(calling(watcher.wait).with_args(timeout=0), raises(FindFailed))
+
+        second.show(screen(pattern=(20, 30)))
+        fired = watcher.wait(timeout=3)
+        assert_that([i for (i, _) in fired], equal_to([0, 1]))
+        assert_that((fired[0][1].x, fired[0][1].y), equal_to((20, 30)))
+
+    def test_list_of_patterns(self, display, other_path, threads):
+        display.show(screen(other=(50, 100)))
+        watcher = Watcher('any')
+        watcher.appear(Region(0, 150, 400, 150), [PATTERN_IMAGE_PATH, other_path])
+        watcher.appear(Region(0, 0, 400, 150), [PATTERN_IMAGE_PATH, other_path])  # nested in the pool
+        [(i, match)] = watcher.wait(timeout=0)
+        assert_that(i, equal_to(1))
+        assert_that((match.x, match.y), equal_to((50, 100)))
+
+        watcher = Watcher('any')
+        watcher.vanish(Region(0, 0, 400, 300), [PATTERN_IMAGE_PATH, other_path])
+        assert_that(watcher.wait(timeout=0), equal_to([(0, None)]))  # PATTERN is not there
+
+    def test_bad_conditions(self, display):
+        assert_that(calling(Watcher('any').appear).with_args(Region(0, 0, 10, 10), []), raises(FailExit))
+        assert_that(calling(Watcher('any').wait), raises(FailExit))
+        assert_that(calling(Watcher).with_args('first'), raises(FailExit))
+
+    def test_capture_service(self, display):
+        """ The ring slot of the previous poll's frame is reused before the next poll """
+        frames = [screen(other=(10 * k, 0)) for k in range(4)] + [screen(pattern=(120, 80))]
+        install(SyntheticDisplay(frames, interval=0.1))
+        region = Region(0, 0, 400, 300)
+        watcher = Watcher('any')
+        watcher.appear(region, PATTERN_IMAGE_PATH)
+        with CaptureService(region, rate=50, size=4):
+            [(_, match)] = watcher.wait(timeout=3)
+        assert_that((match.x, match.y), equal_to((120, 80)))